@@ -0,0 +1,228 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, request
+
+# --------------------------------------------------------
+# ADMISSION CONTROL (SRMS_ADMISSION=1)
+# --------------------------------------------------------
+# Every request is put in a priority class by its route:
+#   critical    order creation, batches, status changes, reservations -
+#               the requests that make money or move the kitchen
+#   normal      menu, order lookups, lists, inventory, login, ...
+#   background  analytics, timeseries, archive reports (dashboards
+#               that poll every second or two)
+#   exempt      health, metrics, /api/admission, the SSE stream
+# and then has to get a token from up to three token buckets:
+#   - its client's bucket for that class (remote address + class), so
+#     one tab polling analytics every second can't crowd out the rest
+#   - its route's bucket, for the expensive routes (ROUTE_LIMITS)
+#   - the shared server bucket (SRMS_ADMIT_RATE requests/s). A class
+#     may only draw it down to its RESERVE share: background stops at
+#     half full, normal at a fifth, critical goes on into debt (down to
+#     minus one second's worth), so that a burst of orders pushes the
+#     lower classes out instead of queueing behind them.
+# Nothing is taken unless all three have a token. A refused request is
+# answered 429 with Retry-After (seconds until the bucket that refused
+# it refills) before any handler, auth or JSON parsing runs.
+#
+# Buckets refill lazily (tokens += elapsed * rate when they are
+# looked at), the client buckets sit in an LRU dict capped at
+# MAX_CLIENTS, so a check is a few dict lookups and some arithmetic
+# under one short lock, however many clients there are.
+#
+# Counters of admitted and shed requests (by class and by reason) are
+# served at /api/admission and exported as gauges in /api/metrics.
+
+CRITICAL, NORMAL, BACKGROUND = "critical", "normal", "background"
+CLASSES = (CRITICAL, NORMAL, BACKGROUND)
+REASONS = ("client", "route", "overload")
+
+CRITICAL_ROUTES = {
+    ("POST", "/api/orders"),
+    ("POST", "/api/orders/batch"),
+    ("PATCH", "/api/orders/<int:order_id>/status"),
+    ("POST", "/api/reservations"),
+}
+BACKGROUND_ROUTES = ("/api/analytics", "/api/branches/analytics", "/api/orders/archive")   # and below
+EXEMPT_ROUTES = {"/api/health", "/api/metrics", "/api/admission", "/api/orders/stream"}
+
+SERVER_RATE = 500                   # requests/s the server bucket refills with (burst: one second)
+RESERVE = {CRITICAL: -1.0, NORMAL: 0.2, BACKGROUND: 0.5}     # share of the server bucket to leave
+CLIENT_LIMITS = {                   # class -> (requests/s, burst) per client
+    CRITICAL: (20, 60),
+    NORMAL: (20, 60),
+    BACKGROUND: (2, 10),
+}
+ROUTE_LIMITS = {                    # route -> (requests/s, burst) over all clients
+    "/api/analytics": (20, 40),
+    "/api/analytics/timeseries": (20, 40),
+    "/api/analytics/archive": (5, 10),
+    "/api/orders/archive": (10, 20),
+    "/api/branches/analytics": (5, 10),
+    "/api/login": (5, 10),          # a PBKDF2 hash each
+    "/api/auth/login": (5, 10),
+}
+MAX_CLIENTS = 10000
+
+
+def classify(method, rule):
+    """Priority class of a route, None if it is never limited."""
+    if method in ("OPTIONS", "HEAD") or rule in EXEMPT_ROUTES:
+        return None
+    if (method, rule) in CRITICAL_ROUTES:
+        return CRITICAL
+    if method == "GET" and rule.startswith(BACKGROUND_ROUTES):
+        return BACKGROUND
+    return NORMAL
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def level(self, now):
+        """Tokens available at `now` (refilled since the last look)."""
+        if now > self.stamp:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+        return self.tokens
+
+    def wait(self, floor=0.0):
+        """Seconds until one token can be taken without going below `floor`."""
+        return max(0.0, (floor + 1 - self.tokens) / self.rate)
+
+
+class AdmissionControl:
+
+    def __init__(self, rate=SERVER_RATE, client_limits=None, route_limits=None, reserve=None,
+                 max_clients=MAX_CLIENTS, classify=classify, enabled=True, clock=time.monotonic):
+        self.client_limits = dict(CLIENT_LIMITS, **(client_limits or {}))
+        self.reserve = dict(RESERVE, **(reserve or {}))
+        self.max_clients = max_clients
+        self.classify = classify
+        self.enabled = enabled
+        self.clock = clock
+        now = clock()
+        self.server = TokenBucket(rate, rate, now)
+        self.routes = {rule: TokenBucket(r, b, now)
+                       for rule, (r, b) in dict(ROUTE_LIMITS, **(route_limits or {})).items()}
+        self.clients = OrderedDict()        # (client, class) -> TokenBucket, least recently used first
+        self._classes = {}                  # (method, rule) -> class, filled on first use
+        self._lock = threading.Lock()
+        self.admitted = dict.fromkeys(CLASSES, 0)
+        self.shed = {(klass, reason): 0 for klass in CLASSES for reason in REASONS}
+
+    def class_of(self, method, rule):
+        key = (method, rule)
+        try:
+            return self._classes[key]
+        except KeyError:
+            klass = self._classes[key] = self.classify(method, rule)
+            return klass
+
+    def _client_bucket(self, key, now):
+        clients = self.clients
+        bucket = clients.get(key)
+        if bucket is None:
+            rate, burst = self.client_limits[key[1]]
+            bucket = clients[key] = TokenBucket(rate, burst, now)
+            if len(clients) > self.max_clients:
+                clients.popitem(last=False)
+        else:
+            clients.move_to_end(key)
+        return bucket
+
+    def check(self, method, rule, client, now=None):
+        """None if the request may run, else the seconds it should wait (it is counted as shed)."""
+        klass = self.class_of(method, rule)
+        if klass is None:
+            return None
+        now = self.clock() if now is None else now
+        with self._lock:
+            mine = self._client_bucket((client, klass), now)
+            if mine.level(now) < 1:
+                return self._refuse(klass, "client", mine.wait())
+            route = self.routes.get(rule)
+            if route is not None and route.level(now) < 1:
+                return self._refuse(klass, "route", route.wait())
+            server = self.server
+            floor = self.reserve[klass] * server.burst
+            if server.level(now) - 1 < floor:
+                return self._refuse(klass, "overload", server.wait(floor))
+            mine.tokens -= 1
+            if route is not None:
+                route.tokens -= 1
+            server.tokens -= 1
+            self.admitted[klass] += 1
+        return None
+
+    def _refuse(self, klass, reason, wait):
+        self.shed[(klass, reason)] += 1
+        return wait
+
+    # ---------------- Flask ----------------
+
+    def init_app(self, app, path="/api/admission"):
+        """Check every routed request before its handler; serve the counters at `path`."""
+        if self.enabled:
+            def admit():
+                req = request._get_current_object()
+                rule = req.url_rule
+                if rule is None or not self.enabled:
+                    return None                 # 404 / 405, or switched off at runtime
+                wait = self.check(req.method, rule.rule, req.remote_addr or "-")
+                if wait is not None:
+                    return self.too_many(wait)
+                return None
+
+            app.before_request(admit)
+        app.add_url_rule(path, "admission", lambda: jsonify(self.stats()))
+        return self
+
+    @staticmethod
+    def too_many(wait):
+        seconds = max(1, math.ceil(wait))
+        response = jsonify({"error": "Too many requests", "retry_after": seconds})
+        response.status_code = 429
+        response.headers["Retry-After"] = str(seconds)
+        return response
+
+    # ---------------- counters ----------------
+
+    def shed_by(self, index):
+        """Shed requests summed by class (index 0) or by reason (index 1)."""
+        totals = {}
+        for key, n in list(self.shed.items()):
+            totals[key[index]] = totals.get(key[index], 0) + n
+        return totals
+
+    def stats(self):
+        with self._lock:
+            server_tokens = self.server.level(self.clock())
+        admitted = dict(self.admitted)
+        shed = {klass: {reason: self.shed[(klass, reason)] for reason in REASONS} for klass in CLASSES}
+        total_shed = sum(self.shed.values())
+        total = sum(admitted.values()) + total_shed
+        return {
+            "enabled": self.enabled,
+            "admitted": admitted,
+            "shed": shed,
+            "shed_total": total_shed,
+            "shed_ratio": round(total_shed / total, 4) if total else 0.0,
+            "clients": len(self.clients),
+            "server_tokens": round(server_tokens, 1),
+        }
+
+
+def admission_from_env():
+    return AdmissionControl(rate=float(os.environ.get("SRMS_ADMIT_RATE") or SERVER_RATE),
+                            enabled=os.environ.get("SRMS_ADMISSION", "0") == "1")
@@ -0,0 +1,90 @@
+from bisect import bisect_left, insort
+
+# --------------------------------------------------------
+# INCREMENTAL SALES ANALYTICS
+# --------------------------------------------------------
+# Instead of walking every order on each /api/analytics call, the
+# totals are updated when an order is created or cancelled:
+#   - record_order():   O(items) when a new order comes in
+#   - status_changed(): O(items) when an order enters/leaves CANCELLED
+#   - top_items(k):     O(k), the ranking is kept sorted all the time
+# Cancelled orders don't count towards revenue or item counts.
+
+CANCELLED = "CANCELLED"
+
+
+class SalesAnalytics:
+
+    def __init__(self):
+        self.total_orders = 0
+        self.cancelled_orders = 0
+        self.total_revenue = 0.0
+        self.counts = {}     # item name -> qty sold
+        self._ranked = []    # sorted (-count, name), best sellers first
+
+    # ---------------- ranking helpers ----------------
+
+    def _bump(self, name, delta):
+        old = self.counts.get(name, 0)
+        new = old + delta
+        if old:
+            pos = bisect_left(self._ranked, (-old, name))
+            if pos < len(self._ranked) and self._ranked[pos] == (-old, name):
+                del self._ranked[pos]
+        if new > 0:
+            self.counts[name] = new
+            insort(self._ranked, (-new, name))
+        else:
+            self.counts.pop(name, None)
+
+    def _apply(self, order, sign):
+        self.total_revenue += sign * float(order.get("total", 0))
+        for it in order.get("items", []):
+            # str(): _ranked compares names, and older orders may hold non-string ones
+            self._bump(str(it.get("name", "Unknown")), sign * int(it.get("qty", 1)))
+
+    # ---------------- updates ----------------
+
+    def record_order(self, order):
+        self.total_orders += 1
+        if order.get("status") == CANCELLED:
+            self.cancelled_orders += 1
+        else:
+            self._apply(order, +1)
+
+    def status_changed(self, order, old_status):
+        new_status = order.get("status")
+        if old_status != CANCELLED and new_status == CANCELLED:
+            self.cancelled_orders += 1
+            self._apply(order, -1)
+        elif old_status == CANCELLED and new_status != CANCELLED:
+            self.cancelled_orders -= 1
+            self._apply(order, +1)
+
+    def rebuild(self, orders, archived=None):
+        """
+        Recompute everything from scratch (startup / restore only).
+        archived: OrderArchive.summary() of the orders no longer in `orders`.
+        """
+        self.__init__()
+        if archived:
+            self.total_orders = archived["total_orders"]
+            self.cancelled_orders = archived["cancelled_orders"]
+            self.total_revenue = archived["total_revenue"]
+            for name, qty in archived["counts"].items():
+                self._bump(name, qty)
+        for o in orders:
+            self.record_order(o)
+
+    # ---------------- reads ----------------
+
+    def top_items(self, k=10):
+        return [{"name": name, "count": -neg} for neg, name in self._ranked[:k]]
+
+    def summary(self, k=10):
+        return {
+            "total_orders": self.total_orders,
+            "cancelled_orders": self.cancelled_orders,
+            "total_revenue": round(self.total_revenue, 2),
+            "top_items": self.top_items(k)
+        }
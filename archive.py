@@ -0,0 +1,461 @@
+import json
+import os
+import threading
+from array import array
+
+try:
+    import numpy as np
+except ImportError:     # optional: plain arrays and loops instead of memmaps and vector ops
+    np = None
+
+from models import json_default, now_us
+
+# --------------------------------------------------------
+# COLUMNAR ORDER ARCHIVE
+# --------------------------------------------------------
+# Finished orders (COMPLETED / CANCELLED) that nobody touched for a
+# while are moved out of the live store into this archive, so the live
+# lists and indexes only hold orders that can still change.
+#
+# Storage is one file per column, values appended in batches:
+#   per order:  id, created, updated (epoch us), type, status (codes),
+#               total, first_item, first_doc (offsets into the columns below)
+#   per line:   menu_id, name (code), qty, price
+#   doc:        the full order JSON, bytes back to back (for get())
+#   manifest.json: committed row counts + the code -> value tables
+# A batch is written and fsynced first, then the manifest is replaced;
+# anything in the files past the manifest counts (a crash in between)
+# is cut off on open.
+#
+# With numpy installed the columns are memory-mapped and the reports
+# (summary, minute_rollups, find) are vectorized: masks, bincount and
+# unique over whole columns instead of a loop per order. Without numpy
+# the same files are read into arrays and the reports loop.
+# Without a directory everything stays in memory.
+#
+# Archived orders are read-only: get() decodes a private copy.
+
+ARCHIVE_STATUSES = ("COMPLETED", "CANCELLED")
+CANCELLED = "CANCELLED"
+
+# column -> array typecode (numpy takes the same codes as dtypes)
+ORDER_COLUMNS = {"id": "q", "created": "q", "updated": "q", "type": "i", "status": "i",
+                 "total": "d", "first_item": "q", "first_doc": "q"}
+LINE_COLUMNS = {"menu_id": "q", "name": "i", "qty": "i", "price": "d"}
+CODE_TABLES = ("types", "statuses", "names")
+
+
+class _Column:
+    """One typed column: a memory-mapped file, or an in-memory array."""
+
+    def __init__(self, typecode, path=None):
+        self.typecode = typecode
+        self.path = path
+        self.values = self._empty()
+
+    def _empty(self):
+        return np.zeros(0, self.typecode) if np is not None else array(self.typecode)
+
+    def load(self, length, truncate=True):
+        """Read (map) the first `length` values; a longer file is a torn append (cut off if `truncate`)."""
+        if self.path is None:
+            return
+        size = length * array(self.typecode).itemsize
+        if truncate:
+            with open(self.path, "ab") as f:
+                if f.tell() > size:
+                    f.truncate(size)
+        if length == 0:
+            self.values = self._empty()
+        elif np is not None:
+            self.values = np.memmap(self.path, dtype=self.typecode, mode="r", shape=(length,))
+        else:
+            self.values = array(self.typecode)
+            with open(self.path, "rb") as f:
+                self.values.fromfile(f, length)
+
+    def append(self, values):
+        chunk = array(self.typecode, values)
+        if self.path is not None:
+            with open(self.path, "ab") as f:
+                f.write(chunk.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            if np is not None:
+                return   # remapped by load() once the batch is committed
+        if np is not None:
+            self.values = np.concatenate((self.values, np.frombuffer(chunk, self.typecode)))
+        else:
+            self.values.extend(chunk)
+
+
+class OrderArchive:
+
+    def __init__(self, directory=None, type_key="type", load_order=None, readonly=False):
+        """readonly: another process appends to `directory`; open() only reads what is committed."""
+        self.directory = directory
+        self.type_key = type_key
+        self.load_order = load_order
+        self.readonly = readonly
+        layout = {**ORDER_COLUMNS, **LINE_COLUMNS, "doc": "B"}
+        self.columns = {name: _Column(code, self._path(name)) for name, code in layout.items()}
+        self.codes = {table: [] for table in CODE_TABLES}   # table -> [value by code]
+        self._code_of = {table: {} for table in CODE_TABLES}
+        self.rows = 0         # archived orders
+        self.lines = 0        # archived order lines
+        self.doc_bytes = 0
+        self._index = None    # id lookup for get(), see _reindex()
+        self._lock = threading.Lock()
+        self._reindex()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".col") if self.directory else None
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, order_id):
+        return self._row(order_id) is not None
+
+    def col(self, name):
+        return self.columns[name].values
+
+    # ---------------- open / commit ----------------
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def open(self):
+        if not self.directory:
+            return self
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        self.rows = manifest.get("rows", 0)
+        self.lines = manifest.get("lines", 0)
+        self.doc_bytes = manifest.get("doc_bytes", 0)
+        for table in CODE_TABLES:
+            self.codes[table] = manifest.get(table, [])
+            self._code_of[table] = {v: i for i, v in enumerate(self.codes[table])}
+        self._load_columns(self.rows, self.lines, self.doc_bytes)
+        self._reindex()
+        return self
+
+    def _load_columns(self, rows, lines, doc_bytes):
+        for name, column in self.columns.items():
+            column.load(rows if name in ORDER_COLUMNS else lines if name in LINE_COLUMNS else doc_bytes,
+                        truncate=not self.readonly)
+
+    def _commit(self, rows, lines, doc_bytes):
+        if not self.directory:
+            return
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "lines": lines, "doc_bytes": doc_bytes, **self.codes},
+                      f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def _code(self, table, value):
+        code = self._code_of[table].get(value)
+        if code is None:
+            code = self._code_of[table][value] = len(self.codes[table])
+            self.codes[table].append(value)
+        return code
+
+    def _reindex(self):
+        ids = self.col("id")[:self.rows]
+        if np is not None:
+            order = np.argsort(ids, kind="stable")
+            self._index = (ids[order], order)
+        else:
+            self._index = {oid: row for row, oid in enumerate(ids)}
+
+    def _row(self, order_id):
+        index = self._index
+        if np is None:
+            return index.get(order_id) if index else None
+        sorted_ids, rows = index
+        pos = int(np.searchsorted(sorted_ids, order_id))
+        if pos < len(sorted_ids) and sorted_ids[pos] == order_id:
+            return int(rows[pos])
+        return None
+
+    # ---------------- writes ----------------
+
+    def append(self, orders):
+        """Archive a batch of models.Order objects; durable when this returns."""
+        if not orders:
+            return 0
+        with self._lock:
+            batch = {name: [] for name in self.columns}
+            lines, doc_bytes = self.lines, self.doc_bytes
+            docs = []
+            for o in orders:
+                doc = json.dumps(o, separators=(",", ":"), default=json_default).encode("utf-8")
+                batch["id"].append(o["id"])
+                batch["created"].append(o.created or 0)
+                batch["updated"].append(o.updated or 0)
+                batch["type"].append(self._code("types", o.get(self.type_key)))
+                batch["status"].append(self._code("statuses", o.get("status")))
+                batch["total"].append(float(o.get("total") or 0))
+                batch["first_item"].append(lines)
+                batch["first_doc"].append(doc_bytes)
+                for line in o.items or ():
+                    batch["menu_id"].append(line.menu_id if line.menu_id is not None else -1)
+                    batch["name"].append(self._code("names", line.name))
+                    batch["qty"].append(int(line.qty or 1))
+                    batch["price"].append(float(line.price or 0))
+                    lines += 1
+                docs.append(doc)
+                doc_bytes += len(doc)
+            batch["doc"] = b"".join(docs)
+
+            for name, column in self.columns.items():
+                column.append(batch[name])
+            rows = self.rows + len(orders)
+            self._commit(rows, lines, doc_bytes)
+            if self.directory and np is not None:
+                self._load_columns(rows, lines, doc_bytes)
+            # counts move last: readers never look past what is loaded
+            self.rows, self.lines, self.doc_bytes = rows, lines, doc_bytes
+            self._reindex()
+        return len(orders)
+
+    # ---------------- reads ----------------
+
+    def max_id(self):
+        if not self.rows:
+            return 0
+        ids = self.col("id")[:self.rows]
+        return int(ids.max() if np is not None else max(ids))
+
+    def _doc(self, row):
+        start = self.col("first_doc")[row]
+        end = self.col("first_doc")[row + 1] if row + 1 < self.rows else self.doc_bytes
+        doc = json.loads(bytes(self.col("doc")[start:end]))
+        return self.load_order(doc) if self.load_order else doc
+
+    def get(self, order_id):
+        row = self._row(order_id)
+        return None if row is None else self._doc(row)
+
+    def _mask(self, n, start=None, end=None, order_type=None, status=None):
+        """numpy: which of the first n orders match (start/end on created, epoch us)."""
+        mask = np.ones(n, dtype=bool)
+        created = self.col("created")[:n]
+        if start is not None:
+            mask &= created >= start
+        if end is not None:
+            mask &= created < end
+        for table, column, value in (("types", "type", order_type), ("statuses", "status", status)):
+            if value is not None:
+                code = self._code_of[table].get(value)
+                mask &= self.col(column)[:n] == (-1 if code is None else code)
+        return mask
+
+    def _matches(self, row, start=None, end=None, order_type=None, status=None):
+        """Pure-Python counterpart of _mask() for one row."""
+        created = self.col("created")[row]
+        return ((start is None or created >= start) and (end is None or created < end)
+                and (order_type is None or self.codes["types"][self.col("type")[row]] == order_type)
+                and (status is None or self.codes["statuses"][self.col("status")[row]] == status))
+
+    def _line_owner(self, n, m):
+        """numpy: order row of each of the first m lines."""
+        first = self.col("first_item")[:n]
+        return np.repeat(np.arange(n), np.diff(np.append(first, m)))
+
+    def _line_range(self, row):
+        end = self.col("first_item")[row + 1] if row + 1 < self.rows else self.lines
+        return range(self.col("first_item")[row], end)
+
+    def summary(self, start=None, end=None, order_type=None):
+        """
+        Totals over archived orders created in [start, end) (epoch us):
+        {"total_orders", "cancelled_orders", "total_revenue", "counts": {item name: qty}}
+        Cancelled orders are counted but add no revenue or items.
+        """
+        n, m = self.rows, self.lines
+        cancelled_code = self._code_of["statuses"].get(CANCELLED, -1)
+        if np is not None:
+            mask = self._mask(n, start, end, order_type)
+            cancelled = mask & (self.col("status")[:n] == cancelled_code)
+            live = mask & ~cancelled
+            line_live = live[self._line_owner(n, m)]
+            qty = np.bincount(self.col("name")[:m][line_live], weights=self.col("qty")[:m][line_live],
+                              minlength=len(self.codes["names"]))
+            return {
+                "total_orders": int(mask.sum()),
+                "cancelled_orders": int(cancelled.sum()),
+                "total_revenue": float(self.col("total")[:n][live].sum()),
+                "counts": {self.codes["names"][c]: int(q) for c, q in enumerate(qty) if q},
+            }
+
+        out = {"total_orders": 0, "cancelled_orders": 0, "total_revenue": 0.0, "counts": {}}
+        counts = out["counts"]
+        for row in range(n):
+            if not self._matches(row, start, end, order_type):
+                continue
+            out["total_orders"] += 1
+            if self.col("status")[row] == cancelled_code:
+                out["cancelled_orders"] += 1
+                continue
+            out["total_revenue"] += self.col("total")[row]
+            for i in self._line_range(row):
+                name = self.codes["names"][self.col("name")[i]]
+                counts[name] = counts.get(name, 0) + self.col("qty")[i]
+        return out
+
+    def minute_rollups(self):
+        """
+        (minute start in epoch s, group, orders, revenue, items) for every
+        non-cancelled archived order, grouped like SalesRollups buckets:
+        group None (totals), (type_key, order type) or ("item", name).
+        """
+        n, m = self.rows, self.lines
+        cancelled_code = self._code_of["statuses"].get(CANCELLED, -1)
+        types, names = self.codes["types"], self.codes["names"]
+        if np is None:
+            yield from self._minute_rollups_py(n, cancelled_code)
+            return
+        live = self.col("status")[:n] != cancelled_code
+        minute = self.col("created")[:n] // 60000000 * 60
+        owner = self._line_owner(n, m)
+        qty = self.col("qty")[:m]
+        line_revenue = qty * self.col("price")[:m]
+        order_qty = np.bincount(owner, weights=qty, minlength=n)
+        total = self.col("total")[:n]
+
+        def grouped(keys, weights_revenue, weights_qty, counts=None):
+            keys, inverse = np.unique(keys, return_inverse=True)
+            orders = np.bincount(inverse, weights=counts) if counts is not None else np.bincount(inverse)
+            return keys, orders, np.bincount(inverse, weights=weights_revenue), np.bincount(inverse, weights=weights_qty)
+
+        keys, orders, revenue, items = grouped(minute[live], total[live], order_qty[live])
+        for k, o, r, q in zip(keys.tolist(), orders.tolist(), revenue.tolist(), items.tolist()):
+            yield k, None, int(o), r, int(q)
+
+        width = max(len(types), 1)
+        keys, orders, revenue, items = grouped(minute[live] * width + self.col("type")[:n][live],
+                                               total[live], order_qty[live])
+        for k, o, r, q in zip(keys.tolist(), orders.tolist(), revenue.tolist(), items.tolist()):
+            yield k // width, (self.type_key, types[k % width]), int(o), r, int(q)
+
+        # per item: first merge the lines of one order, then count orders per minute
+        width = max(len(names), 1)
+        line_live = live[owner]
+        pairs, inverse = np.unique(owner[line_live] * width + self.col("name")[:m][line_live],
+                                   return_inverse=True)
+        pair_revenue = np.bincount(inverse, weights=line_revenue[line_live])
+        pair_qty = np.bincount(inverse, weights=qty[line_live])
+        keys, orders, revenue, items = grouped(minute[pairs // width] * width + pairs % width,
+                                               pair_revenue, pair_qty)
+        for k, o, r, q in zip(keys.tolist(), orders.tolist(), revenue.tolist(), items.tolist()):
+            yield k // width, ("item", names[k % width]), int(o), r, int(q)
+
+    def _minute_rollups_py(self, n, cancelled_code):
+        rows = {}
+        for row in range(n):
+            if self.col("status")[row] == cancelled_code:
+                continue
+            minute = self.col("created")[row] // 60000000 * 60
+            lines = {}
+            for i in self._line_range(row):
+                line = lines.setdefault(self.codes["names"][self.col("name")[i]], [0.0, 0])
+                line[0] += self.col("qty")[i] * self.col("price")[i]
+                line[1] += self.col("qty")[i]
+            qty = sum(q for _, q in lines.values())
+            groups = [(None, self.col("total")[row], qty),
+                      ((self.type_key, self.codes["types"][self.col("type")[row]]), self.col("total")[row], qty)]
+            groups += [(("item", name), revenue, q) for name, (revenue, q) in lines.items()]
+            for group, revenue, q in groups:
+                acc = rows.setdefault((minute, group), [0, 0.0, 0])
+                acc[0] += 1
+                acc[1] += revenue
+                acc[2] += q
+        for (minute, group), (orders, revenue, qty) in rows.items():
+            yield minute, group, orders, revenue, qty
+
+    def item_lists(self):
+        """Menu ids of every archived order, oldest archive batch first."""
+        n, m = self.rows, self.lines
+        if not n:
+            return
+        menu_ids = self.col("menu_id")[:m]
+        if np is not None:
+            for ids in np.split(menu_ids, self.col("first_item")[1:n]):
+                yield [i for i in ids.tolist() if i >= 0]
+            return
+        for row in range(n):
+            yield [menu_ids[i] for i in self._line_range(row) if menu_ids[i] >= 0]
+
+    def find(self, start=None, end=None, order_type=None, status=None, after_id=None, limit=None):
+        """Archived orders (decoded) in id order; only the returned page is decoded."""
+        n = self.rows
+        if np is not None:
+            rows = np.nonzero(self._mask(n, start, end, order_type, status))[0]
+            ids = self.col("id")[:n][rows]
+            if after_id:
+                rows, ids = rows[ids > after_id], ids[ids > after_id]
+            rows = rows[np.argsort(ids, kind="stable")][:limit].tolist()
+        else:
+            rows = sorted((self.col("id")[row], row) for row in range(n)
+                          if self._matches(row, start, end, order_type, status)
+                          and (not after_id or self.col("id")[row] > after_id))
+            rows = [row for _, row in rows[:limit]]
+        return [self._doc(row) for row in rows]
+
+
+# --------------------------------------------------------
+# ARCHIVER
+# --------------------------------------------------------
+
+class Archiver:
+    """
+    Background thread: every `interval` seconds, moves orders in
+    ARCHIVE_STATUSES whose updated_at is more than `after` seconds old
+    from the store into its archive. format_ts turns epoch us into the
+    store's updated_at format; on_archived(ids) runs after each move.
+    Orders move `batch` at a time, each batch in its own transaction,
+    so writers never wait for a whole backlog to be archived.
+    """
+
+    def __init__(self, store, after, format_ts, interval=60, batch=2000, on_archived=None):
+        self.store = store
+        self.after = after
+        self.format_ts = format_ts
+        self.interval = interval
+        self.batch = batch
+        self.on_archived = on_archived
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self, now=None):
+        before = self.format_ts((now or now_us()) - int(self.after * 1000000))
+        moved = []
+        while True:
+            ids = self.store.archive_orders(before, limit=self.batch)
+            if ids and self.on_archived:
+                self.on_archived(ids)
+            moved += ids
+            if len(ids) < self.batch:
+                return moved
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="order-archiver", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,540 @@
+import argparse
+import asyncio
+import io
+import logging
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import newstyle
+from encoding import dumps
+from events import parse_last_event_id
+
+# --------------------------------------------------------
+# ASGI ENTRY POINT (newstyle.py under asyncio)
+# --------------------------------------------------------
+# The Flask app ties a thread to every open request, so tablets that
+# keep a long poll or an SSE stream open use up the server's threads.
+# Here only the waiting is async:
+#   - GET /api/orders?wait=30&since=...       (any order change)
+#   - GET /api/orders/<id>?wait=30&since=...  (that order changes)
+#   - GET /api/orders/stream                  (SSE, same events as Flask)
+# park on an asyncio.Event on the event loop, costing a socket and a
+# small coroutine each. Every other request, and the answer to a long
+# poll once it wakes, is the unchanged Flask route run on a small
+# thread pool, so there is one STORE and one set of indexes for both
+# servers. Writes still go through STORE.transaction() on those
+# threads; the loop only ever reads (lock-free for MemoryStorage).
+#
+# Long polls: the answer comes at once if something changed after the
+# client's cursor, otherwise on the next change or after `wait` seconds
+# (at most MAX_WAIT), whichever is first. The cursor is an ORDER_EVENTS
+# id: every GET /api/orders... answer carries X-Last-Event-Id (read
+# before the route runs), and the next poll sends it back as
+# ?last_event_id= or Last-Event-ID, like an SSE client. `since` alone
+# (an updated_at value) still works, but only to the second: a change in
+# the same second as `since` waits for the next one. ORDER_EVENTS tells
+# the loop about changes through EventBus.subscribe(). Every branch
+# (SRMS_BRANCHES, X-Branch / ?branch=) has its own events and waiters.
+#
+#     uvicorn asgi:app --port 5000      (if uvicorn is installed)
+#     python asgi.py --port 5000        (built-in HTTP/1.1 server otherwise)
+
+MAX_WAIT = 60
+HEARTBEAT = 15          # seconds between SSE keep-alive comments
+MAX_BODY = 4 * 1024 * 1024      # request body bytes (a full batch of MAX_BATCH orders fits)
+
+log = logging.getLogger("srms.asgi")
+
+
+class AsgiApp:
+
+    def __init__(self, wsgi_app, branches, threads=16):
+        self.wsgi_app = wsgi_app
+        self.branches = branches   # shards.Shards: .store and .order_events of each branch
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="srms-asgi")
+        self.loop = None
+        self._changed = {}         # branch id -> asyncio.Event, replaced after each order event
+        self._order_waits = {}     # (branch id, order id) -> [asyncio.Event, waiters]
+        self._order_events = {}    # branch id -> OrderedDict order id -> its last event id (recent ones)
+
+    # ---------------- order events -> event loop ----------------
+
+    def _bind(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            for branch_id, shard in self.branches.items():
+                self._changed[branch_id] = asyncio.Event()
+                self._order_events[branch_id] = OrderedDict()
+                shard.order_events.subscribe(partial(self._on_event, branch_id))
+
+    def _on_event(self, branch_id, event_id, event, data):
+        # publishing thread (inside STORE.transaction()): hand over, don't block
+        order = data.get("order") if isinstance(data, dict) else None
+        try:
+            self.loop.call_soon_threadsafe(self._wake, branch_id, order["id"] if order is not None else None,
+                                           event_id)
+        except RuntimeError:
+            pass    # loop already closed
+
+    def _wake(self, branch_id, order_id, event_id):
+        changed, self._changed[branch_id] = self._changed[branch_id], asyncio.Event()
+        changed.set()
+        if order_id is not None:
+            # as many orders as the bus keeps events: a cursor still in its
+            # history finds every order changed after it
+            seen = self._order_events[branch_id]
+            seen[order_id] = event_id
+            seen.move_to_end(order_id)
+            if len(seen) > self.branches.shards[branch_id].order_events.history:
+                seen.popitem(last=False)
+        entry = self._order_waits.pop((branch_id, order_id), None)
+        if entry is not None:
+            entry[0].set()
+
+    # ---------------- ASGI ----------------
+
+    async def __call__(self, scope, receive, send):
+        self._bind()
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY:
+                await send_json(send, 413, {"error": f"Request body over {MAX_BODY} bytes"})
+                return
+            if not message.get("more_body"):
+                break
+
+        path = scope["path"]
+        if scope["method"] == "GET" and path.startswith("/api/orders"):
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            header = self.branches.header.lower().encode("latin-1")
+            branch_id = self.branches.branch_of(
+                next((v.decode("latin-1") for k, v in scope["headers"] if k == header), None),
+                query.get(self.branches.param, [None])[0]
+            )   # None (unknown branch): Flask answers the 404
+            if branch_id is not None and path == "/api/orders/stream":
+                await self._stream(branch_id, scope, query, receive, send)
+                return
+            cursor = last_event_id_of(scope, query)
+            order_id = order_id_of(path)
+            if branch_id is not None and "wait" in query and (path == "/api/orders" or order_id is not None):
+                try:
+                    wait = min(float(query["wait"][0]), MAX_WAIT)
+                except ValueError:
+                    await send_json(send, 400, {"error": "wait must be a number of seconds"})
+                    return
+                since = query.get("since", [None])[0]
+                if await self._long_poll(branch_id, order_id, since, cursor, wait, receive) is False:
+                    return  # client went away
+            if branch_id is not None:
+                # taken before the route reads the store: a change made while
+                # it runs is then newer than the cursor, never skipped
+                last_id = self.branches.shards[branch_id].order_events.last_id
+                cursor_headers = [(b"x-last-event-id", str(last_id).encode()),
+                                  (b"access-control-expose-headers", b"X-Last-Event-Id")]
+                await self._forward(scope, bytes(body), send, cursor_headers)
+                return
+        await self._forward(scope, bytes(body), send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ---------------- long polling ----------------
+
+    def _has_change(self, branch_id, order_id, since, cursor):
+        shard = self.branches.shards[branch_id]
+        # a missing order is answered (404) right away
+        order = shard.store.get_order(order_id) if order_id is not None else None
+        if order_id is not None and order is None:
+            return True
+        if cursor is not None:
+            events = shard.order_events
+            if cursor == events.last_id:
+                return False
+            if order_id is None or events.since(cursor) is None:
+                return True     # newer events, or a cursor from before a restart / another server
+            return self._order_events[branch_id].get(order_id, 0) > cursor
+        if since is None:
+            return False
+        if order_id is None:
+            last = shard.store.last_order_change()
+            return last is not None and last > since
+        return (order.get("updated_at") or "") > since
+
+    async def _long_poll(self, branch_id, order_id, since, cursor, wait, receive):
+        """Wait until there is something to answer (or `wait` ran out); False if the client disconnected."""
+        key = (branch_id, order_id)
+        if order_id is None:
+            changed = self._changed[branch_id]
+        else:
+            entry = self._order_waits.setdefault(key, [asyncio.Event(), 0])
+            entry[1] += 1
+            changed = entry[0]
+        try:
+            # the event is taken before the check, so a change in between still sets it
+            if self._has_change(branch_id, order_id, since, cursor):
+                return True
+            return await wait_or_disconnect(changed.wait(), wait, receive)
+        finally:
+            if order_id is not None:
+                entry[1] -= 1
+                if entry[1] == 0 and self._order_waits.get(key) is entry:
+                    del self._order_waits[key]
+
+    # ---------------- SSE ----------------
+
+    async def _stream(self, branch_id, scope, query, receive, send):
+        events = self.branches.shards[branch_id].order_events
+        last_id = last_event_id_of(scope, query)
+        if last_id is None:
+            last_id = events.last_id
+        await send({
+            "type": "http.response.start", "status": 200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no"), (b"access-control-allow-origin", b"*")],
+        })
+        await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+        while True:
+            changed = self._changed[branch_id]
+            batch = events.since(last_id)
+            if batch is None:
+                last_id = events.last_id
+                chunk = f"id: {last_id}\nevent: reset\ndata: {{}}\n\n".encode()
+            elif batch:
+                last_id = batch[-1][0]
+                chunk = "".join(text for _, text in batch).encode()
+            else:
+                woke = await wait_or_disconnect(changed.wait(), HEARTBEAT, receive)
+                if woke is False:
+                    return
+                if woke:
+                    continue
+                chunk = b": keep-alive\n\n"
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+    # ---------------- everything else: the Flask app ----------------
+
+    async def _forward(self, scope, body, send, extra_headers=()):
+        environ = wsgi_environ(scope, body)
+        status, headers, chunks = await self.loop.run_in_executor(self.executor, self._call_wsgi, environ)
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers] + list(extra_headers),
+        })
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+
+    def _call_wsgi(self, environ):
+        response = []
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+            return chunks.append
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response[0], response[1], chunks
+
+
+def order_id_of(path):
+    """<id> of /api/orders/<id>, else None."""
+    rest = path[len("/api/orders/"):] if path.startswith("/api/orders/") else ""
+    return int(rest) if rest.isdigit() else None
+
+
+def last_event_id_of(scope, query):
+    """Cursor of a long poll or SSE client: Last-Event-ID header or ?last_event_id=, else None."""
+    header = next((v for k, v in scope["headers"] if k == b"last-event-id"), b"").decode("latin-1")
+    return parse_last_event_id(header or query.get("last_event_id", [None])[0])
+
+
+async def wait_or_disconnect(awaitable, timeout, receive):
+    """
+    True if `awaitable` finished within `timeout`, None on timeout,
+    False if the client disconnected first.
+    """
+    waiter = asyncio.ensure_future(awaitable)
+    gone = asyncio.ensure_future(receive())
+    try:
+        done, _ = await asyncio.wait((waiter, gone), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+        gone.cancel()
+    if waiter in done:
+        return True
+    if gone in done and gone.result().get("type") == "http.disconnect":
+        return False
+    return None
+
+
+async def send_json(send, status, payload):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"access-control-allow-origin", b"*")]})
+    await send({"type": "http.response.body", "body": dumps(payload) + b"\n"})
+
+
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        value = value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name != "content-length":
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+# --------------------------------------------------------
+# BUILT-IN HTTP/1.1 SERVER (used when uvicorn is not installed)
+# --------------------------------------------------------
+# Keep-alive, Content-Length request bodies, chunked responses when the
+# app sends no Content-Length (SSE). Enough for the tablets and the
+# benchmarks; put uvicorn or a proxy in front for anything public.
+# Requests it can't take are answered before any body is read, and the
+# connection is closed:
+#   400  malformed request line or header, bad or conflicting Content-Length
+#   411  chunked request body (send a Content-Length)
+#   413  body over MAX_BODY
+#   431  request line and headers over MAX_HEAD
+#   501  any other Transfer-Encoding
+
+MAX_HEAD = 64 * 1024
+
+
+class HttpConnection(asyncio.Protocol):
+
+    def __init__(self, app):
+        self.app = app
+        self.transport = None
+        self.buffer = bytearray()
+        self.data = asyncio.Event()     # set when bytes arrive or the peer closes
+        self.closed = asyncio.Event()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        asyncio.get_running_loop().create_task(self.serve())
+
+    def data_received(self, data):
+        self.buffer += data
+        self.data.set()
+
+    def connection_lost(self, exc):
+        self.closed.set()
+        self.data.set()
+
+    async def _read_head(self):
+        while True:
+            end = self.buffer.find(b"\r\n\r\n")
+            if end >= 0:
+                head = bytes(self.buffer[:end])
+                del self.buffer[:end + 4]
+                return head
+            if self.closed.is_set() or len(self.buffer) > MAX_HEAD:
+                return None
+            self.data.clear()
+            await self.data.wait()
+
+    async def _read_body(self, length):
+        while len(self.buffer) < length:
+            if self.closed.is_set():
+                return None
+            self.data.clear()
+            await self.data.wait()
+        body = bytes(self.buffer[:length])
+        del self.buffer[:length]
+        return body
+
+    @staticmethod
+    def _body_length(headers):
+        """(Content-Length, None) for an acceptable body, (None, status) otherwise."""
+        codings = b",".join(v for k, v in headers if k == b"transfer-encoding")
+        if codings:
+            return None, 411 if codings.split(b",")[-1].strip().lower() == b"chunked" else 501
+        lengths = {v for k, v in headers if k == b"content-length"}
+        if not lengths:
+            return 0, None
+        value = lengths.pop()
+        if lengths or not value.isdigit():
+            return None, 400
+        if int(value) > MAX_BODY:
+            return None, 413
+        return int(value), None
+
+    def _refuse(self, status):
+        self.transport.write(f"HTTP/1.1 {status} {reason(status)}\r\n"
+                             "Content-Length: 0\r\nConnection: close\r\n\r\n".encode("latin-1"))
+
+    async def serve(self):
+        try:
+            while True:
+                head = await self._read_head()
+                if head is None:
+                    if len(self.buffer) > MAX_HEAD:
+                        self._refuse(431)
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, version = lines[0].split(" ", 2)
+                if version not in ("HTTP/1.0", "HTTP/1.1"):
+                    raise ValueError(version)
+                headers = []
+                for line in lines[1:]:
+                    name, colon, value = line.partition(":")
+                    if not colon:
+                        raise ValueError(line)
+                    headers.append((name.strip().lower().encode("latin-1"), value.strip().encode("latin-1")))
+                fields = dict(headers)
+                length, status = self._body_length(headers)
+                if status is not None:
+                    self._refuse(status)
+                    break
+                body = await self._read_body(length)
+                if body is None:
+                    break
+                connection = fields.get(b"connection", b"").lower()
+                keep_alive = connection != b"close" if version == "HTTP/1.1" else connection == b"keep-alive"
+                path, _, query = target.partition("?")
+                scope = {
+                    "type": "http", "asgi": {"version": "3.0"}, "http_version": version[5:],
+                    "method": method, "scheme": "http", "path": path, "raw_path": path.encode("latin-1"),
+                    "query_string": query.encode("latin-1"), "root_path": "", "headers": headers,
+                    "server": self.transport.get_extra_info("sockname")[:2],
+                    "client": (self.transport.get_extra_info("peername") or ("", 0))[:2],
+                }
+                if not await self._respond(scope, body, keep_alive) or not keep_alive:
+                    break
+        except (ValueError, IndexError):
+            self._refuse(400)
+        finally:
+            self.transport.close()
+
+    async def _respond(self, scope, body, keep_alive):
+        """Run the app for one request; False if the connection can't be reused."""
+        state = {"sent": False, "started": False, "chunked": False, "done": False}
+
+        async def receive():
+            if not state["sent"]:
+                state["sent"] = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await self.closed.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if self.closed.is_set():
+                return
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                names = {k.lower() for k, _ in headers}
+                if b"content-length" not in names:
+                    state["chunked"] = True
+                    headers.append((b"transfer-encoding", b"chunked"))
+                headers.append((b"connection", b"keep-alive" if keep_alive else b"close"))
+                out = [f"HTTP/1.1 {status} {reason(status)}\r\n".encode("latin-1")]
+                out += [k + b": " + v + b"\r\n" for k, v in headers]
+                self.transport.write(b"".join(out) + b"\r\n")
+                state["started"] = True
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                more = message.get("more_body", False)
+                if state["chunked"]:
+                    if chunk:
+                        self.transport.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    if not more:
+                        self.transport.write(b"0\r\n\r\n")
+                elif chunk:
+                    self.transport.write(chunk)
+                state["done"] = not more
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            log.exception("error serving %s %s", scope["method"], scope["path"])
+            if not state["started"]:
+                await send_json(send, 500, {"error": "Internal server error"})
+                return True
+            return False
+        return state["done"] and not self.closed.is_set()
+
+
+def reason(status):
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ""
+
+
+async def serve(app, host="127.0.0.1", port=5000, ready=None):
+    """Run the built-in server until cancelled; `ready(port)` once it listens."""
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(lambda: HttpConnection(app), host, port, backlog=4096)
+    if ready:
+        ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+app = AsgiApp(newstyle.app, newstyle.BRANCHES)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="newstyle.py as an ASGI app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--builtin", action="store_true", help="use the built-in server even if uvicorn is installed")
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:     # optional
+        uvicorn = None
+    if uvicorn is not None and not args.builtin:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    else:
+        ready = lambda port: print(f"SRMS ASGI on http://{args.host}:{port}", flush=True)
+        asyncio.run(serve(app, args.host, args.port, ready))
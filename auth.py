@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from functools import lru_cache, wraps
+
+from flask import g, jsonify, request
+
+# --------------------------------------------------------
+# STAFF AUTH (session tokens)
+# --------------------------------------------------------
+# Passwords are stored as salted PBKDF2-SHA256 hashes
+# ("pbkdf2_sha256$<iterations>$<salt>$<hash>", see hash_password()).
+# The slow hash runs once, at login; the login hands back a signed
+# session token that the staff UI sends with every request as
+#   Authorization: Bearer <token>
+# A token is base64url([username, role, expiry]) + "." + its HMAC-SHA256
+# under the server secret (SRMS_AUTH_SECRET; random per process if
+# unset, so set it when several worker processes share the load). It
+# is valid for SRMS_TOKEN_TTL seconds (default 8 hours, one shift).
+#
+# Checking a token is an HMAC and a JSON decode (a few us); decoded
+# tokens are kept in an LRU cache, so a tablet sending the same token
+# all shift pays that once and then a dict lookup plus the expiry check.
+# A token whose signature doesn't match is never a cache hit for a
+# valid one: the cache key is the whole token.
+#
+# @AUTH.require("ADMIN", ...) guards a route: no or bad token -> 401,
+# a role not listed -> 403, otherwise the handler runs with g.user =
+# {"username", "role"}. SRMS_AUTH=0 turns the checks off (benchmarks
+# of the handlers alone).
+
+ITERATIONS = 600000
+TOKEN_TTL = 8 * 3600
+CACHE_SIZE = 4096
+
+
+def b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password, salt=None, iterations=ITERATIONS):
+    salt = salt if salt is not None else os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${b64encode(salt)}${b64encode(digest)}"
+
+
+def check_password(password, encoded):
+    try:
+        algorithm, iterations, salt, _ = encoded.split("$")
+    except ValueError:
+        return False
+    if algorithm != "pbkdf2_sha256":
+        return False
+    return hmac.compare_digest(hash_password(password, b64decode(salt), int(iterations)), encoded)
+
+
+class TokenAuth:
+
+    def __init__(self, users, secret=None, ttl=TOKEN_TTL, cache_size=CACHE_SIZE, enabled=True):
+        """users: username -> {"password_hash", "role"}."""
+        self.users = users
+        secret = secret or os.urandom(32)
+        self.secret = secret.encode("utf-8") if isinstance(secret, str) else secret
+        self.ttl = ttl
+        self.enabled = enabled
+        self.decode = lru_cache(maxsize=cache_size)(self._decode)
+
+    # ---------------- login ----------------
+
+    def login(self, username, password):
+        """{"username", "role"} if the password is right, else None (as slow either way)."""
+        user = self.users.get(username)
+        if user is None:
+            hash_password(password, salt=b"\0" * 16)
+            return None
+        if not check_password(password, user["password_hash"]):
+            return None
+        return {"username": username, "role": user["role"]}
+
+    def issue(self, username, role, now=None):
+        """Signed token for username/role, valid for self.ttl seconds from now."""
+        expires = int((now if now is not None else time.time()) + self.ttl)
+        payload = b64encode(json.dumps([username, role, expires], separators=(",", ":")).encode("utf-8"))
+        return payload + "." + self._sign(payload)
+
+    def _sign(self, payload):
+        return b64encode(hmac.digest(self.secret, payload.encode("ascii"), "sha256"))
+
+    # ---------------- verification ----------------
+
+    def _decode(self, token):
+        payload, _, signature = token.partition(".")
+        try:
+            if not hmac.compare_digest(signature, self._sign(payload)):
+                return None
+            username, role, expires = json.loads(b64decode(payload))
+        except (ValueError, TypeError, UnicodeError):
+            return None
+        return {"username": username, "role": role}, expires
+
+    def verify(self, token, now=None):
+        """(user, None) for a good token, (None, reason) otherwise."""
+        claims = self.decode(token) if token else None
+        if claims is None:
+            return None, "Invalid token"
+        user, expires = claims
+        if (now if now is not None else time.time()) >= expires:
+            return None, "Token expired"
+        return user, None
+
+    def require(self, *roles):
+        """Route decorator: a valid token of one of `roles`."""
+        def decorate(view):
+            @wraps(view)
+            def guarded(*args, **kwargs):
+                if self.enabled:
+                    header = request.environ.get("HTTP_AUTHORIZATION", "")
+                    if not header.startswith("Bearer "):
+                        return self._refuse(401, "Login required")
+                    user, reason = self.verify(header[7:])
+                    if user is None:
+                        return self._refuse(401, reason)
+                    if user["role"] not in roles:
+                        return self._refuse(403, f"Not allowed for role {user['role']}")
+                    g.user = user
+                return view(*args, **kwargs)
+            guarded.roles = roles
+            return guarded
+        return decorate
+
+    @staticmethod
+    def _refuse(status, message):
+        response = jsonify({"error": message})
+        response.status_code = status
+        if status == 401:
+            response.headers["WWW-Authenticate"] = "Bearer"
+        return response
+
+
+def auth_from_env(users):
+    return TokenAuth(users, secret=os.environ.get("SRMS_AUTH_SECRET"),
+                     ttl=int(os.environ.get("SRMS_TOKEN_TTL") or TOKEN_TTL),
+                     enabled=os.environ.get("SRMS_AUTH", "1") != "0")
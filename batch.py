@@ -0,0 +1,37 @@
+import json
+
+# --------------------------------------------------------
+# BATCH PAYLOAD PARSING (POST /api/orders/batch)
+# --------------------------------------------------------
+# Delivery partners push orders in bursts. A batch is either
+#   - a JSON array of orders,
+#   - {"orders": [...]}, or
+#   - NDJSON (Content-Type: application/x-ndjson), one order per line.
+# A line that is not valid JSON becomes None, so the caller can report
+# it by position and still accept the rest.
+
+MAX_BATCH = 1000
+
+
+def read_batch(req):
+    """Returns (payloads, error message)."""
+    if req.mimetype == "application/x-ndjson":
+        payloads = []
+        for line in req.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                payloads.append(json.loads(line))
+            except ValueError:
+                payloads.append(None)
+    else:
+        data = req.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get("orders")
+        if not isinstance(data, list):
+            return None, "Expected a JSON array of orders or NDJSON"
+        payloads = data
+
+    if len(payloads) > MAX_BATCH:
+        return None, f"At most {MAX_BATCH} orders per batch"
+    return payloads, None
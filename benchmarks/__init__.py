@@ -0,0 +1,3 @@
+# Benchmark scripts for the SRMS backend.
+# Run them from the repository root, e.g.:
+#   python -m benchmarks.bench_journal
@@ -0,0 +1,145 @@
+"""
+Admission control at a lunch peak (SRMS_ADMISSION=1, admission.py).
+
+--pollers dashboard threads, each its own client, poll GET /api/analytics,
+/api/analytics/timeseries and /api/orders?limit=50 back to back, while
+--writers threads (till and kitchen tablets, also one client each) create
+orders and move their statuses. The same load runs with admission control
+off and on, in turns; reported for the orders (critical class) and the
+polls (background, and normal for the order list): requests/s, p50 and
+p99 of the admitted requests, and how many were answered 429.
+
+Also the cost of one AdmissionControl.check() (admitted and shed).
+
+Requests go through the Flask test client in this process, so the
+threads share one GIL: a 429 costs the server a few microseconds, so
+every shed poll is CPU time the orders get back.
+
+    python -m benchmarks.bench_admission --pollers 16 --writers 4 --seconds 5
+"""
+import argparse
+import importlib
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.harness import percentile
+
+POLLS = ["/api/analytics", "/api/analytics/timeseries?granularity=hour", "/api/orders?limit=50"]
+
+
+def run(mod, pollers, writers, seconds, type_key, token):
+    """{"orders" | "polls": (latencies of admitted requests, shed count)} for one run."""
+    stop = threading.Event()
+    results = defaultdict(lambda: ([], [0]))
+    lock = threading.Lock()
+
+    def poller(i):
+        client = mod.app.test_client()
+        environ = {"REMOTE_ADDR": f"10.1.{i // 250}.{i % 250}"}
+        mine, shed = [], 0
+        n = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            r = client.get(POLLS[n % len(POLLS)], environ_base=environ)
+            n += 1
+            if r.status_code == 429:
+                shed += 1
+            else:
+                mine.append(time.perf_counter() - start)
+        with lock:
+            results["polls"][0].extend(mine)
+            results["polls"][1][0] += shed
+
+    def writer(i):
+        client = mod.app.test_client()
+        environ = {"REMOTE_ADDR": f"10.2.0.{i}"}
+        headers = {"Authorization": f"Bearer {token}"}
+        rnd = random.Random(i)
+        mine, shed = [], 0
+        created = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            if created and rnd.random() < 0.4:
+                r = client.patch(f"/api/orders/{rnd.choice(created)}/status", environ_base=environ,
+                                 headers=headers, json={"status": rnd.choice(["PREPARING", "READY"])})
+            else:
+                r = client.post("/api/orders", environ_base=environ,
+                                json={type_key: "DINE_IN", "items": [rnd.randint(1, 7) for _ in range(3)]})
+                if r.status_code == 201:
+                    created.append(r.get_json()["id"])
+            if r.status_code == 429:
+                shed += 1
+            else:
+                mine.append(time.perf_counter() - start)
+            time.sleep(0.01)          # a person at a till, not a load generator
+        with lock:
+            results["orders"][0].extend(mine)
+            results["orders"][1][0] += shed
+
+    threads = [threading.Thread(target=poller, args=(i,)) for i in range(pollers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {kind: (sorted(latencies), shed[0]) for kind, (latencies, shed) in results.items()}
+
+
+def check_cost(mod, n=200000):
+    admission = type(mod.ADMISSION)()
+    start = time.perf_counter()
+    for i in range(n):
+        admission.check("GET", "/api/menu", f"10.0.{i % 50}.1", now=i * 1e-5)
+    admitted = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for i in range(n):
+        admission.check("GET", "/api/analytics", "10.9.9.9", now=1e6)
+    shed = (time.perf_counter() - start) / n * 1e6
+    return admitted, shed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="newstyle")
+    parser.add_argument("--pollers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rate", type=float, default=300, help="SRMS_ADMIT_RATE for the 'on' runs")
+    args = parser.parse_args()
+
+    os.environ["SRMS_ADMISSION"] = "1"
+    os.environ["SRMS_ADMIT_RATE"] = str(args.rate)
+    os.environ.setdefault("SRMS_METRICS", "0")
+    mod = importlib.import_module(args.app)
+    type_key = "order_type" if args.app == "newstyle" else "type"
+    token = mod.AUTH.issue("chef", "CHEF")
+    with mod.STORE.transaction():
+        for i in range(5000):
+            mod.commit_order(mod.build_order({"customer_name": f"History {i}", "items": [1, 2, 3]}))
+
+    print(f"{args.app}: {args.pollers} dashboard pollers, {args.writers} order writers, "
+          f"{args.seconds:g}s per run, server bucket {args.rate:g} req/s\n")
+    print(f"{'admission':10} {'requests':11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'429s':>7}")
+    for enabled in (False, True, False, True):
+        mod.ADMISSION.enabled = enabled
+        results = run(mod, args.pollers, args.writers, args.seconds, type_key, token)
+        for kind in ("orders", "polls"):
+            latencies, shed = results[kind]
+            print(f"{'on' if enabled else 'off':10} {kind:11} {len(latencies) / args.seconds:>8.0f} "
+                  f"{(percentile(latencies, 50) or 0) * 1e3:>8.2f} {(percentile(latencies, 99) or 0) * 1e3:>8.2f} "
+                  f"{shed:>7}")
+
+    stats = mod.ADMISSION.stats()
+    print(f"\n/api/admission: shed {stats['shed_total']} ({stats['shed_ratio']:.0%}), by class "
+          f"{mod.ADMISSION.shed_by(0)}, by reason {mod.ADMISSION.shed_by(1)}")
+    admitted_us, shed_us = check_cost(mod)
+    print(f"AdmissionControl.check(): {admitted_us:.2f} us admitted, {shed_us:.2f} us shed")
+
+
+if __name__ == "__main__":
+    main()
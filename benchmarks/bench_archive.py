@@ -0,0 +1,104 @@
+"""
+Order archive: what moving finished orders out of the live store buys.
+
+Loads --orders orders into an in-memory store (--active of them still
+open, the rest COMPLETED or CANCELLED), then compares before and after
+archive_orders():
+  - live order count and a full GET /api/orders-style listing
+  - totals over history: a Python loop over order objects vs
+    OrderArchive.summary() (column reductions, numpy if installed)
+  - get_order() of an archived order (decoded from the doc column)
+
+    python -m benchmarks.bench_archive --orders 200000 --active 2000
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+import archive
+from archive import OrderArchive
+from models import now_us
+from storage import MemoryStorage
+
+
+def timed(fn, repeat=5):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1e3
+
+
+def loop_summary(orders):
+    """Archive-style totals the way the live analytics would compute them."""
+    out = {"total_orders": 0, "cancelled_orders": 0, "total_revenue": 0.0, "counts": {}}
+    for o in orders:
+        out["total_orders"] += 1
+        if o["status"] == "CANCELLED":
+            out["cancelled_orders"] += 1
+            continue
+        out["total_revenue"] += o["total"]
+        for it in o["items"]:
+            out["counts"][it["name"]] = out["counts"].get(it["name"], 0) + it["qty"]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--active", type=int, default=2000)
+    args = parser.parse_args()
+
+    import oldstyle
+    rnd = random.Random(5)
+    menu = {m["id"]: m for m in oldstyle.STORE.list_menu()}
+    tmp = tempfile.mkdtemp(prefix="srms-archive-")
+    load_order = oldstyle.ORDER_MODEL.from_dict
+    store = MemoryStorage("type", [], [], [], load_order=load_order,
+                          archive=OrderArchive(tmp, "type", load_order)).open()
+    try:
+        old = now_us() - 7 * 86400 * 1000000
+        with store.transaction():
+            for i in range(args.orders):
+                order = oldstyle.build_order({
+                    "customer_name": f"Guest {i}",
+                    "type": rnd.choice(["WALK_IN", "DINE_IN", "DELIVERY"]),
+                    "items": [rnd.randint(1, 7) for _ in range(rnd.randint(1, 4))],
+                }, menu.get)
+                order["id"] = store.next_order_id()
+                if i < args.orders - args.active:
+                    order["status"] = "CANCELLED" if rnd.random() < 0.05 else "COMPLETED"
+                    order["updated_at"] = old
+                store.add_order(order)
+        finished = [o for o in store.all_orders() if o["status"] in archive.ARCHIVE_STATUSES]
+        sample_id = finished[len(finished) // 2]["id"]
+
+        print(f"numpy: {'yes' if archive.np is not None else 'no (pure Python fallback)'}")
+        print(f"{args.orders} orders, {args.active} active\n")
+        _, list_before = timed(lambda: store.find_orders())
+        expected, loop_ms = timed(lambda: loop_summary(finished), 3)
+
+        start = time.perf_counter()
+        moved = store.archive_orders(oldstyle.format_utc_z(now_us()))
+        archive_ms = (time.perf_counter() - start) * 1e3
+
+        _, list_after = timed(lambda: store.find_orders())
+        got, summary_ms = timed(lambda: store.archive.summary(), 3)
+        assert got["total_orders"] == expected["total_orders"] and got["counts"] == expected["counts"]
+        assert abs(got["total_revenue"] - expected["total_revenue"]) < 1e-6 * max(1.0, expected["total_revenue"])
+        _, get_us = timed(lambda: store.get_order(sample_id), 1000)
+
+        print(f"archive_orders(): {len(moved)} orders in {archive_ms:.0f} ms")
+        print(f"{'':28} {'before':>10} {'after':>10}")
+        print(f"{'live orders':28} {args.orders:>10} {len(store.all_orders()):>10}")
+        print(f"{'list all live (ms)':28} {list_before:>10.2f} {list_after:>10.2f}")
+        print(f"{'history totals (ms)':28} {loop_ms:>10.1f} {summary_ms:>10.1f}")
+        print(f"get_order() from archive: {get_us * 1000:.1f} us")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
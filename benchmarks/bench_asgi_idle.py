@@ -0,0 +1,140 @@
+"""
+Thousands of idle long-poll clients on one asgi.py process.
+
+Starts `python asgi.py` in a child process (built-in server, or uvicorn
+with --uvicorn), then from this process:
+  1. parks --clients connections on GET /api/orders?wait=60&since=<now>
+  2. while they wait, times --probes ordinary GET /api/menu requests
+     on one extra connection (the server must stay responsive)
+  3. creates one order and times how long each parked client takes to
+     get its answer
+and reports the server's thread count and RSS before and after parking
+(a thread-per-request server would need one thread per client).
+
+    python -m benchmarks.bench_asgi_idle --clients 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import percentile
+
+
+def proc_status(pid):
+    """(threads, RSS in MiB) of a process, from /proc (Linux)."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                fields[name] = value.split()
+    except OSError:
+        return None, None
+    return int(fields["Threads"][0]), int(fields["VmRSS"][0]) / 1024
+
+
+async def request(reader, writer, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length)) if length else None
+
+
+async def run(port, clients, probes, pid):
+    host = "127.0.0.1"
+    reader, writer = await asyncio.open_connection(host, port)
+    _, order = await request(reader, writer, "POST", "/api/orders", {"items": [1]})
+    since = order["updated_at"]
+    await asyncio.sleep(1.1)    # updated_at has 1 s resolution: start polling in a later second
+    threads_before, rss_before = proc_status(pid)
+
+    connect_gate = asyncio.Semaphore(256)
+    parked = asyncio.Event()
+    waiting = [0]
+    answered = []
+
+    async def client():
+        async with connect_gate:
+            r, w = await asyncio.open_connection(host, port)
+            w.write(f"GET /api/orders?wait=60&since={since} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+            await w.drain()
+        waiting[0] += 1
+        if waiting[0] == clients:
+            parked.set()
+        head = await r.readuntil(b"\r\n\r\n")
+        answered.append((time.perf_counter(), int(head.split(b" ", 2)[1])))
+        w.close()
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(client()) for _ in range(clients)]
+    await parked.wait()
+    await asyncio.sleep(0.5)    # let the server read the last requests
+    park_s = time.perf_counter() - start
+    threads_after, rss_after = proc_status(pid)
+
+    latencies = []
+    for _ in range(probes):
+        t = time.perf_counter()
+        status, _ = await request(reader, writer, "GET", "/api/menu")
+        assert status == 200
+        latencies.append(time.perf_counter() - t)
+    latencies.sort()
+    assert not answered, f"{len(answered)} long polls returned before any change"
+
+    created = time.perf_counter()
+    await request(reader, writer, "POST", "/api/orders", {"items": [2]})
+    await asyncio.gather(*tasks)
+    wake = sorted(t - created for t, _ in answered)
+    ok = sum(1 for _, status in answered if status == 200)
+    writer.close()
+
+    print(f"parked {clients} long polls in {park_s:.2f}s")
+    print(f"server threads: {threads_before} before, {threads_after} with every client waiting")
+    if rss_before is not None:
+        print(f"server RSS: {rss_before:.0f} MiB before, {rss_after:.0f} MiB after "
+              f"({(rss_after - rss_before) * 1024 / clients:.1f} KiB per client)")
+    print(f"GET /api/menu while they wait: p50 {percentile(latencies, 50) * 1e3:.2f} ms, "
+          f"p99 {percentile(latencies, 99) * 1e3:.2f} ms ({probes} requests)")
+    print(f"one new order answered {ok}/{clients} polls: first {wake[0] * 1e3:.0f} ms, "
+          f"p50 {percentile(wake, 50) * 1e3:.0f} ms, last {wake[-1] * 1e3:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--uvicorn", action="store_true", help="serve with uvicorn (must be installed)")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if args.uvicorn:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", "5071", "--log-level", "warning",
+               "--backlog", "4096"]
+    else:
+        cmd = [sys.executable, "asgi.py", "--builtin", "--port", "0"]
+    server = subprocess.Popen(cmd, cwd=root, stdout=subprocess.PIPE, text=True)
+    try:
+        if args.uvicorn:
+            port = 5071
+            time.sleep(3)
+        else:
+            port = int(server.stdout.readline().rsplit(":", 1)[1])
+        asyncio.run(run(port, args.clients, args.probes, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Staff auth cost (auth.py): what logging in costs once, and what the
+token check adds to every request of a role-checked route.
+
+  login          one PBKDF2 hash (paid once per shift, not per request)
+  issue          signing a new token
+  verify, cold   HMAC + decode of a token not seen before
+  verify, cached the same token again (LRU hit + expiry check)
+  verify, forged tokens with a bad signature
+  guard          the whole @AUTH.require wrapper: header parsing, verify,
+                 role check, g.user (inside a request context)
+
+Then PATCH /api/orders/<id>/status (update_order_status, the hottest
+guarded route) through the Flask test client, alternating requests
+with the check on and off (AUTH.enabled = False) so both see the same
+orders: per-request time and the difference.
+
+    python -m benchmarks.bench_auth --app newstyle --requests 20000
+"""
+import argparse
+import importlib
+import os
+import random
+import time
+
+from benchmarks.harness import percentile
+
+
+def per_call_us(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def status_updates(auth, client, headers, n, rnd):
+    """{enabled: sorted latencies}, check on and off by turns."""
+    times = {True: [], False: []}
+    for i in range(n):
+        auth.enabled = enabled = i % 2 == 0
+        order_id = rnd.randint(1, 1000)
+        status = rnd.choice(["PREPARING", "READY", "COMPLETED"])
+        start = time.perf_counter()
+        r = client.patch(f"/api/orders/{order_id}/status", json={"status": status}, headers=headers)
+        times[enabled].append(time.perf_counter() - start)
+        assert r.status_code in (200, 400), r.status_code
+    auth.enabled = True
+    return {enabled: sorted(values) for enabled, values in times.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="newstyle")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=100000, help="verify calls per row")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SRMS_METRICS", "0")
+    mod = importlib.import_module(args.app)
+    auth = mod.AUTH
+    login_path = "/api/login" if args.app == "newstyle" else "/api/auth/login"
+    client = mod.app.test_client()
+
+    start = time.perf_counter()
+    reply = client.post(login_path, json={"username": "chef", "password": "chef123"}).get_json()
+    login_ms = (time.perf_counter() - start) * 1e3
+    token = reply["token"]
+    fresh = [auth.issue(f"user{i}", "CHEF") for i in range(args.tokens)]
+    forged = [t[:-2] + ("AA" if not t.endswith("AA") else "BB") for t in fresh]
+    auth.decode.cache_clear()
+
+    print(f"{args.app}: auth costs per call")
+    print(f"  login (POST {login_path}) {login_ms:>9.1f} ms")
+    print(f"  issue                     {per_call_us(lambda i: auth.issue('chef', 'CHEF'), args.tokens):>9.2f} us")
+    print(f"  verify, cold              {per_call_us(lambda i: auth.verify(fresh[i]), args.tokens):>9.2f} us")
+    print(f"  verify, cached            {per_call_us(lambda i: auth.verify(token), args.tokens):>9.2f} us")
+    print(f"  verify, forged            {per_call_us(lambda i: auth.verify(forged[i]), args.tokens):>9.2f} us")
+
+    guarded = auth.require("ADMIN", "WAITER", "CHEF")(lambda: None)
+    with mod.app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+        print(f"  guard (@AUTH.require)     {per_call_us(lambda i: guarded(), args.tokens):>9.2f} us")
+
+    with mod.STORE.transaction():
+        for i in range(1000):
+            mod.commit_order(mod.build_order({"customer_name": f"Bench {i}", "items": [1, 2]}))
+    headers = {"Authorization": f"Bearer {token}"}
+    times = status_updates(auth, client, headers, args.requests, random.Random(3))
+
+    print(f"\nPATCH /api/orders/<id>/status, {args.requests // 2} requests each")
+    print(f"{'':10} {'req/s':>8} {'p50 us':>8} {'p99 us':>8}")
+    for label, enabled in (("auth on", True), ("auth off", False)):
+        values = times[enabled]
+        print(f"{label:10} {len(values) / sum(values):>8.0f} {percentile(values, 50) * 1e6:>8.1f} "
+              f"{percentile(values, 99) * 1e6:>8.1f}")
+    delta = (percentile(times[True], 50) - percentile(times[False], 50)) * 1e6
+    print(f"\nauth adds ~{delta:.1f} us per request at p50")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Batch ingestion throughput: N single POST /api/orders vs the same N
+orders sent through POST /api/orders/batch (JSON array and NDJSON).
+
+    python -m benchmarks.bench_batch --app oldstyle --orders 5000 --batch-size 200
+"""
+import argparse
+import importlib
+import json
+import random
+import time
+
+
+def make_orders(n, type_key):
+    rnd = random.Random(3)
+    return [
+        {
+            "customer_name": f"Partner order {i}",
+            type_key: "DELIVERY",
+            "delivery_address": "Street 9, Building 4",
+            "items": [{"id": rnd.randint(1, 7), "qty": rnd.randint(1, 3)} for _ in range(rnd.randint(1, 5))],
+        }
+        for i in range(n)
+    ]
+
+
+def bench_single(client, orders):
+    start = time.perf_counter()
+    for o in orders:
+        client.post("/api/orders", json=o)
+    return time.perf_counter() - start
+
+
+def bench_batch(client, orders, size, ndjson):
+    start = time.perf_counter()
+    for i in range(0, len(orders), size):
+        chunk = orders[i:i + size]
+        if ndjson:
+            body = "\n".join(json.dumps(o) for o in chunk)
+            client.post("/api/orders/batch", data=body, content_type="application/x-ndjson")
+        else:
+            client.post("/api/orders/batch", json=chunk)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="oldstyle", choices=["newstyle", "oldstyle"])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    app_module = importlib.import_module(args.app)
+    client = app_module.app.test_client()
+    orders = make_orders(args.orders, "order_type" if args.app == "newstyle" else "type")
+
+    runs = [
+        ("single POSTs", lambda: bench_single(client, orders)),
+        (f"batch JSON x{args.batch_size}", lambda: bench_batch(client, orders, args.batch_size, False)),
+        (f"batch NDJSON x{args.batch_size}", lambda: bench_batch(client, orders, args.batch_size, True)),
+    ]
+    baseline = None
+    for name, run in runs:
+        elapsed = run()
+        rate = args.orders / elapsed
+        baseline = baseline or rate
+        print(f"{name:<22} {rate:10.0f} orders/s  ({rate / baseline:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
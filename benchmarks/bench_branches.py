@@ -0,0 +1,153 @@
+"""
+Branch shards (SRMS_BRANCHES, shards.py): does a rush at one branch slow
+down the others?
+
+Loads --branches branches with --history orders each, then measures the
+lookups of a quiet branch (GET /api/orders/<id> and GET /api/orders?
+limit=50, from --readers threads) while --writers threads create orders
+and change statuses:
+  idle          nobody writes
+  other branch  the writers hammer a different branch
+  same branch   the writers hammer the quiet branch itself (what every
+                branch would see with one shared store)
+plus the cost of the scatter-gather GET /api/branches/analytics and of
+one BranchLocal lookup (STORE.get_order through the proxy vs. direct).
+
+Requests go through the Flask test client in this process, so all
+threads share the GIL: the difference between "other branch" and "same
+branch" is the lock and index contention that sharding removes.
+
+    python -m benchmarks.bench_branches --app oldstyle --branches 4 --history 20000
+"""
+import argparse
+import importlib
+import os
+import random
+import threading
+import time
+
+from benchmarks.harness import TestClientCaller, percentile
+from benchmarks.loadtest import TYPES
+
+
+def preload(mod, branch_id, n, type_key, rnd):
+    with mod.BRANCHES.use(branch_id), mod.STORE.transaction():
+        for i in range(n):
+            order = mod.build_order({"customer_name": f"History {i}", type_key: rnd.choice(TYPES),
+                                     "items": [rnd.randint(1, 7) for _ in range(rnd.randint(1, 4))]})
+            r = rnd.random()
+            order["status"] = "COMPLETED" if r < 0.9 else "RECEIVED"
+            mod.commit_order(order)
+
+
+def run(call, quiet, busy, history, readers, writers, seconds, type_key):
+    """Lookup latencies at `quiet` while `writers` threads write to `busy` (None: no writers)."""
+    stop = threading.Event()
+    latencies = []
+    writes = [0]
+    lock = threading.Lock()
+
+    def reader(seed):
+        rnd = random.Random(seed)
+        mine = []
+        while not stop.is_set():
+            if rnd.random() < 0.5:
+                path = f"/api/orders/{rnd.randint(1, history)}?branch={quiet}"
+            else:
+                path = f"/api/orders?limit=50&branch={quiet}"
+            start = time.perf_counter()
+            status, _ = call("GET", path)
+            mine.append(time.perf_counter() - start)
+            assert status == 200, (path, status)
+        with lock:
+            latencies.extend(mine)
+
+    def writer(seed):
+        rnd = random.Random(seed)
+        n = 0
+        while not stop.is_set():
+            if rnd.random() < 0.5:
+                call("POST", f"/api/orders?branch={busy}",
+                     {type_key: rnd.choice(TYPES), "items": [rnd.randint(1, 7) for _ in range(3)]})
+            else:
+                call("PATCH", f"/api/orders/{rnd.randint(1, history)}/status?branch={busy}",
+                     {"status": rnd.choice(["PREPARING", "READY", "COMPLETED"])})
+            n += 1
+        with lock:
+            writes[0] += n
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    if busy is not None:
+        threads += [threading.Thread(target=writer, args=(100 + i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return latencies, writes[0] / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="newstyle")
+    parser.add_argument("--branches", type=int, default=4)
+    parser.add_argument("--history", type=int, default=20000, help="orders per branch")
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=6)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    branch_ids = ["main"] + [f"branch{i}" for i in range(1, args.branches)]
+    os.environ["SRMS_BRANCHES"] = ",".join(branch_ids)
+    os.environ.setdefault("SRMS_METRICS", "0")
+    mod = importlib.import_module(args.app)
+    type_key = "order_type" if args.app == "newstyle" else "type"
+    rnd = random.Random(1)
+    start = time.perf_counter()
+    for branch_id in branch_ids:
+        preload(mod, branch_id, args.history, type_key, rnd)
+    print(f"{args.app}: {len(branch_ids)} branches x {args.history} orders loaded in "
+          f"{time.perf_counter() - start:.1f}s; {args.readers} readers, {args.writers} writers, "
+          f"{args.seconds:g}s per row\n")
+
+    call = TestClientCaller(mod.app, mod.AUTH.issue("chef", "CHEF"))
+    quiet = branch_ids[0]
+    other = branch_ids[-1] if len(branch_ids) > 1 else None
+    print(f"{'writers at':14} {'lookups/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'writes/s':>9}")
+    for label, busy in (("nobody", None), ("other branch", other), ("same branch", quiet)):
+        if label == "other branch" and other is None:
+            continue
+        latencies, write_rate = run(call, quiet, busy, args.history, args.readers, args.writers,
+                                    args.seconds, type_key)
+        print(f"{label:14} {len(latencies) / args.seconds:>10.0f} {percentile(latencies, 50) * 1e3:>8.2f} "
+              f"{percentile(latencies, 99) * 1e3:>8.2f} {write_rate:>9.0f}")
+
+    client = mod.app.test_client()
+    for path in ("/api/analytics", "/api/branches/analytics"):
+        times = []
+        for _ in range(200):
+            start = time.perf_counter()
+            client.get(path)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        print(f"\nGET {path}: p50 {percentile(times, 50) * 1e3:.2f} ms ({len(branch_ids)} branches)", end="")
+    print()
+
+    shard = mod.BRANCHES.shards[quiet]
+    n = 200000
+    start = time.perf_counter()
+    for i in range(n):
+        shard.store.get_order(1)
+    direct = (time.perf_counter() - start) / n * 1e9
+    start = time.perf_counter()
+    for i in range(n):
+        mod.STORE.get_order(1)
+    proxied = (time.perf_counter() - start) / n * 1e9
+    print(f"\nSTORE.get_order(): {direct:.0f} ns direct, {proxied:.0f} ns through the branch proxy "
+          f"({proxied - direct:+.0f} ns per module-level name used)")
+
+
+if __name__ == "__main__":
+    main()
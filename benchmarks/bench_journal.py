@@ -0,0 +1,111 @@
+"""
+Write-ahead journal benchmark.
+
+1. Write path: average cost of Journal.record() for an order-sized row,
+   with and without waiting for fsync (group commit), from 1 and from
+   several threads, compared to doing nothing.
+2. Recovery: time to load snapshot + replay the journal tail for N orders.
+
+    python -m benchmarks.bench_journal --orders 1000000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from persistence import Journal
+
+
+def make_order(i):
+    return {
+        "id": i,
+        "customer_name": "Guest",
+        "type": "DINE_IN",
+        "table_number": "T4",
+        "delivery_address": None,
+        "items": [
+            {"menu_id": 5, "name": "Mandi", "price": 30.0, "qty": 1},
+            {"menu_id": 1, "name": "Karak Tea", "price": 6.0, "qty": 2},
+        ],
+        "total": 42.0,
+        "status": "RECEIVED",
+        "created_at": "2026-10-16T19:30:00.000000Z",
+        "updated_at": "2026-10-16T19:30:00.000000Z",
+        "logs": [{"timestamp": "2026-10-16T19:30:00.000000Z", "message": "Order created", "status": "RECEIVED"}],
+    }
+
+
+def bench_writes(n, threads, sync):
+    data_dir = tempfile.mkdtemp(prefix="srms-wal-")
+    journal = Journal(data_dir, sync=sync).start()
+    per_thread = n // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            journal.record("orders", make_order(offset + i))
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    journal.wait_durable(journal.seq)
+    elapsed = time.perf_counter() - start
+    journal.close()
+    shutil.rmtree(data_dir)
+    return elapsed / (per_thread * threads) * 1e6, (per_thread * threads) / elapsed
+
+
+def bench_baseline(n):
+    start = time.perf_counter()
+    for i in range(n):
+        make_order(i)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def bench_recovery(orders, tail):
+    data_dir = tempfile.mkdtemp(prefix="srms-wal-")
+    rows = [make_order(i + 1) for i in range(orders)]
+
+    # snapshot holding everything except the tail, the tail lives in the log
+    snap = rows[:orders - tail]
+    journal = Journal(data_dir, tables_fn=lambda: {"orders": snap}, sync=False).start()
+    journal.snapshot()
+    for row in rows[orders - tail:]:
+        journal.record("orders", row)
+    journal.close()
+
+    start = time.perf_counter()
+    tables = Journal(data_dir).recover()
+    elapsed = time.perf_counter() - start
+    assert len(tables["orders"]) == orders
+    size = sum(os.path.getsize(os.path.join(data_dir, f)) for f in os.listdir(data_dir))
+    shutil.rmtree(data_dir)
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--tail", type=int, default=50000, help="orders replayed from the log")
+    args = parser.parse_args()
+
+    print(f"baseline (build row only)      : {bench_baseline(args.writes):8.2f} us/op")
+    for threads in (1, args.threads):
+        for sync in (False, True):
+            us, ops = bench_writes(args.writes, threads, sync)
+            mode = "fsync-wait" if sync else "async     "
+            print(f"record() {mode} x{threads:<3} threads: {us:8.2f} us/op  {ops:10.0f} ops/s")
+
+    elapsed, size = bench_recovery(args.orders, min(args.tail, args.orders))
+    print(f"recovery of {args.orders} orders ({args.tail} from log): "
+          f"{elapsed:.2f} s  ({size / 1e6:.0f} MB on disk)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+GET /api/orders encoding cost at 1k / 10k / 100k orders.
+
+Compares, for the same list of orders:
+  - Flask's default provider (stdlib json, sorted keys) - the old jsonify
+  - encoding.dumps() of the whole payload (orjson if installed)
+  - FragmentCache, cold (every order encoded) and warm (only joins)
+and times the full request through the test client with a warm cache.
+
+    python -m benchmarks.bench_json --app newstyle --sizes 1000,10000,100000
+"""
+import argparse
+import importlib
+import random
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+import encoding
+from encoding import FragmentCache
+
+
+def load_orders(app_module, type_key, n):
+    rnd = random.Random(7)
+    menu = {m["id"]: m for m in app_module.STORE.list_menu()}
+    with app_module.STORE.transaction():
+        for i in range(n):
+            order = app_module.build_order({
+                "customer_name": f"Guest {i}",
+                type_key: rnd.choice(["WALK_IN", "DINE_IN", "DELIVERY"]),
+                "items": [rnd.randint(1, 7) for _ in range(rnd.randint(1, 4))],
+            }, menu.get)
+            app_module.commit_order(order)
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="newstyle", choices=["newstyle", "oldstyle"])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    args = parser.parse_args()
+
+    app_module = importlib.import_module(args.app)
+    type_key = "order_type" if args.app == "newstyle" else "type"
+    app = app_module.app
+    client = app.test_client()
+    flask_default = DefaultJSONProvider(app)
+
+    print(f"encoder backend: {encoding.BACKEND}\n")
+    print(f"{'orders':>8} {'flask jsonify':>14} {'dumps':>9} {'frag cold':>10} {'frag warm':>10} {'GET (warm)':>11}   ms")
+    loaded = 0
+    for size in (int(s) for s in args.sizes.split(",")):
+        load_orders(app_module, type_key, size - loaded)
+        loaded = size
+        orders = app_module.STORE.find_orders()
+        repeat = max(1, 20000 // size)
+
+        # the old path: plain dict orders through Flask's own provider
+        dict_orders = [o.__json__() for o in orders]
+        with app.app_context():
+            old = timed(lambda: flask_default.response({"orders": dict_orders}), repeat)
+        plain = timed(lambda: encoding.dumps({"orders": orders}), repeat)
+        cold = timed(lambda: FragmentCache().encode_list(orders), repeat)
+        cache = FragmentCache()
+        warm = timed(lambda: cache.encode_list(orders), repeat)
+        full = timed(lambda: client.get("/api/orders"), repeat)
+        print(f"{size:>8} {old:>14.2f} {plain:>9.2f} {cold:>10.2f} {warm:>10.2f} {full:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Memory per order: plain dicts (the old representation) vs the slotted
+models.Order objects, measured with tracemalloc.
+
+Every order gets 1-5 lines and moves RECEIVED -> PREPARING -> READY,
+so it carries three log entries, like a typical finished kitchen ticket.
+
+    python -m benchmarks.bench_memory --app oldstyle --orders 100000
+"""
+import argparse
+import gc
+import importlib
+import random
+import tracemalloc
+
+from models import now_us
+
+
+def build_orders(app_module, type_key, n):
+    rnd = random.Random(1)
+    menu = {m["id"]: m for m in app_module.STORE.list_menu()}
+    orders = []
+    for i in range(n):
+        order = app_module.build_order({
+            "customer_name": f"Guest {i}",
+            type_key: rnd.choice(["WALK_IN", "DINE_IN", "DELIVERY"]),
+            "items": [rnd.randint(1, 7) for _ in range(rnd.randint(1, 5))],
+        }, menu.get)
+        order["id"] = i + 1
+        for status in ("PREPARING", "READY"):
+            order["status"] = status
+            order["updated_at"] = now_us()
+            app_module.add_log(order, f"Status changed to {status}" if type_key == "type" else status)
+        orders.append(order)
+    return orders
+
+
+def as_dict(order):
+    """The same order the way it used to be stored."""
+    out = {k: order[k] for k in order.keys()}
+    for k, v in out.items():
+        if isinstance(v, (list, tuple)):
+            out[k] = [{f: rec[f] for f in rec.keys()} for rec in v]
+    return out
+
+
+def measure(fn):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="oldstyle", choices=["newstyle", "oldstyle"])
+    parser.add_argument("--orders", type=int, default=100000)
+    args = parser.parse_args()
+
+    app_module = importlib.import_module(args.app)
+    type_key = "order_type" if args.app == "newstyle" else "type"
+
+    orders, model_bytes = measure(lambda: build_orders(app_module, type_key, args.orders))
+    dicts, dict_bytes = measure(lambda: [as_dict(o) for o in orders])
+
+    n = args.orders
+    print(f"{n} orders ({args.app} layout)")
+    print(f"  dict orders:   {dict_bytes / n:8.0f} bytes/order  ({dict_bytes / 2 ** 20:7.1f} MiB)")
+    print(f"  models.Order:  {model_bytes / n:8.0f} bytes/order  ({model_bytes / 2 ** 20:7.1f} MiB)")
+    print(f"  saved:         {1 - model_bytes / dict_bytes:8.0%}")
+
+
+if __name__ == "__main__":
+    main()
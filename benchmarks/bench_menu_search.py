@@ -0,0 +1,119 @@
+"""
+Menu search benchmark (GET /api/menu?q=&category=&min_price=&max_price=&sort=).
+
+Generates menus of --sizes items and times MenuIndex.search() for exact,
+prefix and misspelt words, a category and a price range, next to a plain
+scan of the menu with the same matching rules (what a client filtering
+the full GET /api/menu had to do). Both must return the same items.
+Then times MenuIndex.update() for a price change and a rename, the work
+PUT/PATCH /api/menu/<id> adds to keep the index current.
+
+    python -m benchmarks.bench_menu_search --sizes 100,1000,10000
+"""
+import argparse
+import random
+import time
+
+from menu_search import MenuIndex, max_edits, normalize, within_edits, words
+
+DISHES = ["pizza", "biryani", "burger", "shawarma", "falafel", "hummus", "kebab", "tikka", "masala",
+          "karak", "tea", "coffee", "latte", "salad", "fattoush", "tabbouleh", "noodles", "ramen",
+          "sushi", "curry", "paneer", "chicken", "lamb", "beef", "prawn", "mushroom", "truffle",
+          "margherita", "pepperoni", "mango", "lassi", "kunafa", "baklava", "brownie", "cheesecake"]
+STYLES = ["spicy", "grilled", "crispy", "classic", "royal", "smoked", "garlic", "cheesy", "vegan",
+          "special", "mini", "double", "creamy", "tandoori", "zaatar"]
+CATEGORIES = ["Main", "Drinks", "Dessert", "Starters", "Sides", "Breakfast"]
+QUERIES = [("exact", {"q": "chicken biryani"}), ("prefix", {"q": "shaw"}),
+           ("typo", {"q": "biryni"}), ("category", {"category": "drinks"}),
+           ("price range", {"min_price": 20, "max_price": 30, "sort": "price"}),
+           ("all combined", {"q": "spicy chiken", "category": "main", "max_price": 40})]
+
+
+def make_menu(n, seed=3):
+    rnd = random.Random(seed)
+    return [{"id": i, "name": f"{rnd.choice(STYLES).title()} {rnd.choice(DISHES).title()} "
+                              f"{rnd.choice(DISHES).title()}",
+             "price": rnd.randint(5, 90), "category": rnd.choice(CATEGORIES), "img": ""}
+            for i in range(1, n + 1)]
+
+
+def word_score(query_word, name_words):
+    best = 0
+    for word in name_words:
+        if word == query_word:
+            return 3
+        if word.startswith(query_word):
+            best = max(best, 2)
+        elif best < 1 and max_edits(query_word) and within_edits(query_word, word, max_edits(query_word)):
+            best = 1
+    return best
+
+
+def scan(menu, q=None, category=None, min_price=None, max_price=None, sort=None):
+    """Same rules as MenuIndex.search, one item at a time."""
+    query_words = list(dict.fromkeys(words(q or "")))
+    scored = []
+    for pos, item in enumerate(menu):
+        if category and normalize(item.get("category") or "") != normalize(category):
+            continue
+        price = float(item.get("price") or 0)
+        if (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+            continue
+        name_words = set(words(item["name"]))
+        total = 0
+        for query_word in query_words:
+            score = word_score(query_word, name_words)
+            if not score:
+                break
+            total += score
+        else:
+            scored.append((item, total, pos))
+    if sort == "price":
+        scored.sort(key=lambda s: (float(s[0]["price"]), s[2]))
+    else:
+        scored.sort(key=lambda s: (-s[1], s[2]))
+    return [item for item, _, _ in scored]
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for n in [int(s) for s in args.sizes.split(",")]:
+        menu = make_menu(n)
+        index = MenuIndex()
+        build_us, _ = per_call(lambda: index.rebuild(menu), 1)
+        print(f"\n{n} menu items (index built in {build_us / 1e3:.1f} ms)")
+        print(f"{'query':14} {'matches':>8} {'index us':>10} {'scan us':>10} {'speedup':>8}")
+        for label, kwargs in QUERIES:
+            index_us, found = per_call(lambda: index.search(**kwargs), args.repeat)
+            scan_us, expected = per_call(lambda: scan(menu, **kwargs), max(1, args.repeat // 10))
+            assert [i["id"] for i in found] == [i["id"] for i in expected], label
+            print(f"{label:14} {len(found):>8} {index_us:>10.1f} {scan_us:>10.1f} {scan_us / index_us:>7.0f}x")
+
+        rnd = random.Random(9)
+        changes = [dict(menu[rnd.randrange(n)]) for _ in range(200)]
+        for item in changes:
+            item["price"] = item["price"] + 1
+        start = time.perf_counter()
+        for item in changes:
+            index.update(item)
+        price_us = (time.perf_counter() - start) / len(changes) * 1e6
+        start = time.perf_counter()
+        for item in changes:
+            index.update(dict(item, name=f"{rnd.choice(STYLES).title()} {rnd.choice(DISHES).title()}"))
+        rename_us = (time.perf_counter() - start) / len(changes) * 1e6
+        print(f"update(): {price_us:.1f} us per price change, {rename_us:.1f} us per rename")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+/api/recommendations latency: the old category/price scan over the
+whole menu vs the co-occurrence recommender, at several menu sizes.
+
+The recommender is trained on synthetic history first (popular items
+and a few "combo" pairs), then both answer the same random carts.
+
+    python -m benchmarks.bench_recommender --sizes 7,500,5000 --orders 20000
+"""
+import argparse
+import random
+import time
+
+from recommender import CoOccurrenceRecommender
+
+CATEGORIES = ["Drinks", "Main", "Side", "Dessert"]
+
+
+def make_menu(n, rnd):
+    return [
+        {"id": i, "name": f"Item {i}", "price": round(rnd.uniform(3, 60), 2), "category": rnd.choice(CATEGORIES)}
+        for i in range(1, n + 1)
+    ]
+
+
+def legacy_recommendations(menu, current_item_ids):
+    """simple_recommendations() as it was: three passes over the menu per call."""
+    if not current_item_ids:
+        return []
+    current_items = [m for m in menu if m["id"] in current_item_ids]
+    current_cats = {m["category"] for m in current_items}
+    candidates = [m for m in menu if m["id"] not in current_item_ids and m["category"] in current_cats]
+    if not candidates:
+        candidates = [m for m in menu if m["id"] not in current_item_ids]
+    return sorted(candidates, key=lambda x: x["price"], reverse=True)[:3]
+
+
+def make_history(n_items, n_orders, rnd):
+    # skewed popularity + each item has a usual companion
+    weights = [1 / (i ** 0.8) for i in range(1, n_items + 1)]
+    companion = {i: rnd.randint(1, n_items) for i in range(1, n_items + 1)}
+    for _ in range(n_orders):
+        cart = rnd.choices(range(1, n_items + 1), weights, k=rnd.randint(1, 4))
+        yield cart + [companion[cart[0]]]
+
+
+def per_call_us(fn, carts):
+    start = time.perf_counter()
+    for cart in carts:
+        fn(cart)
+    return (time.perf_counter() - start) / len(carts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="7,500,5000")
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'menu':>6} {'old us/call':>12} {'new us/call':>12} {'record us/order':>16} {'row entries':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rnd = random.Random(size)
+        menu = make_menu(size, rnd)
+        by_id = {m["id"]: m for m in menu}
+        history = list(make_history(size, args.orders, rnd))
+
+        recs = CoOccurrenceRecommender()
+        start = time.perf_counter()
+        for cart in history:
+            recs.record(cart)
+        record_us = (time.perf_counter() - start) / len(history) * 1e6
+
+        carts = [rnd.sample(range(1, size + 1), min(size, rnd.randint(1, 3))) for _ in range(args.queries)]
+        old = per_call_us(lambda cart: legacy_recommendations(menu, cart), carts)
+        new = per_call_us(lambda cart: [by_id[i] for i in recs.recommend(cart, 3)], carts)
+        entries = sum(len(row) for row in recs.rows.values())
+        print(f"{size:>6} {old:>12.1f} {new:>12.1f} {record_us:>16.1f} {entries:>12}")
+
+
+if __name__ == "__main__":
+    main()
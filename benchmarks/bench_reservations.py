@@ -0,0 +1,85 @@
+"""
+Reservation availability benchmark.
+
+Books up to a year of evenings (random parties, refused ones included)
+and times GET /api/reservations/availability-style queries on the
+ReservationBook after 1 day, 1 month and 1 year of bookings, next to a
+plain scan of the full reservation list (what a client had to do before).
+
+    python -m benchmarks.bench_reservations --days 365 --per-day 60
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from reservations import ReservationBook, ReservationError
+
+
+def booking_requests(days, per_day, seed=11):
+    rnd = random.Random(seed)
+    start = date(2026, 1, 1)
+    for d in range(days):
+        day = (start + timedelta(days=d)).isoformat()
+        for _ in range(per_day):
+            hour, half = rnd.randint(12, 21), rnd.choice((0, 30))
+            yield day, "%02d:%02d" % (hour, half), rnd.choice((1, 2, 2, 3, 4, 4, 5, 6, 8))
+
+
+def scan_availability(reservations, day, size):
+    """Old way: filter the whole list, then count tables per slot."""
+    todays = [r for r in reservations if r["date"] == day]
+    probe = ReservationBook()
+    probe.rebuild(todays)
+    return probe.availability(day, size)
+
+
+def time_queries(fn, days, repeat):
+    rnd = random.Random(5)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(days[rnd.randrange(len(days))], rnd.choice((2, 4, 6)))
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--per-day", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    book = ReservationBook()
+    reservations = []
+    refused = 0
+    checkpoints = sorted({1, min(30, args.days), args.days})
+    booked_days = []
+    current = None
+
+    print(f"{'days booked':>11} {'reservations':>13} {'index us/query':>15} {'scan us/query':>14}")
+    for day, time_, size in booking_requests(args.days, args.per_day):
+        if day != current:
+            if current is not None and len(booked_days) in checkpoints:
+                report(book, reservations, booked_days, args.queries)
+            current = day
+            booked_days.append(day)
+        try:
+            table_size = book.book(day, time_, size)
+        except ReservationError:
+            refused += 1
+            continue
+        res = {"id": len(reservations) + 1, "date": day, "time": time_, "size": size, "table_size": table_size}
+        reservations.append(res)
+        book.add(res)
+    report(book, reservations, booked_days, args.queries)
+    print(f"\n{refused} of {args.days * args.per_day} requests refused as overbooked")
+
+
+def report(book, reservations, days, queries):
+    index_us = time_queries(book.availability, days, queries)
+    scan_us = time_queries(lambda d, s: scan_availability(reservations, d, s), days, max(queries // 20, 10))
+    print(f"{len(days):>11} {len(reservations):>13} {index_us:>15.1f} {scan_us:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+/api/analytics/timeseries: summing the orders list per bucket (the ad
+hoc way) vs reading SalesRollups, for a history spread over many days.
+
+Orders get random creation times over the last --days days, about 5%
+are cancelled afterwards. Both paths answer the same queries and the
+results are checked against each other before timing.
+
+    python -m benchmarks.bench_rollups --orders 200000 --days 120
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+from models import now_us
+from rollups import SalesRollups, start_of
+
+QUERIES = [
+    # (granularity, span in days, group_by)
+    ("hour", 1, None),
+    ("hour", 7, "type"),
+    ("day", 30, None),
+    ("day", 90, "item"),
+    ("week", 120, "type"),
+]
+
+
+def build_orders(app_module, n, days, rnd):
+    menu = {m["id"]: m for m in app_module.STORE.list_menu()}
+    now = now_us()
+    orders = []
+    for i in range(n):
+        order = app_module.build_order({
+            "customer_name": f"Guest {i}",
+            "type": rnd.choice(["WALK_IN", "DINE_IN", "DELIVERY"]),
+            "items": [rnd.randint(1, 7) for _ in range(rnd.randint(1, 4))],
+        }, menu.get)
+        order["id"] = i + 1
+        order.created = now - rnd.randrange(days * 86400 * 1000000)
+        orders.append(order)
+    orders.sort(key=lambda o: o.created)
+    return orders
+
+
+def scan(orders, start, end, granularity, group_by, utc):
+    """What the endpoint would do without rollups."""
+    points = defaultdict(lambda: [0, 0.0, 0])
+    for o in orders:
+        seconds = o.created // 1000000
+        if o["status"] == "CANCELLED" or not start <= seconds < end:
+            continue
+        at = start_of(seconds - seconds % 60, granularity, utc)
+        if group_by == "item":
+            lines = defaultdict(lambda: [0.0, 0])
+            for it in o["items"]:
+                lines[it["name"]][0] += it["price"] * it["qty"]
+                lines[it["name"]][1] += it["qty"]
+            for name, (revenue, qty) in lines.items():
+                p = points[(at, name)]
+                p[0] += 1
+                p[1] += revenue
+                p[2] += qty
+        else:
+            p = points[(at, o["type"] if group_by else None)]
+            p[0] += 1
+            p[1] += o["total"]
+            p[2] += sum(it["qty"] for it in o["items"])
+    return [(at, group, n, round(revenue, 2), qty)
+            for (at, group), (n, revenue, qty) in sorted(points.items(), key=lambda p: (p[0][0], str(p[0][1])))]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=120)
+    args = parser.parse_args()
+
+    import oldstyle
+    rnd = random.Random(3)
+    orders = build_orders(oldstyle, args.orders, args.days, rnd)
+
+    rollups = SalesRollups("type", utc=True)
+    start = time.perf_counter()
+    for o in orders:
+        rollups.record_order(o)
+    record_us = (time.perf_counter() - start) / len(orders) * 1e6
+    for o in rnd.sample(orders, len(orders) // 20):
+        o["status"] = "CANCELLED"
+        rollups.status_changed(o, "RECEIVED")
+
+    print(f"{len(orders)} orders over {args.days} days, record_order {record_us:.1f} us/order")
+    print(f"buckets per tier: {rollups.bucket_count()}\n")
+    print(f"{'query':>24} {'points':>7} {'scan ms':>9} {'rollup ms':>10}")
+    end = rollups.latest + 1
+    end -= end % 60
+    for granularity, span, group_by in QUERIES:
+        begin = start_of(end - span * 86400, "day", True)   # whole days, so every tier lines up
+        expected, scan_ms = timed(lambda: scan(orders, begin, end, granularity, group_by, True), 1)
+        got, rollup_ms = timed(lambda: rollups.timeseries(begin, end, granularity, group_by), 20)
+        assert got == expected, (granularity, span, group_by)
+        label = f"{granularity}/{span}d/{group_by or '-'}"
+        print(f"{label:>24} {len(got):>7} {scan_ms:>9.1f} {rollup_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Memory vs SQLite storage backend, same load script for both.
+
+Each backend runs in its own interpreter (the app picks its backend from
+SRMS_STORAGE at import time) and goes through the Flask test client:
+create orders, move some through the kitchen states, then read back
+single orders, filtered lists and pages.
+
+    python -m benchmarks.bench_storage --orders 5000 --app newstyle
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+STATUSES = ["PREPARING", "READY", "COMPLETED"]
+
+
+def run_load(app_name, orders, reads):
+    app_module = importlib.import_module(app_name)
+    type_key = "order_type" if app_name == "newstyle" else "type"
+    client = app_module.app.test_client()
+    staff = {"Authorization": "Bearer " + app_module.AUTH.issue("chef", "CHEF")}
+    rnd = random.Random(42)
+    timings = {}
+
+    def timed(name, fn, n):
+        start = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        timings[name] = (time.perf_counter() - start) / n * 1e6
+
+    timed("create_order", lambda i: client.post("/api/orders", json={
+        "items": [rnd.randint(1, 7), rnd.randint(1, 7)],
+        type_key: rnd.choice(["WALK_IN", "DINE_IN", "DELIVERY"]),
+    }), orders)
+    timed("update_status", lambda i: client.patch(
+        f"/api/orders/{rnd.randint(1, orders)}/status", json={"status": rnd.choice(STATUSES)},
+        headers=staff
+    ), orders // 2)
+    timed("get_order", lambda i: client.get(f"/api/orders/{rnd.randint(1, orders)}"), reads)
+    timed("list_by_status", lambda i: client.get("/api/orders?status=PREPARING&limit=50"), reads)
+    timed("list_page", lambda i: client.get(
+        f"/api/orders?limit=50&after_id={rnd.randint(0, orders)}&fields=id,status,total"
+    ), reads)
+    timed("analytics", lambda i: client.get("/api/analytics"), reads)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="newstyle", choices=["newstyle", "oldstyle"])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--backends", default="memory,sqlite")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_load(args.app, args.orders, args.reads)))
+        return
+
+    results = {}
+    for backend in args.backends.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, SRMS_STORAGE=backend,
+                       SRMS_SQLITE_PATH=os.path.join(tmp, "srms.db"))
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_storage", "--child", backend,
+                 "--app", args.app, "--orders", str(args.orders), "--reads", str(args.reads)],
+                env=env, check=True, capture_output=True, text=True
+            ).stdout
+            results[backend] = json.loads(out.strip().splitlines()[-1])
+
+    backends = list(results)
+    print(f"{args.app}, {args.orders} orders, us/request")
+    print(f"{'operation':<16}" + "".join(f"{b:>12}" for b in backends))
+    for op in results[backends[0]]:
+        print(f"{op:<16}" + "".join(f"{results[b][op]:12.1f}" for b in backends))
+
+
+if __name__ == "__main__":
+    main()
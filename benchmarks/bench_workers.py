@@ -0,0 +1,177 @@
+"""
+Scaling out over worker processes (SRMS_STORAGE=shared, shared_store.py).
+
+For each worker count 1..--workers: starts a fresh state process and that
+many worker processes (each the app on a threaded WSGI server, port of
+its own), then --clients client processes with --threads threads each
+send a 50/50 mix of POST /api/orders and GET /api/orders?limit=50 for
+--seconds, spread over the workers round-robin. Reported: requests/s and
+p50/p99 per request type.
+
+The first row is the app as one ordinary process (memory storage), i.e.
+what the shared store has to beat.
+
+After every run it checks that the order ids handed out by different
+workers never collide and that every worker's /api/analytics counts
+every order created, whichever worker took it.
+
+Throughput can only grow with the number of cores: on a 1-CPU machine
+the extra processes share one core and mostly add IPC.
+
+    python -m benchmarks.bench_workers --workers 4 --clients 4 --seconds 5
+"""
+import argparse
+import importlib
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.harness import HttpCaller, percentile, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve_worker(app_name):
+    """--serve mode: the app on a local port, until the parent terminates us."""
+    mod = importlib.import_module(app_name)
+    _, base = start_server(mod.app)
+    print(base, flush=True)
+    threading.Event().wait()
+
+
+def spawn(args, env):
+    proc = subprocess.Popen([sys.executable, *args], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    return proc, proc.stdout.readline().strip()
+
+
+def client(bases, first, threads, seconds, out):
+    """One client process: `threads` closed loops, thread i on worker (first + i) % len(bases)."""
+    results = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def loop(i):
+        call = HttpCaller(bases[(first + i) % len(bases)])
+        mine = {"create": [], "list": []}
+        ids = []
+        errors = 0
+        n = 0
+        while time.perf_counter() < deadline:
+            n += 1
+            start = time.perf_counter()
+            if n % 2:
+                status, reply = call("POST", "/api/orders", {"customer_name": "Bench", "items": [1, 3]})
+                kind = "create"
+                if status == 201:
+                    ids.append(reply["id"])
+            else:
+                status, reply = call("GET", "/api/orders?limit=50")
+                kind = "list"
+            mine[kind].append(time.perf_counter() - start)
+            errors += status >= 400
+        with lock:
+            results.append((mine, ids, errors))
+
+    workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    out.put(results)
+
+
+def run_clients(bases, clients, threads, seconds):
+    out = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client, args=(bases, c * threads, threads, seconds, out))
+             for c in range(clients)]
+    for p in procs:
+        p.start()
+    latencies = {"create": [], "list": []}
+    ids = []
+    errors = 0
+    for _ in procs:
+        for mine, created, failed in out.get():
+            for kind, values in mine.items():
+                latencies[kind] += values
+            ids += created
+            errors += failed
+    for p in procs:
+        p.join()
+    return latencies, ids, errors
+
+
+def check(bases, ids):
+    """Unique ids, and every worker counts every order."""
+    assert len(ids) == len(set(ids)), f"{len(ids) - len(set(ids))} duplicate order ids"
+    time.sleep(0.2)     # the last change batches are applied asynchronously
+    for base in bases:
+        _, analytics = HttpCaller(base)("GET", "/api/analytics")
+        assert analytics["total_orders"] == len(ids), (base, analytics["total_orders"], len(ids))
+
+
+def report(label, latencies, errors, seconds):
+    total = sum(len(v) for v in latencies.values())
+    line = f"{label:14} {total / seconds:>8.0f}"
+    for kind in ("create", "list"):
+        values = sorted(latencies[kind])
+        line += (f" {len(values) / seconds:>8.0f} {percentile(values, 50) * 1e3:>7.2f}"
+                 f" {percentile(values, 99) * 1e3:>7.2f}")
+    print(line + f" {errors:>5}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="newstyle")
+    parser.add_argument("--workers", type=int, default=4, help="measure 1..N worker processes")
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--threads", type=int, default=4, help="threads per client process")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve_worker(args.serve)
+        return
+
+    print(f"{os.cpu_count()} CPU(s); {args.clients} client processes x {args.threads} threads, "
+          f"{args.seconds:g}s per row\n")
+    print(f"{'':14} {'all':>8} {'POST /api/orders':>24} {'GET /api/orders?limit=50':>24}")
+    print(f"{'processes':14} {'req/s':>8}" + f" {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7}" * 2 + f" {'err':>5}")
+
+    env = dict(os.environ, SRMS_STORAGE="memory", SRMS_ARCHIVE_AFTER="")
+    env.pop("SRMS_DATA_DIR", None)
+    proc, base = spawn(["-m", "benchmarks.bench_workers", "--serve", args.app], env)
+    try:
+        latencies, ids, errors = run_clients([base], args.clients, args.threads, args.seconds)
+        check([base], ids)
+        report("1 (memory)", latencies, errors, args.seconds)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    for n in range(1, args.workers + 1):
+        with tempfile.TemporaryDirectory(prefix="srms-workers-") as tmp:
+            sock = os.path.join(tmp, "state.sock")
+            shared_env = dict(env, SRMS_STORAGE="shared", SRMS_STATE_SOCKET=sock,
+                              SRMS_ARCHIVE_DIR=os.path.join(tmp, "archive"))
+            procs = []
+            try:
+                procs.append(spawn(["shared_store.py", "--socket", sock], shared_env)[0])
+                workers = [spawn(["-m", "benchmarks.bench_workers", "--serve", args.app], shared_env)
+                           for _ in range(n)]
+                procs += [p for p, _ in workers]
+                bases = [b for _, b in workers]
+                latencies, ids, errors = run_clients(bases, args.clients, args.threads, args.seconds)
+                check(bases, ids)
+                report(f"{n} + state", latencies, errors, args.seconds)
+            finally:
+                for p in procs:
+                    p.terminate()
+                    p.wait()
+
+
+if __name__ == "__main__":
+    main()
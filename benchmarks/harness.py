@@ -0,0 +1,91 @@
+# --------------------------------------------------------
+# SHARED BENCHMARK PLUMBING
+# --------------------------------------------------------
+# Two ways to call an app, both as call(method, path, body=None) ->
+# (status code, decoded JSON or None):
+#   TestClientCaller - Flask test client in this process (one per thread)
+#   HttpCaller       - real HTTP to a server from start_server(), one
+#                      keep-alive connection per thread
+# plus percentile() for latency reports. Both callers take an optional
+# staff token (app.AUTH.issue(...)), sent as "Authorization: Bearer
+# <token>" so that the role-checked routes accept their requests.
+
+import http.client
+import json
+import logging
+import threading
+from urllib.parse import urlsplit
+
+
+def auth_headers(token):
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+class TestClientCaller:
+    def __init__(self, app, token=None):
+        self.app = app
+        self.headers = auth_headers(token)
+        self.local = threading.local()
+
+    def __call__(self, method, path, body=None):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        r = client.open(path, method=method, json=body, headers=self.headers)
+        return r.status_code, r.get_json(silent=True)
+
+
+class HttpCaller:
+    def __init__(self, base, token=None):
+        self.base = base
+        self.auth = auth_headers(token)
+        self.address = urlsplit(base).netloc
+        self.local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.address, timeout=60)
+        return conn
+
+    def __call__(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        headers.update(self.auth)
+        for attempt in (1, 2):
+            conn = self._conn()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                r = conn.getresponse()
+                raw = r.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # server closed the kept-alive connection: reconnect once
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise
+        if r.getheader("Connection", "").lower() == "close":
+            conn.close()
+            self.local.conn = None
+        try:
+            return r.status, json.loads(raw) if raw else None
+        except ValueError:
+            return r.status, None
+
+
+def start_server(app):
+    """Threaded WSGI server on a free local port; returns (server, base url)."""
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list (p in 0..100)."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
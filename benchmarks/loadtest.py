@@ -0,0 +1,293 @@
+"""
+Load test for the SRMS API: realistic request mixes against newstyle.py
+and oldstyle.py, with per-endpoint latency percentiles and throughput.
+
+Mixes (weights in percent):
+  customer  menu 40, create order 30, order lookup 20, table availability
+            / recommendations 10
+  kitchen   kitchen queue polling 60, status changes 40
+  admin     analytics 30, timeseries 25, order list page 25, inventory 20
+  mixed     all of the above, customer-heavy
+
+Every app is first loaded with --history orders (mostly finished, spread
+over 30 days); each size is measured in turn. Requests go through the
+Flask test client (--modes inprocess) and/or a threaded local WSGI
+server over HTTP (--modes server), from --threads closed-loop clients.
+
+--json writes the results (with commit and machine info) so runs can be
+compared; --compare takes such a file and prints the p50/p99 change.
+
+    python -m benchmarks.loadtest --apps newstyle,oldstyle --history 1000,50000 \\
+        --mixes customer,kitchen,admin --requests 3000 --json before.json
+    python -m benchmarks.loadtest ... --json after.json --compare before.json
+"""
+import argparse
+import importlib
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.harness import HttpCaller, TestClientCaller, percentile, start_server
+from models import now_us
+
+TYPES = ["WALK_IN", "DINE_IN", "DELIVERY"]
+
+
+# --------------------------------------------------------
+# REQUESTS
+# --------------------------------------------------------
+# Each generator returns (label, method, path, body); the label groups
+# latencies per endpoint. ctx.order_ids holds ids created so far.
+
+class Context:
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self.type_key = "order_type" if app_name == "newstyle" else "type"
+        self.order_ids = []
+        self.lock = threading.Lock()
+
+    def some_order(self, rnd):
+        # recent orders are the ones people look at
+        ids = self.order_ids
+        return ids[-1 - min(int(rnd.expovariate(1 / 50)), len(ids) - 1)] if ids else 1
+
+
+def get_menu(ctx, rnd):
+    return "GET /api/menu", "GET", "/api/menu", None
+
+
+def create_order(ctx, rnd):
+    body = {"customer_name": "Load", ctx.type_key: rnd.choice(TYPES),
+            "items": [rnd.randint(1, 7) for _ in range(rnd.randint(1, 4))]}
+    return "POST /api/orders", "POST", "/api/orders", body
+
+
+def get_order(ctx, rnd):
+    return "GET /api/orders/<id>", "GET", f"/api/orders/{ctx.some_order(rnd)}", None
+
+
+def customer_extra(ctx, rnd):
+    if ctx.app_name == "oldstyle" and rnd.random() < 0.5:
+        return ("POST /api/recommendations", "POST", "/api/recommendations",
+                {"item_ids": rnd.sample(range(1, 8), rnd.randint(1, 3))})
+    day = (date.today() + timedelta(days=rnd.randint(1, 30))).isoformat()
+    return ("GET /api/reservations/availability", "GET",
+            f"/api/reservations/availability?date={day}&size={rnd.choice([2, 4, 6])}", None)
+
+
+def kitchen_poll(ctx, rnd):
+    if ctx.app_name == "oldstyle":
+        return "GET /api/kitchen/queue", "GET", "/api/kitchen/queue?limit=20", None
+    return "GET /api/orders?for=kitchen", "GET", "/api/orders?for=kitchen&limit=50", None
+
+
+def change_status(ctx, rnd):
+    status = rnd.choice(["PREPARING", "READY", "COMPLETED"])
+    return ("PATCH /api/orders/<id>/status", "PATCH", f"/api/orders/{ctx.some_order(rnd)}/status",
+            {"status": status})
+
+
+def analytics(ctx, rnd):
+    return "GET /api/analytics", "GET", "/api/analytics", None
+
+
+def timeseries(ctx, rnd):
+    granularity, group_by = rnd.choice([("hour", ""), ("day", ctx.type_key), ("day", "item"), ("week", "")])
+    path = f"/api/analytics/timeseries?granularity={granularity}"
+    return "GET /api/analytics/timeseries", "GET", path + (f"&group_by={group_by}" if group_by else ""), None
+
+
+def list_page(ctx, rnd):
+    return "GET /api/orders?limit=50", "GET", "/api/orders?limit=50&status=COMPLETED", None
+
+
+def inventory(ctx, rnd):
+    return "GET /api/inventory", "GET", "/api/inventory", None
+
+
+MIXES = {
+    "customer": [(40, get_menu), (30, create_order), (20, get_order), (10, customer_extra)],
+    "kitchen": [(60, kitchen_poll), (40, change_status)],
+    "admin": [(30, analytics), (25, timeseries), (25, list_page), (20, inventory)],
+    "mixed": [(24, get_menu), (18, create_order), (12, get_order), (6, customer_extra),
+              (15, kitchen_poll), (10, change_status),
+              (4, analytics), (4, timeseries), (4, list_page), (3, inventory)],
+}
+
+
+# --------------------------------------------------------
+# RUNNING
+# --------------------------------------------------------
+
+def preload(mod, ctx, n, rnd):
+    """Add n orders straight through the app's commit path (no HTTP)."""
+    now = now_us()
+    with mod.STORE.transaction():
+        for i in range(n):
+            order = mod.build_order({
+                "customer_name": f"History {i}",
+                ctx.type_key: rnd.choice(TYPES),
+                "items": [rnd.randint(1, 7) for _ in range(rnd.randint(1, 4))],
+            })
+            order.created = order.updated = now - rnd.randrange(30 * 86400 * 1000000)
+            r = rnd.random()
+            order["status"] = "COMPLETED" if r < 0.9 else "CANCELLED" if r < 0.95 else "RECEIVED"
+            mod.commit_order(order)
+            ctx.order_ids.append(order["id"])
+
+
+def run_mix(call, ctx, mix, requests, threads, seed):
+    weights = [w for w, _ in mix]
+    makers = [m for _, m in mix]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    def worker(worker_id, count):
+        rnd = random.Random(seed * 1000 + worker_id)
+        mine = defaultdict(list)
+        for _ in range(count):
+            label, method, path, body = rnd.choices(makers, weights)[0](ctx, rnd)
+            start = time.perf_counter()
+            status, reply = call(method, path, body)
+            mine[label].append(time.perf_counter() - start)
+            if status >= 400:
+                with ctx.lock:
+                    errors[label] += 1
+            elif method == "POST" and path == "/api/orders":
+                ctx.order_ids.append(reply["id"])
+        with ctx.lock:
+            for label, values in mine.items():
+                latencies[label].extend(values)
+
+    per_thread = [requests // threads + (1 if i < requests % threads else 0) for i in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads), per_thread))
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def summarize(latencies, errors, elapsed):
+    rows = []
+    everything = []
+    for label in sorted(latencies):
+        values = sorted(latencies[label])
+        everything.extend(values)
+        rows.append(stats_row(label, values, errors.get(label, 0), elapsed))
+    everything.sort()
+    rows.append(stats_row("ALL", everything, sum(errors.values()), elapsed))
+    return rows
+
+
+def stats_row(label, values, errors, elapsed):
+    ms = 1e3
+    return {
+        "endpoint": label,
+        "count": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 1),
+        "mean_ms": round(sum(values) / len(values) * ms, 3),
+        "p50_ms": round(percentile(values, 50) * ms, 3),
+        "p95_ms": round(percentile(values, 95) * ms, 3),
+        "p99_ms": round(percentile(values, 99) * ms, 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(r):
+    return r["app"], r["mode"], r["history"], r["mix"], r["endpoint"]
+
+
+def print_rows(rows, baseline):
+    print(f"  {'endpoint':38} {'count':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          + ("   p50 / p99 vs baseline" if baseline else ""))
+    for r in rows:
+        line = (f"  {r['endpoint']:38} {r['count']:>6} {r['errors']:>4} {r['rps']:>8.1f} "
+                f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+        old = baseline.get(result_key(r)) if baseline else None
+        if old:
+            line += f"   {change(old['p50_ms'], r['p50_ms']):>7} / {change(old['p99_ms'], r['p99_ms']):>7}"
+        print(line)
+
+
+def change(old, new):
+    return f"{(new - old) / old:+.0%}" if old else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", default="newstyle,oldstyle")
+    parser.add_argument("--modes", default="inprocess", help="inprocess,server")
+    parser.add_argument("--mixes", default="customer,kitchen,admin")
+    parser.add_argument("--history", default="1000,20000", help="order history sizes, ascending")
+    parser.add_argument("--requests", type=int, default=2000, help="per app / mode / size / mix")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline results file from an earlier --json run")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {result_key(r): r for r in json.load(f)["results"]}
+
+    results = []
+    for app_name in args.apps.split(","):
+        mod = importlib.import_module(app_name)
+        ctx = Context(app_name)
+        rnd = random.Random(args.seed)
+        loaded = 0
+        for size in (int(s) for s in args.history.split(",")):
+            preload(mod, ctx, size - loaded, rnd)
+            loaded = size
+            for mode in args.modes.split(","):
+                server = None
+                token = mod.AUTH.issue("chef", "CHEF")     # the kitchen mix changes statuses
+                if mode == "server":
+                    server, base = start_server(mod.app)
+                    call = HttpCaller(base, token)
+                else:
+                    call = TestClientCaller(mod.app, token)
+                for mix in args.mixes.split(","):
+                    run_mix(call, ctx, MIXES[mix], min(200, args.requests), args.threads, args.seed)  # warm-up
+                    latencies, errors, elapsed = run_mix(call, ctx, MIXES[mix], args.requests,
+                                                         args.threads, args.seed)
+                    rows = [dict(r, app=app_name, mode=mode, history=size, mix=mix)
+                            for r in summarize(latencies, errors, elapsed)]
+                    print(f"\n{app_name} / {mode} / history {size} / {mix}: "
+                          f"{args.requests} requests in {elapsed:.2f}s")
+                    print_rows(rows, baseline)
+                    results += rows
+                if server:
+                    server.shutdown()
+
+    if args.json:
+        meta = {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"\nwrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
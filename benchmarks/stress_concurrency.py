@@ -0,0 +1,111 @@
+"""
+Concurrency stress check for order / reservation creation.
+
+Fires thousands of POSTs from many threads at once (Flask test client,
+or a real threaded WSGI server with --server) and then verifies:
+  - order and reservation ids are unique and gap-free
+  - /api/analytics saw every order exactly once
+  - (oldstyle) inventory decrements add up to what the orders consumed
+
+Exits with status 1 if any check fails.
+
+    python -m benchmarks.stress_concurrency --app oldstyle --requests 5000 --threads 32
+"""
+import argparse
+import importlib
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.harness import HttpCaller, TestClientCaller, start_server
+from inventory import RECIPES, InventoryEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="oldstyle", choices=["newstyle", "oldstyle"])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--server", action="store_true", help="go through a threaded WSGI server")
+    args = parser.parse_args()
+
+    # switch threads as often as possible to shake out races
+    sys.setswitchinterval(1e-6)
+
+    mod = importlib.import_module(args.app)
+    type_key = "order_type" if args.app == "newstyle" else "type"
+    server = None
+    token = mod.AUTH.issue("admin", "ADMIN")
+    if args.server:
+        server, base = start_server(mod.app)
+        call = HttpCaller(base, token)
+    else:
+        call = TestClientCaller(mod.app, token)
+
+    inv_before = {}
+    if args.app == "oldstyle":
+        # plenty of stock so nothing gets clamped at zero
+        for inv_id in {inv_id for uses in RECIPES.values() for inv_id in uses}:
+            call("PATCH", f"/api/inventory/{inv_id}", {"qty": 1000000})
+        inv_before = {i["id"]: i["qty"] for i in call("GET", "/api/inventory")[1]["inventory"]}
+    orders_before = call("GET", "/api/analytics")[1]["total_orders"]
+
+    rnd = random.Random(7)
+    carts = [[rnd.randint(1, 7) for _ in range(rnd.randint(1, 4))] for _ in range(args.requests)]
+
+    def place(i):
+        if i % 10 == 0:
+            # one booking per day, so none is refused as overbooked
+            day = date(2027, 1, 1) + timedelta(days=i // 10)
+            return "res", call("POST", "/api/reservations",
+                               {"name": f"Guest {i}", "date": day.isoformat(), "time": "19:00", "size": 2})
+        return "order", call("POST", "/api/orders", {"items": carts[i], type_key: "DINE_IN"})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(place, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    failures = []
+    orders = [body for kind, (code, body) in results if kind == "order"]
+    reservations = [body for kind, (code, body) in results if kind == "res"]
+    if any(code != 201 for _, (code, _) in results):
+        failures.append("some POSTs did not return 201")
+
+    order_ids = sorted(o["id"] for o in orders)
+    if len(set(order_ids)) != len(order_ids):
+        failures.append("duplicate order ids")
+    if order_ids != list(range(order_ids[0], order_ids[0] + len(order_ids))):
+        failures.append("order ids are not gap-free")
+    res_ids = [r["id"] for r in reservations]
+    if len(set(res_ids)) != len(res_ids):
+        failures.append("duplicate reservation ids")
+
+    stats = call("GET", "/api/analytics")[1]
+    if stats["total_orders"] - orders_before != len(orders):
+        failures.append(f"analytics counted {stats['total_orders'] - orders_before} orders, expected {len(orders)}")
+
+    if args.app == "oldstyle":
+        inv_after = {i["id"]: i["qty"] for i in call("GET", "/api/inventory")[1]["inventory"]}
+        expected = InventoryEngine(RECIPES).usage(it for o in orders for it in o["items"])
+        for inv_id, amount in expected.items():
+            used = inv_before[inv_id] - inv_after[inv_id]
+            if abs(used - amount) > 1e-3:
+                failures.append(f"inventory {inv_id}: used {used:.2f}, expected {amount:.2f}")
+
+    if server:
+        server.shutdown()
+
+    print(f"{args.app}: {args.requests} POSTs from {args.threads} threads in {elapsed:.2f}s "
+          f"({args.requests / elapsed:.0f} req/s)")
+    for f in failures:
+        print("FAIL:", f)
+    if not failures:
+        print("OK: ids unique and gap-free, analytics and inventory consistent")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:     # optional, stdlib json is used instead
+    orjson = None
+
+# --------------------------------------------------------
+# JSON ENCODING (responses + cached order fragments)
+# --------------------------------------------------------
+# dumps() returns UTF-8 bytes, from orjson when it is installed and from
+# the stdlib encoder otherwise. FastJSONProvider plugs it into Flask, so
+# every jsonify() in the app uses it.
+#
+# Order lists are the big responses and most orders in them did not
+# change since the last request, so each order's encoded bytes are kept
+# in FragmentCache and a list body is joined from those fragments.
+# Whoever mutates an order calls invalidate(); as a second check a
+# fragment is only reused while the order's updated_at/status match.
+#
+# Keys are written in insertion order (Flask's own encoder sorts them).
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def _default(obj):
+    # order model objects (models.py) know their own JSON shape
+    to_json = getattr(obj, "__json__", None)
+    if to_json is not None:
+        return to_json()
+    return DefaultJSONProvider.default(obj)
+
+
+if orjson:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj):
+        return _encoder.encode(obj).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """app.json = FastJSONProvider(app)"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get("indent") or kwargs.get("sort_keys"):
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(obj)
+        return self._app.response_class(dumps(obj) + b"\n", mimetype=self.mimetype)
+
+
+class FragmentCache:
+
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self._entries = {}   # order id -> (stamp, encoded bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _stamp(order):
+        stamp = getattr(order, "stamp", None)   # models.Order
+        if stamp is not None:
+            return stamp
+        return order.get("updated_at"), order.get("status")
+
+    def get(self, order):
+        stamp = self._stamp(order)
+        entry = self._entries.get(order["id"])
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        data = dumps(order)
+        if len(self._entries) >= self.max_entries:
+            # drop the oldest entry (dicts keep insertion order)
+            try:
+                self._entries.pop(next(iter(self._entries)), None)
+            except (RuntimeError, StopIteration):
+                pass
+        self._entries[order["id"]] = (stamp, data)
+        return data
+
+    def invalidate(self, *order_ids):
+        for order_id in order_ids:
+            self._entries.pop(order_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def encode_list(self, orders):
+        """JSON array bytes of `orders` from cached fragments."""
+        get = self.get
+        return b"[" + b",".join([get(o) for o in orders]) + b"]"
+
+
+def list_response(response_class, key, items, extra=None):
+    """
+    {key: items, **extra} as a JSON response; `items` is already encoded
+    (e.g. FragmentCache.encode_list()).
+    """
+    body = b'{"' + key.encode("utf-8") + b'":' + items
+    for name, value in (extra or {}).items():
+        body += b"," + dumps(name) + b":" + dumps(value)
+    return response_class(body + b"}\n", mimetype="application/json")
@@ -0,0 +1,98 @@
+import json
+import threading
+from collections import deque
+
+from models import json_default
+
+# --------------------------------------------------------
+# IN-PROCESS ORDER EVENT BUS (feeds the SSE stream)
+# --------------------------------------------------------
+# Every order change is serialized ONCE when it is published and kept in
+# a bounded ring buffer with a monotonic event id. Each connected screen
+# just copies the already-encoded text to its socket, and a reconnecting
+# client resumes from its Last-Event-ID. If the client is too far behind
+# (its id fell out of the buffer) it gets a "reset" event and should
+# reload the full list once.
+
+
+class EventBus:
+
+    def __init__(self, history=1000):
+        self._cond = threading.Condition()
+        self.history = history
+        self._events = deque(maxlen=history)   # (event_id, sse_text)
+        self._listeners = []                   # callback(event_id, event, data)
+        self.last_id = 0
+
+    def subscribe(self, callback):
+        """
+        callback(event_id, event, data) after every publish, on the
+        publishing thread (e.g. to wake an asyncio loop with
+        call_soon_threadsafe), so it must not block.
+        """
+        self._listeners.append(callback)
+
+    def publish(self, event, data):
+        """Encode the event once and wake every waiting subscriber."""
+        payload = json.dumps(data, separators=(",", ":"), default=json_default)
+        with self._cond:
+            self.last_id += 1
+            text = f"id: {self.last_id}\nevent: {event}\ndata: {payload}\n\n"
+            self._events.append((self.last_id, text))
+            event_id = self.last_id
+            self._cond.notify_all()
+        for callback in self._listeners:
+            callback(event_id, event, data)
+        return event_id
+
+    def since(self, last_id):
+        """
+        Encoded events newer than last_id.
+        Returns None if last_id is older than the buffered history
+        (or newer than anything we know, e.g. after a server restart).
+        """
+        with self._cond:
+            if last_id > self.last_id:
+                return None
+            if last_id == self.last_id:
+                return []
+            if not self._events or self._events[0][0] > last_id + 1:
+                return None
+            # ids are contiguous, so the start position is computed directly
+            start = last_id + 1 - self._events[0][0]
+            return [self._events[i] for i in range(start, len(self._events))]
+
+    def wait(self, last_id, timeout):
+        """Block until something newer than last_id exists (or timeout)."""
+        with self._cond:
+            if self.last_id <= last_id:
+                self._cond.wait(timeout)
+            return self.last_id > last_id
+
+    def stream(self, last_id=None, heartbeat=15):
+        """
+        Generator of Server-Sent Events text.
+        last_id=None means "only changes from now on".
+        """
+        if last_id is None:
+            last_id = self.last_id
+        yield "retry: 3000\n\n"
+        while True:
+            batch = self.since(last_id)
+            if batch is None:
+                last_id = self.last_id
+                yield f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+                continue
+            for event_id, text in batch:
+                last_id = event_id
+                yield text
+            if not self.wait(last_id, heartbeat):
+                # comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,77 @@
+# --------------------------------------------------------
+# RECIPE (BILL OF MATERIALS) DRIVEN INVENTORY
+# --------------------------------------------------------
+# Each menu item lists the ingredients one portion uses. The table is
+# compiled once into menu id -> ((inventory id, amount), ...) so an order
+# is costed in a single pass over its lines, amounts are summed per
+# ingredient, and every touched inventory line is written once.
+#
+# Low stock is tracked as a set of inventory ids that is updated whenever
+# a line changes (deduction or admin PATCH), so reading the alerts does
+# not scan the whole stock. The set has its own version, bumped after
+# every update: a cache of the alerts keys on it as well as on the store's
+# inventory version, which moves before the set is updated.
+
+# menu id -> {inventory id: amount used per portion}
+RECIPES = {
+    1: {3: 0.1},            # Karak Tea       -> Tea Leaves (kg)
+    3: {1: 1, 2: 0.25},     # Chicken Biryani -> Rice (kg), Chicken (kg)
+    5: {1: 1, 2: 0.25},     # Mandi           -> Rice (kg), Chicken (kg)
+    6: {5: 0.2},            # French Fries    -> French Fries (kg)
+}
+
+
+class InventoryEngine:
+
+    def __init__(self, recipes, qty_key="qty"):
+        self.qty_key = qty_key
+        self.bom = {
+            menu_id: tuple(uses.items())
+            for menu_id, uses in recipes.items()
+        }
+        self.low = set()   # inventory ids at or below their threshold
+        self.version = 0   # bumped after every change to `low`
+
+    def rebuild(self, inventory):
+        self.low = set()
+        for inv in inventory:
+            self.track(inv)
+
+    def track(self, inv):
+        """Update the low-stock set for one changed inventory line."""
+        if inv[self.qty_key] <= inv["low_stock_threshold"]:
+            self.low.add(inv["id"])
+        else:
+            self.low.discard(inv["id"])
+        self.version += 1
+
+    def usage(self, items):
+        """Total ingredient usage of some order lines: {inventory id: amount}."""
+        bom = self.bom
+        totals = {}
+        for it in items:
+            uses = bom.get(it.get("menu_id"))
+            if not uses:
+                continue
+            qty = it.get("qty", 1)
+            for inv_id, amount in uses:
+                totals[inv_id] = totals.get(inv_id, 0) + amount * qty
+        return totals
+
+    def deduct(self, store, items):
+        """Take the ingredients of `items` out of stock (never below zero)."""
+        totals = self.usage(items)
+        if not totals:
+            return totals
+        with store.transaction():
+            for inv_id, amount in totals.items():
+                inv = store.get_inventory_item(inv_id, for_update=True)
+                if not inv:
+                    continue
+                inv[self.qty_key] = max(round(inv[self.qty_key] - amount, 6), 0)
+                store.save_inventory_item(inv)
+                self.track(inv)
+        return totals
+
+    def low_stock(self, store):
+        return [store.get_inventory_item(inv_id) for inv_id in sorted(self.low)]
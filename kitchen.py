@@ -0,0 +1,209 @@
+import heapq
+from datetime import datetime
+
+# --------------------------------------------------------
+# KITCHEN SCHEDULER (KDS queue)
+# --------------------------------------------------------
+# Active orders sit in a heap keyed by the scheduling policy, and orders
+# are pushed/dropped as update_order_status moves them in and out of the
+# active states, so the queue never looks at finished orders.
+# Every order is also on a per-station heap (grill / drinks / dessert,
+# from the menu category of its items).
+#
+# Policies:
+#   fifo      - oldest order first
+#   spf       - shortest total prep time first
+#   deadline  - least slack first: (created + promised time) - prep time
+#
+# Heaps use lazy deletion: a removed/re-keyed order leaves its old entry
+# behind and it is skipped (and compacted away when they pile up).
+# queue(limit=N) walks the heap best-first and stops after N live orders;
+# estimate() is one pass over the active orders, no sort.
+
+ACTIVE_STATUSES = ("RECEIVED", "PREPARING", "READY", "OUT_FOR_DELIVERY")
+COOKING_STATUSES = ("RECEIVED", "PREPARING")   # still need kitchen time
+
+# minutes per portion, by menu id
+PREP_MINUTES = {1: 3, 2: 12, 3: 18, 4: 6, 5: 20, 6: 7, 7: 4}
+DEFAULT_PREP_MINUTES = 10
+
+STATION_FOR_CATEGORY = {"Drinks": "drinks", "Main": "grill", "Side": "grill", "Dessert": "dessert"}
+DEFAULT_STATION = "grill"
+
+# minutes promised to the customer, by order type (deadline policy)
+PROMISE_MINUTES = {"WALK_IN": 15, "DINE_IN": 25, "DELIVERY": 35}
+DEFAULT_PROMISE_MINUTES = 25
+
+POLICIES = ("fifo", "spf", "deadline")
+
+
+def parse_ts(value):
+    try:
+        return datetime.fromisoformat(value.rstrip("Z")).timestamp()
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+class KitchenScheduler:
+
+    def __init__(self, category_of, policy="fifo", type_key="type",
+                 prep_minutes=None, stations=None, promise_minutes=None):
+        """category_of: menu id -> category name (or None)."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown kitchen policy: {policy}")
+        self.category_of = category_of
+        self.policy = policy
+        self.type_key = type_key
+        self.prep_minutes = prep_minutes or PREP_MINUTES
+        self.stations = stations or STATION_FOR_CATEGORY
+        self.promise_minutes = promise_minutes or PROMISE_MINUTES
+
+        self.entries = {}       # order id -> (key, order, {station: minutes})
+        self._heap = []         # (key, order id)
+        self._station_heaps = {}
+        self._dead = 0
+
+    # ---------------- helpers ----------------
+
+    def _work(self, order):
+        """Prep minutes per station for one order."""
+        work = {}
+        for it in order.get("items", []):
+            menu_id = it.get("menu_id")
+            station = self.stations.get(self.category_of(menu_id), DEFAULT_STATION)
+            minutes = self.prep_minutes.get(menu_id, DEFAULT_PREP_MINUTES) * it.get("qty", 1)
+            work[station] = work.get(station, 0) + minutes
+        return work
+
+    def _key(self, order, work):
+        oid = order["id"]
+        if self.policy == "spf":
+            return (sum(work.values()), oid)
+        if self.policy == "deadline":
+            promise = self.promise_minutes.get(order.get(self.type_key), DEFAULT_PROMISE_MINUTES)
+            latest_start = parse_ts(order.get("created_at")) + (promise - max(work.values(), default=0)) * 60
+            return (latest_start, oid)
+        return (oid,)
+
+    def _live(self, key, oid):
+        # the very same key object: an order that left the queue and came
+        # back got a new (maybe equal) key, its old heap entries are dead
+        current = self.entries.get(oid)
+        return current is not None and current[0] is key
+
+    def _compact(self):
+        if self._dead > 64 and self._dead > len(self.entries):
+            self._heap = [(k, oid) for k, oid in self._heap if self._live(k, oid)]
+            heapq.heapify(self._heap)
+            for station, heap in self._station_heaps.items():
+                self._station_heaps[station] = [(k, oid) for k, oid in heap if self._live(k, oid)]
+                heapq.heapify(self._station_heaps[station])
+            self._dead = 0
+
+    # ---------------- updates ----------------
+
+    def sync(self, order):
+        """Call whenever an order is created or changes status."""
+        oid = order["id"]
+        old = self.entries.pop(oid, None)
+        if old is not None:
+            self._dead += 1
+        if order.get("status") not in ACTIVE_STATUSES:
+            self._compact()
+            return
+
+        work = old[2] if old is not None else self._work(order)
+        key = old[0] if old is not None else self._key(order, work)
+        self.entries[oid] = (key, order, work)
+        if old is None:
+            heapq.heappush(self._heap, (key, oid))
+            for station in work:
+                heapq.heappush(self._station_heaps.setdefault(station, []), (key, oid))
+        else:
+            # same key, the old heap entries stay valid
+            self._dead -= 1
+        self._compact()
+
+    def rebuild(self, orders):
+        self.entries.clear()
+        self._heap = []
+        self._station_heaps = {}
+        self._dead = 0
+        for o in orders:
+            self.sync(o)
+
+    # ---------------- reads ----------------
+
+    def _ordered(self, heap, limit=None):
+        """
+        Live entries of `heap` in key order. With a limit the heap is walked
+        best-first (a node's children only after the node), so the first N
+        cost about N log N whatever the queue length; without one the live
+        entries are sorted.
+        """
+        heap = list(heap)       # snapshot: sync() may push while a request reads
+        entries = self.entries
+        if not limit:
+            live = [entries.get(oid) for _, oid in heap]
+            return sorted((e for (key, _), e in zip(heap, live) if e is not None and e[0] is key),
+                          key=lambda e: e[0])
+        ordered = []
+        todo = [(heap[0], 0)] if heap else []
+        while todo and len(ordered) < limit:
+            (key, oid), i = heapq.heappop(todo)
+            entry = entries.get(oid)
+            if entry is not None and entry[0] is key:
+                ordered.append(entry)
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(todo, (heap[child], child))
+        return ordered
+
+    def queue(self, station=None, limit=None):
+        """Active orders in scheduling order, each with its estimated wait."""
+        heap = self._heap if station is None else self._station_heaps.get(station, [])
+
+        # each station cooks its orders one after the other, in queue order
+        busy = {}
+        result = []
+        for _, order, work in self._ordered(heap, limit):
+            wait = 0
+            if order.get("status") in COOKING_STATUSES:
+                for st, minutes in work.items():
+                    busy[st] = busy.get(st, 0) + minutes
+                    wait = max(wait, busy[st])
+            result.append((order, wait))
+        return result
+
+    def depth(self):
+        depths = {}
+        # snapshot: sync() may add or drop entries while a request reads
+        for _, order, work in list(self.entries.values()):
+            if order.get("status") in COOKING_STATUSES:
+                for st in work:
+                    depths[st] = depths.get(st, 0) + 1
+        return {"total": len(self.entries), "stations": depths}
+
+    def estimate(self, order_id):
+        """
+        (queue position, estimated wait) of one order, (None, None) if it
+        is not active. One pass over the active orders: those with a
+        smaller key are ahead of it, and the cooking ones among them keep
+        its stations busy.
+        """
+        mine = self.entries.get(order_id)
+        if mine is None:
+            return None, None
+        key, order, work = mine
+        position = 1
+        busy = dict.fromkeys(work, 0)
+        for other_key, other, other_work in list(self.entries.values()):
+            if other_key >= key:
+                continue
+            position += 1
+            if other.get("status") in COOKING_STATUSES:
+                for st in busy.keys() & other_work.keys():
+                    busy[st] += other_work[st]
+        if order.get("status") not in COOKING_STATUSES:
+            return position, 0
+        return position, max((busy[st] + minutes for st, minutes in work.items()), default=0)
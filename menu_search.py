@@ -0,0 +1,249 @@
+import math
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+
+# --------------------------------------------------------
+# MENU SEARCH INDEX (GET /api/menu?q=&category=&min_price=&max_price=&sort=)
+# --------------------------------------------------------
+# Built once from the menu, then kept up to date item by item when a
+# name, price or category changes (update()):
+#   - tokens:      word of a name -> ids of the items with that word
+#   - vocabulary:  every such word, sorted, for prefix matches ("piz")
+#   - grams:       trigram of a word -> the words containing it, to find
+#                  misspelt words ("biryni") without a scan
+#   - categories:  lower-cased category -> ids
+#   - by_price:    sorted (price, id) pairs; a price range is two bisects
+#
+# A query word matches a name word exactly (score 3), as a prefix (2),
+# or within max_edits() typos (1; none under 4 letters). Every
+# query word must match; results are ranked by the summed score, then
+# by menu order. Filters narrow the candidate set before any scoring.
+#
+# Writers replace sets and lists instead of changing them in place, so
+# a search running next to update() reads one consistent version of
+# each index entry without a lock.
+
+WORD = re.compile(r"\w+")
+SORTS = ("relevance", "price", "-price", "name", "-name")
+
+
+def normalize(text):
+    """Lower case, accents stripped: "Crème Brûlée" -> "creme brulee"."""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def words(text):
+    return WORD.findall(normalize(text))
+
+
+def trigrams(word):
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(word):
+    return 0 if len(word) < 4 else 1 if len(word) < 8 else 2
+
+
+def within_edits(a, b, limit):
+    """Optimal string alignment distance of a and b is <= limit (early exit per row)."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > limit:
+            return False
+        prev2, prev = prev, row
+    return prev[-1] <= limit
+
+
+class MenuIndex:
+
+    def __init__(self):
+        self.items = {}          # id -> menu item (as stored)
+        self.position = {}       # id -> menu order
+        self.tokens = {}         # word -> frozenset of ids
+        self.vocabulary = []     # sorted words
+        self.grams = {}          # trigram -> frozenset of words
+        self.categories = {}     # lower-cased category -> frozenset of ids
+        self.by_price = []       # sorted (price, id)
+
+    def rebuild(self, menu):
+        """Index the whole menu at once (update() copies the sorted lists per item)."""
+        items, position, tokens, categories, by_price = {}, {}, {}, {}, []
+        for item in menu:
+            names, category, price = self._key(item)
+            items[item["id"]] = item
+            position.setdefault(item["id"], len(position))
+            for word in names:
+                tokens.setdefault(word, set()).add(item["id"])
+            categories.setdefault(category, set()).add(item["id"])
+            by_price.append((price, item["id"]))
+        grams = {}
+        for word in tokens:
+            for gram in trigrams(word):
+                grams.setdefault(gram, set()).add(word)
+        self.items, self.position = items, position
+        self.tokens = {word: frozenset(ids) for word, ids in tokens.items()}
+        self.vocabulary = sorted(tokens)
+        self.grams = {gram: frozenset(w) for gram, w in grams.items()}
+        self.categories = {category: frozenset(ids) for category, ids in categories.items()}
+        self.by_price = sorted(by_price)
+
+    # ---------------- updates ----------------
+
+    @staticmethod
+    def _key(item):
+        return (frozenset(words(item.get("name", ""))), normalize(item.get("category") or ""),
+                float(item.get("price") or 0))
+
+    def update(self, item):
+        """Index a new or changed item (only the parts that changed are touched)."""
+        item_id = item["id"]
+        old = self.items.get(item_id)
+        old_words, old_category, old_price = self._key(old) if old is not None else (frozenset(), None, None)
+        new_words, new_category, new_price = self._key(item)
+        self.items[item_id] = item
+        self.position.setdefault(item_id, len(self.position))
+
+        for word in old_words - new_words:
+            ids = self.tokens[word] - {item_id}
+            if ids:
+                self.tokens[word] = ids
+            else:
+                del self.tokens[word]
+                self._forget_word(word)
+        for word in new_words - old_words:
+            if word not in self.tokens:
+                self._learn_word(word)
+            self.tokens[word] = self.tokens.get(word, frozenset()) | {item_id}
+
+        if old_category != new_category:
+            if old_category is not None:
+                ids = self.categories[old_category] - {item_id}
+                if ids:
+                    self.categories[old_category] = ids
+                else:
+                    del self.categories[old_category]
+            self.categories[new_category] = self.categories.get(new_category, frozenset()) | {item_id}
+
+        if old_price != new_price:
+            by_price = list(self.by_price)
+            if old_price is not None:
+                del by_price[bisect_left(by_price, (old_price, item_id))]
+            insort(by_price, (new_price, item_id))
+            self.by_price = by_price
+
+    def _learn_word(self, word):
+        vocabulary = list(self.vocabulary)
+        insort(vocabulary, word)
+        self.vocabulary = vocabulary
+        for gram in trigrams(word):
+            self.grams[gram] = self.grams.get(gram, frozenset()) | {word}
+
+    def _forget_word(self, word):
+        vocabulary = list(self.vocabulary)
+        del vocabulary[bisect_left(vocabulary, word)]
+        self.vocabulary = vocabulary
+        for gram in trigrams(word):
+            words_left = self.grams[gram] - {word}
+            if words_left:
+                self.grams[gram] = words_left
+            else:
+                del self.grams[gram]
+
+    # ---------------- matching ----------------
+
+    def match_word(self, query_word):
+        """{item id: score} of the items with a word matching query_word."""
+        scores = {}
+
+        def hit(word, score):
+            for item_id in self.tokens.get(word, ()):
+                if scores.get(item_id, 0) < score:
+                    scores[item_id] = score
+
+        hit(query_word, 3)
+        vocabulary = self.vocabulary
+        pos = bisect_left(vocabulary, query_word)
+        while pos < len(vocabulary) and vocabulary[pos].startswith(query_word):
+            if vocabulary[pos] != query_word:
+                hit(vocabulary[pos], 2)
+            pos += 1
+        limit = max_edits(query_word)
+        if limit:
+            candidates = set()
+            for gram in trigrams(query_word):
+                candidates.update(self.grams.get(gram, ()))
+            for word in candidates:
+                if word != query_word and within_edits(query_word, word, limit):
+                    hit(word, 1)
+        return scores
+
+    def price_range(self, min_price=None, max_price=None):
+        by_price = self.by_price
+        lo = bisect_left(by_price, (min_price, -1)) if min_price is not None else 0
+        hi = bisect_right(by_price, (max_price, float("inf"))) if max_price is not None else len(by_price)
+        return {item_id for _, item_id in by_price[lo:hi]}
+
+    def search(self, q=None, category=None, min_price=None, max_price=None, sort=None):
+        """Matching menu items, best first (or in `sort` order: price, -price, name, -name)."""
+        candidates = None
+        if category:
+            candidates = set(self.categories.get(normalize(category), ()))
+        if min_price is not None or max_price is not None:
+            in_range = self.price_range(min_price, max_price)
+            candidates = in_range if candidates is None else candidates & in_range
+
+        scores = None
+        for query_word in dict.fromkeys(words(q or "")):
+            matched = self.match_word(query_word)
+            if candidates is not None:
+                matched = {i: s for i, s in matched.items() if i in candidates}
+            if scores is None:
+                scores = matched
+            else:
+                scores = {i: scores[i] + s for i, s in matched.items() if i in scores}
+            if not scores:
+                return []
+        if scores is None:
+            scores = dict.fromkeys(candidates if candidates is not None else self.items, 0)
+
+        position, items = self.position, self.items
+        if sort == "price" or sort == "-price":
+            keyed = sorted(scores, key=lambda i: (float(items[i].get("price") or 0), position[i]),
+                           reverse=sort == "-price")
+        elif sort == "name" or sort == "-name":
+            keyed = sorted(scores, key=lambda i: (normalize(items[i].get("name", "")), position[i]),
+                           reverse=sort == "-name")
+        else:
+            keyed = sorted(scores, key=lambda i: (-scores[i], position[i]))
+        return [items[i] for i in keyed]
+
+
+SEARCH_PARAMS = ("q", "category", "min_price", "max_price", "sort")
+
+
+def search_args(args):
+    """search() keyword arguments from request args; ValueError with a message for bad input."""
+    kwargs = {"q": args.get("q"), "category": args.get("category"), "sort": args.get("sort")}
+    for name in ("min_price", "max_price"):
+        value = args.get(name)
+        try:
+            kwargs[name] = float(value) if value not in (None, "") else None
+        except ValueError:
+            raise ValueError(f"{name} must be a number") from None
+        if kwargs[name] is not None and not math.isfinite(kwargs[name]):
+            raise ValueError(f"{name} must be a number")
+    if kwargs["sort"] not in (None, "", *SORTS):
+        raise ValueError("sort must be one of " + ", ".join(SORTS))
+    return kwargs
@@ -0,0 +1,274 @@
+import threading
+import time
+
+from flask import Response, request
+
+# --------------------------------------------------------
+# REQUEST METRICS (/api/metrics, Prometheus text format)
+# --------------------------------------------------------
+# RequestMetrics.instrument(app) times every request between
+# before_request and after_request and files it under
+# (method, route rule, status code), e.g.
+#   GET /api/orders/<int:order_id> 200
+# Time spent inside app.json.response (jsonify) is measured separately,
+# so the handler share is total minus serialize. Bodies that handlers
+# encode themselves (cached menu, order fragments) count as handler time.
+#
+# Latencies go into an HDR-style histogram: integer microseconds, 16
+# linear sub-buckets per power of two, i.e. every value is known to
+# within ~6% from 1 us up to ~67 s, in a flat list of counters.
+#
+# Recording takes no lock: each thread writes to its own shard (a dict
+# of series), and a scrape sums the shards up. Shards of threads that
+# have exited are folded into `retired`, so a server that starts a
+# thread per connection doesn't pile them up.
+#
+# Store sizes and other state are gauges: callbacks read at scrape time.
+
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS            # buckets 0..31 hold 0..31 us exactly
+HALF = SUB_COUNT // 2
+MAX_SHIFT = 21                       # largest bucket ends at 32 << 21 us (~67 s)
+N_BUCKETS = SUB_COUNT + MAX_SHIFT * HALF
+
+# upper bound (exclusive, us) of every bucket
+BUCKET_ENDS = list(range(1, SUB_COUNT + 1)) + [
+    (m + 1) << shift for shift in range(1, MAX_SHIFT + 1) for m in range(HALF, SUB_COUNT)
+]
+
+# Prometheus `le` buckets (seconds) for the exported histogram
+EXPORT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+UNMATCHED = "<unmatched>"            # route label for 404s without a rule
+
+
+def bucket_of(us):
+    if us < SUB_COUNT:
+        return us
+    shift = us.bit_length() - SUB_BITS
+    if shift > MAX_SHIFT:
+        return N_BUCKETS - 1
+    return SUB_COUNT + (shift - 1) * HALF + (us >> shift) - HALF
+
+
+class Series:
+    """One (method, route): latency histogram, status counts, time split."""
+
+    __slots__ = ("counts", "statuses", "total_us", "serialize_us")
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.statuses = {}
+        self.total_us = 0
+        self.serialize_us = 0
+
+    def record(self, status, us, serialize_us):
+        self.counts[bucket_of(us)] += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.total_us += us
+        self.serialize_us += serialize_us
+
+    def merge(self, other):
+        counts = self.counts
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        for status, n in list(other.statuses.items()):
+            self.statuses[status] = self.statuses.get(status, 0) + n
+        self.total_us += other.total_us
+        self.serialize_us += other.serialize_us
+
+    def count(self):
+        return sum(self.statuses.values())
+
+    def quantile(self, q):
+        """Approximate q-quantile in us (middle of its bucket)."""
+        rank = q * sum(self.counts)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                low = BUCKET_ENDS[i - 1] if i else 0
+                return (low + BUCKET_ENDS[i]) / 2
+        return 0.0
+
+    def cumulative(self, bounds_us):
+        """Counts of values below each bound (bucket resolution)."""
+        result = []
+        seen = 0
+        i = 0
+        for bound in bounds_us:
+            while i < N_BUCKETS and BUCKET_ENDS[i] <= bound:
+                seen += self.counts[i]
+                i += 1
+            result.append(seen)
+        return result
+
+
+class RequestMetrics:
+
+    def __init__(self, prefix="srms"):
+        self.prefix = prefix
+        self._lock = threading.Lock()      # shard list and gauges only, not recording
+        self._local = threading.local()
+        self._shards = []                  # (thread, {(method, route): Series})
+        self._retired = {}
+        self._gauges = []                  # (name, help, label, fn)
+
+    # ---------------- recording ----------------
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._shards) > 2 * threading.active_count():
+                    self._fold_dead()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_dead(self):
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+                continue
+            for key, series in shard.items():
+                self._retired.setdefault(key, Series()).merge(series)
+        self._shards = alive
+
+    def record(self, method, route, status, us, serialize_us=0):
+        shard = self._shard()
+        series = shard.get((method, route))
+        if series is None:
+            series = shard[(method, route)] = Series()
+        series.record(status, us, serialize_us)
+
+    def start(self):
+        local = self._local
+        local.serialize_ns = 0
+        local.start_ns = time.perf_counter_ns()
+
+    def finish(self, response):
+        local = self._local
+        start_ns = getattr(local, "start_ns", None)
+        if start_ns is None:
+            return response
+        local.start_ns = None
+        us = (time.perf_counter_ns() - start_ns) // 1000
+        req = request._get_current_object()    # one proxy lookup, not two
+        rule = req.url_rule
+        self.record(req.method, rule.rule if rule is not None else UNMATCHED,
+                    response.status_code, us, local.serialize_ns // 1000)
+        return response
+
+    def instrument(self, app, path="/api/metrics"):
+        """Hook into `app` (request timing + jsonify timing) and serve the metrics at `path`."""
+        local = self._local
+        json_response = app.json.response
+
+        def timed_response(*args, **kwargs):
+            start_ns = time.perf_counter_ns()
+            try:
+                return json_response(*args, **kwargs)
+            finally:
+                local.serialize_ns = getattr(local, "serialize_ns", 0) + time.perf_counter_ns() - start_ns
+
+        app.json.response = timed_response
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.add_url_rule(path, "metrics", self.response)
+        return self
+
+    # ---------------- gauges ----------------
+
+    def gauge(self, name, help, fn, label=None):
+        """fn() -> number, or {label value: number} when `label` is given."""
+        with self._lock:
+            self._gauges.append((name, help, label, fn))
+
+    # ---------------- export ----------------
+
+    def snapshot(self):
+        """{(method, route): Series} summed over every thread so far."""
+        with self._lock:
+            self._fold_dead()
+            shards = [shard for _, shard in self._shards]
+            total = {}
+            for key, series in self._retired.items():
+                total.setdefault(key, Series()).merge(series)
+        for shard in shards:
+            for key, series in list(shard.items()):
+                total.setdefault(key, Series()).merge(series)
+        return total
+
+    def render(self):
+        p = self.prefix
+        series = sorted(self.snapshot().items())
+        out = []
+
+        def header(name, kind, text):
+            out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        def labels(method, route, **extra):
+            pairs = [("method", method), ("route", route), *extra.items()]
+            return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+        name = f"{p}_http_requests_total"
+        header(name, "counter", "Requests by method, route and status code.")
+        for (method, route), s in series:
+            for status, n in sorted(s.statuses.items()):
+                out.append(f"{name}{labels(method, route, status=status)} {n}")
+
+        name = f"{p}_http_errors_total"
+        header(name, "counter", "Requests answered with a 4xx or 5xx status.")
+        for (method, route), s in series:
+            for status, n in sorted(s.statuses.items()):
+                if status >= 400:
+                    out.append(f"{name}{labels(method, route, status=status)} {n}")
+
+        name = f"{p}_http_request_duration_seconds"
+        header(name, "histogram", "Time from before_request to after_request.")
+        bounds_us = [b * 1e6 for b in EXPORT_BUCKETS]
+        for (method, route), s in series:
+            count = s.count()
+            for le, n in zip(EXPORT_BUCKETS, s.cumulative(bounds_us)):
+                out.append(f"{name}_bucket{labels(method, route, le=le)} {n}")
+            out.append(f"{name}_bucket{labels(method, route, le='+Inf')} {count}")
+            out.append(f"{name}_sum{labels(method, route)} {s.total_us / 1e6:.6f}")
+            out.append(f"{name}_count{labels(method, route)} {count}")
+
+        name = f"{p}_http_request_duration_quantile_seconds"
+        header(name, "gauge", "Latency quantiles from the HDR histogram (~6% resolution).")
+        for (method, route), s in series:
+            for q in QUANTILES:
+                out.append(f"{name}{labels(method, route, quantile=q)} {s.quantile(q) / 1e6:.6f}")
+
+        name = f"{p}_http_time_seconds_total"
+        header(name, "counter", "Request time split into handler code and jsonify serialization.")
+        for (method, route), s in series:
+            out.append(f"{name}{labels(method, route, phase='handler')} "
+                       f"{(s.total_us - s.serialize_us) / 1e6:.6f}")
+            out.append(f"{name}{labels(method, route, phase='serialize')} {s.serialize_us / 1e6:.6f}")
+
+        with self._lock:
+            gauges = list(self._gauges)
+        for gname, text, label, fn in gauges:
+            gname = f"{p}_{gname}"
+            header(gname, "gauge", text)
+            value = fn()
+            if label is None:
+                out.append(f"{gname} {value}")
+            else:
+                for key, v in value.items():
+                    out.append(f'{gname}{{{label}="{escape(key)}"}} {v}')
+        return "\n".join(out) + "\n"
+
+    def response(self):
+        return Response(self.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,343 @@
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import attrgetter
+
+# --------------------------------------------------------
+# COMPACT ORDER MODEL
+# --------------------------------------------------------
+# Tens of thousands of orders stay in memory, so an order is a slotted
+# object instead of a dict with its own copy of every key:
+#   - timestamps are epoch microseconds (ints) and only turned into
+#     strings when read through a key or serialized
+#   - status / order type / log messages are interned, so every order
+#     shares the same few string objects
+#   - item lines and log entries are small slotted records too
+#
+# The rest of the code keeps using orders like dicts: order["status"],
+# order.get("items", []), "log" in order, dict(order), ... all work, with
+# the same key names and timestamp format each app used before.
+# JSON encoders call __json__() (see json_default), so responses, the
+# journal and SQLite rows look exactly like the old dicts.
+#
+# One OrderModel per app holds its key names and timestamp format.
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def intern_str(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def now_us():
+    return time.time_ns() // 1000
+
+
+# ---------------- timestamp formats ----------------
+# Formatting happens on every serialization, so the per-second part is
+# cached (orders created in the same second share it).
+
+@lru_cache(maxsize=4096)
+def _utc_second(seconds):
+    return (_EPOCH + timedelta(seconds=seconds)).isoformat()
+
+
+def format_utc_z(us):
+    """2026-10-16T19:30:00.123456Z (oldstyle.py)"""
+    seconds, micro = divmod(us, 1000000)
+    if micro:
+        return "%s.%06dZ" % (_utc_second(seconds), micro)
+    return _utc_second(seconds) + "Z"
+
+
+def parse_utc_z(value):
+    delta = datetime.fromisoformat(value.rstrip("Z")) - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+@lru_cache(maxsize=4096)
+def _local_second(seconds):
+    return datetime.fromtimestamp(seconds).isoformat(timespec="seconds")
+
+
+def format_local_seconds(us):
+    """2026-10-16T19:30:00 in local time (newstyle.py)"""
+    return _local_second(us // 1000000)
+
+
+def parse_local_seconds(value):
+    return int(datetime.fromisoformat(value).timestamp()) * 1000000
+
+
+def json_default(obj):
+    """default= hook for json.dumps: model objects serialize as dicts."""
+    to_json = getattr(obj, "__json__", None)
+    if to_json is not None:
+        return to_json()
+    return str(obj)
+
+
+# ---------------- records ----------------
+
+def layout(keys):
+    """Class attributes for a KEYS mapping (json key -> slot)."""
+    return {"KEYS": keys, "FIELDS": tuple(keys), "VALUES": attrgetter(*keys.values())}
+
+
+class Record:
+    """dict-style read access on top of __slots__ (KEYS: json key -> slot)."""
+    __slots__ = ()
+    KEYS = {}
+    FIELDS = ()      # json keys in output order
+    VALUES = None    # attrgetter of the matching slots
+
+    def __getitem__(self, key):
+        slot = self.KEYS.get(key)
+        if slot is None:
+            raise KeyError(key)
+        return getattr(self, slot)
+
+    def get(self, key, default=None):
+        slot = self.KEYS.get(key)
+        return default if slot is None else getattr(self, slot)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def keys(self):
+        return self.KEYS.keys()
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.__json__()!r})"
+
+
+class Line(Record):
+    """One order line (menu item, name, unit price, quantity)."""
+    __slots__ = ("menu_id", "name", "price", "qty")
+
+    def __init__(self, menu_id, name, price, qty=1):
+        self.menu_id = menu_id
+        self.name = intern_str(name)
+        self.price = price
+        self.qty = qty
+
+    def __json__(self):
+        return dict(zip(self.FIELDS, self.VALUES(self)))
+
+
+class LogEntry(Record):
+    """One line of an order's history."""
+    __slots__ = ("ts", "status", "message")
+    format_ts = staticmethod(format_utc_z)
+
+    def __init__(self, ts, status, message=None):
+        self.ts = ts
+        self.status = intern_str(status)
+        self.message = intern_str(message)
+
+    def __getitem__(self, key):
+        if key == "timestamp":
+            return self.format_ts(self.ts)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == "timestamp":
+            return self.format_ts(self.ts)
+        return super().get(key, default)
+
+    def __json__(self):
+        out = dict(zip(self.FIELDS, self.VALUES(self)))
+        out["timestamp"] = self.format_ts(self.ts)
+        return out
+
+
+class Order(Record):
+    __slots__ = ("id", "customer_name", "order_type", "table", "delivery_address",
+                 "items", "total", "status", "created", "updated", "log", "extra")
+    TIMES = ("created", "updated")
+    LOG_KEY = "log"
+    Line = Line
+    LogEntry = LogEntry
+    format_ts = staticmethod(format_utc_z)
+    parse_ts = staticmethod(parse_utc_z)
+
+    def __init__(self, **slots):
+        for slot in Order.__slots__:
+            setattr(self, slot, slots.get(slot))
+
+    # ---------------- dict-style access ----------------
+
+    def __getitem__(self, key):
+        slot = self.KEYS.get(key)
+        if slot is None:
+            if self.extra and key in self.extra:
+                return self.extra[key]
+            raise KeyError(key)
+        value = getattr(self, slot)
+        if slot in self.TIMES and value is not None:
+            return self.format_ts(value)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        slot = self.KEYS.get(key)
+        if slot is None:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        elif slot in self.TIMES:
+            setattr(self, slot, value if value is None or isinstance(value, int) else self.parse_ts(value))
+        elif slot == "items":
+            self.items = self.make_lines(value)
+        elif slot == "log":
+            self.log = self.make_log(value)
+        elif slot in ("status", "order_type"):
+            setattr(self, slot, intern_str(value))
+        else:
+            setattr(self, slot, value)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def __contains__(self, key):
+        return key in self.KEYS or bool(self.extra and key in self.extra)
+
+    def keys(self):
+        if self.extra:
+            return list(self.KEYS) + list(self.extra)
+        return self.KEYS.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.KEYS) + len(self.extra or ())
+
+    # ---------------- conversion ----------------
+
+    @classmethod
+    def make_lines(cls, lines):
+        key_of = {slot: key for key, slot in cls.Line.KEYS.items()}
+        out = []
+        for it in lines or ():
+            if isinstance(it, Line):
+                out.append(it)
+            else:
+                out.append(cls.Line(it.get(key_of["menu_id"]), it.get("name"),
+                                    it.get("price"), it.get("qty", 1)))
+        return tuple(out)
+
+    @classmethod
+    def make_log(cls, entries):
+        out = []
+        for e in entries or ():
+            if isinstance(e, LogEntry):
+                out.append(e)
+            else:
+                ts = e.get("timestamp")
+                out.append(cls.LogEntry(cls.parse_ts(ts) if isinstance(ts, str) else ts,
+                                        e.get("status"), e.get("message")))
+        return out
+
+    @classmethod
+    def from_dict(cls, row):
+        """Build from a dict using this app's key names (request, journal, SQLite)."""
+        if isinstance(row, cls):
+            return row
+        order = cls()
+        for key, value in row.items():
+            order[key] = value
+        if order.items is None:
+            order.items = ()
+        if order.log is None:
+            order.log = []
+        return order
+
+    def copy(self):
+        """Private copy for an update (the log list is copied, records are shared)."""
+        clone = type(self)()
+        for slot in Order.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        clone.log = list(self.log or ())
+        if self.extra:
+            clone.extra = dict(self.extra)
+        return clone
+
+    @property
+    def stamp(self):
+        """Changes whenever the order does (used by FragmentCache)."""
+        return self.updated, self.status, len(self.log or ())
+
+    def add_log(self, ts, status, message=None):
+        self.log.append(self.LogEntry(ts, status, message))
+
+    def __json__(self):
+        out = dict(zip(self.FIELDS, self.VALUES(self)))
+        if self.created is not None:
+            out["created_at"] = self.format_ts(self.created)
+        if self.updated is not None:
+            out["updated_at"] = self.format_ts(self.updated)
+        out["items"] = [line.__json__() for line in self.items or ()]
+        out[self.LOG_KEY] = [e.__json__() for e in self.log or ()]
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+
+class OrderModel:
+    """
+    Order classes for one app's JSON layout, e.g.
+        OrderModel(type_key="type", table_key="table_number", log_key="logs",
+                   item_id_key="menu_id", log_keys=("timestamp", "message", "status"),
+                   format_ts=format_utc_z, parse_ts=parse_utc_z)
+    """
+
+    def __init__(self, type_key, table_key, log_key, item_id_key, log_keys, format_ts, parse_ts):
+        line_cls = type("Line", (Line,), {
+            "__slots__": (),
+            **layout({item_id_key: "menu_id", "name": "name", "price": "price", "qty": "qty"}),
+        })
+        log_slots = {"timestamp": "ts", "status": "status", "message": "message"}
+        log_cls = type("LogEntry", (LogEntry,), {
+            "__slots__": (),
+            **layout({key: log_slots[key] for key in log_keys}),
+            "format_ts": staticmethod(format_ts),
+        })
+        self.Order = type("Order", (Order,), {
+            "__slots__": (),
+            **layout({
+                "id": "id",
+                "customer_name": "customer_name",
+                type_key: "order_type",
+                table_key: "table",
+                "delivery_address": "delivery_address",
+                "items": "items",
+                "total": "total",
+                "status": "status",
+                "created_at": "created",
+                "updated_at": "updated",
+                log_key: "log",
+            }),
+            "LOG_KEY": log_key,
+            "Line": line_cls,
+            "LogEntry": log_cls,
+            "format_ts": staticmethod(format_ts),
+            "parse_ts": staticmethod(parse_ts),
+        })
+        self.Line = line_cls
+        self.LogEntry = log_cls
+        self.from_dict = self.Order.from_dict
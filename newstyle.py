@@ -1,12 +1,35 @@
-from flask import Flask, jsonify, request
+import copy
+import os
+from types import SimpleNamespace
+
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 
+from admission import admission_from_env
+from analytics import SalesAnalytics
+from archive import Archiver
+from auth import auth_from_env
+from batch import read_batch
+from encoding import FastJSONProvider, FragmentCache, list_response
+from events import EventBus, parse_last_event_id
+from kitchen import ACTIVE_STATUSES
+from menu_search import SEARCH_PARAMS, MenuIndex, search_args
+from metrics import RequestMetrics
+from models import OrderModel, format_local_seconds, now_us, parse_local_seconds
+from order_store import project
+from reservations import ReservationBook, ReservationError
+from response_cache import CachedResource
+from rollups import DEFAULT_SPAN, GRANULARITIES, SalesRollups
+from shards import DEFAULT_BRANCH, Shards, merge_summaries
+from storage import storage_from_env
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)   # orjson when installed, see encoding.py
 CORS(app)
 
 # --------------------------------------------------------
-# IN-MEMORY "DATABASE"
+# IN-MEMORY "DATABASE" (seed data, served through STORE below)
 # --------------------------------------------------------
 MENU = [
     {
@@ -62,7 +85,6 @@ MENU = [
 ]
 
 RESERVATIONS = []
-ORDERS = []
 INVENTORY = [
     {"id": 1, "name": "Rice (kg)", "quantity": 25, "unit": "kg", "low_stock_threshold": 5},
     {"id": 2, "name": "Chicken (kg)", "quantity": 12, "unit": "kg", "low_stock_threshold": 3},
@@ -76,8 +98,74 @@ def now_str():
 
 
 def add_log(order, status):
-    order.setdefault("log", [])
-    order["log"].append({"status": status, "timestamp": now_str()})
+    order.add_log(now_us(), status)
+
+
+# --------------------------------------------------------
+# STORAGE
+# --------------------------------------------------------
+# SRMS_STORAGE=memory (default): the lists above, optionally journaled to
+#   SRMS_DATA_DIR (SRMS_WAL_SYNC=0 skips waiting for fsync).
+# SRMS_STORAGE=sqlite: one SQLite file at SRMS_SQLITE_PATH (default srms.db).
+# SRMS_STORAGE=shared: several worker processes, the data held by
+#   `python shared_store.py` at SRMS_STATE_SOCKET (default srms-state.sock).
+# SRMS_BRANCHES=main,airport,...: one separate store per branch, picked
+#   per request with X-Branch / ?branch= (see shards.py).
+# orders are compact models.Order objects that read and serialize like
+# the old dicts (local time, seconds)
+ORDER_MODEL = OrderModel(
+    type_key="order_type", table_key="table_no", log_key="log", item_id_key="id",
+    log_keys=("status", "timestamp"),
+    format_ts=format_local_seconds, parse_ts=parse_local_seconds
+)
+def open_branch(branch_id):
+    """Storage, indexes and caches of one branch (a shard, see shards.py), all starting from the seed data."""
+    b = SimpleNamespace(branch_id=branch_id)
+    b.store = storage_from_env("order_type", copy.deepcopy(MENU), copy.deepcopy(INVENTORY),
+                               copy.deepcopy(RESERVATIONS), load_order=ORDER_MODEL.from_dict,
+                               branch=None if branch_id == DEFAULT_BRANCH else branch_id)
+    b.sales = SalesAnalytics()      # running totals for /api/analytics
+    b.sales.rebuild(b.store.all_orders(), b.store.archive.summary())
+    # orders / revenue / items per minute, hour and day (/api/analytics/timeseries)
+    b.rollups = SalesRollups("order_type")
+    b.rollups.rebuild(b.store.all_orders(), b.store.archive.minute_rollups())
+    b.order_events = EventBus()     # order deltas for /api/orders/stream
+    b.order_json = FragmentCache()  # encoded orders for list responses
+
+    b.bookings = ReservationBook()  # slot capacity for /api/reservations
+    b.bookings.rebuild(b.store.list_reservations())
+
+    # finished orders move to STORE.archive once they are SRMS_ARCHIVE_AFTER
+    # seconds old (checked every minute; unset = everything stays live)
+    b.archiver = None
+    if os.environ.get("SRMS_ARCHIVE_AFTER"):
+        b.archiver = Archiver(
+            b.store, float(os.environ["SRMS_ARCHIVE_AFTER"]), format_local_seconds,
+            on_archived=lambda ids: b.order_json.invalidate(*ids)
+        ).start()
+
+    b.menu_index = MenuIndex()      # GET /api/menu?q=&category=&min_price=&max_price=&sort=
+    b.menu_index.rebuild(b.store.list_menu())
+
+    # encoded GET bodies, rebuilt only when the table version moves
+    b.menu_cache = CachedResource(lambda: {"menu": b.store.list_menu()}, lambda: b.store.version("menu"))
+    b.inventory_cache = CachedResource(lambda: {"inventory": b.store.list_inventory()},
+                                       lambda: b.store.version("inventory"))
+    return b
+
+
+# one shard per branch in SRMS_BRANCHES (default: just "main"); the names
+# below always mean the branch of the current request
+BRANCHES = Shards(open_branch, os.environ.get("SRMS_BRANCHES", DEFAULT_BRANCH).split(",")).init_app(app)
+STORE = BRANCHES.local("store")
+SALES = BRANCHES.local("sales")
+ROLLUPS = BRANCHES.local("rollups")
+ORDER_EVENTS = BRANCHES.local("order_events")
+ORDER_JSON = BRANCHES.local("order_json")
+BOOKINGS = BRANCHES.local("bookings")
+MENU_INDEX = BRANCHES.local("menu_index")
+MENU_CACHE = BRANCHES.local("menu_cache")
+INVENTORY_CACHE = BRANCHES.local("inventory_cache")
 
 
 # --------------------------------------------------------
@@ -94,23 +182,27 @@ def health():
 
 
 # --------------------------------------------------------
-# AUTH (simple demo)
+# AUTH (salted password hashes, signed session tokens; see auth.py)
 # --------------------------------------------------------
+# demo passwords: admin123 / waiter123 / chef123
 USERS = {
-    "admin": {"password": "admin123", "role": "ADMIN"},
-    "waiter": {"password": "waiter123", "role": "WAITER"},
-    "chef": {"password": "chef123", "role": "CHEF"},
+    "admin": {"password_hash": "pbkdf2_sha256$600000$u6PRSu8VtBam9LjrgwTbVw$7GrIOWFY4ZZae5jYaJq3eguJrEDv6oKhROC2Z9-997U", "role": "ADMIN"},
+    "waiter": {"password_hash": "pbkdf2_sha256$600000$ZRsLboqkBeGgU5QF-eq_Pw$0VsE9-sXYr6wkN9LEEOC2Hr601bm5K6eglEYr2VNTAk", "role": "WAITER"},
+    "chef": {"password_hash": "pbkdf2_sha256$600000$YozvVFesqcprBQNO2cRlCQ$Bsv10JRkrabgs3rk8oIc-Eeno6MXw9TANHAOtgV4rMI", "role": "CHEF"},
 }
+AUTH = auth_from_env(USERS)
 
 @app.post("/api/login")
 def login():
+    """Password checked once here; later requests send the token as 'Authorization: Bearer <token>'."""
     data = request.get_json() or {}
     username = data.get("username", "")
     password = data.get("password", "")
-    user = USERS.get(username)
-    if not user or user["password"] != password:
+    user = AUTH.login(username, password)
+    if not user:
         return jsonify({"success": False, "message": "Invalid credentials"}), 401
-    return jsonify({"success": True, "role": user["role"], "username": username})
+    return jsonify({"success": True, "role": user["role"], "username": username,
+                    "token": AUTH.issue(username, user["role"]), "expires_in": AUTH.ttl})
 
 
 # --------------------------------------------------------
@@ -118,23 +210,35 @@ def login():
 # --------------------------------------------------------
 @app.get("/api/menu")
 def get_menu():
-    return jsonify({"menu": MENU})
+    """Cached body with ETag; If-None-Match gets a 304. Search/filter params go to MENU_INDEX."""
+    if not any(request.args.get(name) for name in SEARCH_PARAMS):
+        return MENU_CACHE.response(request)
+    try:
+        kwargs = search_args(request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    results = MENU_INDEX.search(**kwargs)
+    return jsonify({"menu": results, "count": len(results)})
 
 
 @app.put("/api/menu/<int:item_id>")
+@AUTH.require("ADMIN")
 def update_menu_item(item_id):
     data = request.get_json() or {}
-    item = next((m for m in MENU if m["id"] == item_id), None)
-    if not item:
-        return jsonify({"error": "Menu item not found"}), 404
-
-    if "name" in data:
-        item["name"] = data["name"]
-    if "price" in data:
-        item["price"] = float(data["price"])
-    if "category" in data:
-        item["category"] = data["category"]
-
+    with STORE.transaction():
+        item = STORE.get_menu_item(item_id, for_update=True)
+        if not item:
+            return jsonify({"error": "Menu item not found"}), 404
+
+        if "name" in data:
+            item["name"] = data["name"]
+        if "price" in data:
+            item["price"] = float(data["price"])
+        if "category" in data:
+            item["category"] = data["category"]
+
+        STORE.save_menu_item(item)
+        MENU_INDEX.update(item)
     return jsonify(item)
 
 
@@ -143,21 +247,24 @@ def update_menu_item(item_id):
 # --------------------------------------------------------
 @app.get("/api/inventory")
 def get_inventory():
-    return jsonify({"inventory": INVENTORY})
+    return INVENTORY_CACHE.response(request)
 
 
 @app.put("/api/inventory/<int:item_id>")
+@AUTH.require("ADMIN")
 def update_inventory_item(item_id):
     data = request.get_json() or {}
-    inv = next((x for x in INVENTORY if x["id"] == item_id), None)
-    if not inv:
-        return jsonify({"error": "Inventory item not found"}), 404
+    with STORE.transaction():
+        inv = STORE.get_inventory_item(item_id, for_update=True)
+        if not inv:
+            return jsonify({"error": "Inventory item not found"}), 404
 
-    if "quantity" in data:
-        inv["quantity"] = float(data["quantity"])
-    if "low_stock_threshold" in data:
-        inv["low_stock_threshold"] = float(data["low_stock_threshold"])
+        if "quantity" in data:
+            inv["quantity"] = float(data["quantity"])
+        if "low_stock_threshold" in data:
+            inv["low_stock_threshold"] = float(data["low_stock_threshold"])
 
+        STORE.save_inventory_item(inv)
     return jsonify(inv)
 
 
@@ -166,24 +273,64 @@ def update_inventory_item(item_id):
 # --------------------------------------------------------
 @app.post("/api/reservations")
 def create_reservation():
+    """
+    Input: { name, date: "YYYY-MM-DD", time: "HH:MM", size }
+    400 for invalid input, 409 when no table of that size is free for
+    the whole sitting (see reservations.py).
+    """
     data = request.get_json() or {}
-
-    new_res = {
-        "id": len(RESERVATIONS) + 1,
-        "name": data.get("name", "Guest"),
-        "date": data.get("date", ""),
-        "time": data.get("time", ""),
-        "size": data.get("size", 1),
-        "created_at": now_str()
-    }
-
-    RESERVATIONS.append(new_res)
+    try:
+        size = int(data.get("size", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Party size must be a positive number"}), 400
+
+    with STORE.transaction():
+        try:
+            table_size = BOOKINGS.book(data.get("date", ""), data.get("time", ""), size)
+        except ReservationError as e:
+            return jsonify({"error": str(e)}), e.status
+
+        new_res = {
+            "id": STORE.next_reservation_id(),
+            "name": data.get("name", "Guest"),
+            "date": data["date"],
+            "time": data["time"],
+            "size": size,
+            "table_size": table_size,
+            "created_at": now_str()
+        }
+
+        STORE.add_reservation(new_res)
+        BOOKINGS.add(new_res)
     return jsonify(new_res), 201
 
 
 @app.get("/api/reservations")
 def list_reservations():
-    return jsonify({"reservations": RESERVATIONS})
+    """Optional ?date=YYYY-MM-DD returns only that day's bookings."""
+    date = request.args.get("date")
+    if date:
+        return jsonify({"reservations": BOOKINGS.on_date(date)})
+    return jsonify({"reservations": STORE.list_reservations()})
+
+
+@app.get("/api/reservations/availability")
+def reservation_availability():
+    """
+    ?date=YYYY-MM-DD&size=N
+    Output: { date, size, times: ["12:00", "12:30", ...] } = start times
+    with a table for N free for the whole sitting.
+    """
+    date = request.args.get("date", "")
+    try:
+        size = int(request.args.get("size", 2))
+    except ValueError:
+        return jsonify({"error": "Party size must be a positive number"}), 400
+    try:
+        times = BOOKINGS.availability(date, size)
+    except ReservationError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify({"date": date, "size": size, "times": times})
 
 
 # --------------------------------------------------------
@@ -194,9 +341,12 @@ VALID_STATUSES = [
     "OUT_FOR_DELIVERY", "COMPLETED", "CANCELLED"
 ]
 
-@app.post("/api/orders")
-def create_order():
-    data = request.get_json() or {}
+def build_order(data, lookup=None):
+    """
+    Normalize + price one order payload (nothing stored, id still None).
+    `lookup` resolves menu ids, defaults to STORE.get_menu_item.
+    """
+    lookup = lookup or STORE.get_menu_item
 
     items = data.get("items", [])
     order_type = data.get("order_type", "WALK_IN")  # WALK_IN / DINE_IN / DELIVERY
@@ -213,13 +363,13 @@ def create_order():
             qty = int(item.get("qty", 1))
             normalized_items.append({
                 "id": item.get("id"),
-                "name": item["name"],
+                "name": str(item["name"]),     # client-supplied; analytics rank names as strings
                 "price": float(item["price"]),
                 "qty": qty
             })
             total += float(item["price"]) * qty
         elif isinstance(item, int):
-            m = next((x for x in MENU if x["id"] == item), None)
+            m = lookup(item)
             if m:
                 normalized_items.append({
                     "id": m["id"],
@@ -229,8 +379,9 @@ def create_order():
                 })
                 total += float(m["price"])
 
-    new_order = {
-        "id": len(ORDERS) + 1,
+    now = now_us()
+    new_order = ORDER_MODEL.from_dict({
+        "id": None,                 # assigned under the store lock below
         "customer_name": customer_name,
         "order_type": order_type,   # WALK_IN / DINE_IN / DELIVERY
         "table_no": table_no,
@@ -238,15 +389,85 @@ def create_order():
         "items": normalized_items,
         "total": total,
         "status": "RECEIVED",
-        "created_at": now_str(),
-        "updated_at": now_str()
-    }
+        "created_at": now,
+        "updated_at": now
+    })
     add_log(new_order, "RECEIVED")
+    return new_order
+
+
+def commit_order(order):
+    """Allocate the id and store a built order (inside STORE.transaction())."""
+    order["id"] = STORE.next_order_id()
+    STORE.add_order(order)
+    index_new_order(order)
+
+
+def index_new_order(order):
+    """Totals, rollups and event for a stored new order."""
+    SALES.record_order(order)
+    ROLLUPS.record_order(order)
+    ORDER_EVENTS.publish("order.created", {"order": order})
+
+
+def index_status_change(order, old_status):
+    """Cached JSON, totals, rollups and event for a saved status change."""
+    ORDER_JSON.invalidate(order["id"])
+    SALES.status_changed(order, old_status)
+    ROLLUPS.status_changed(order, old_status)
+    ORDER_EVENTS.publish("order.updated", {"order": order})
+
+
+@app.post("/api/orders")
+def create_order():
+    data = request.get_json() or {}
+    new_order = build_order(data)
 
-    ORDERS.append(new_order)
+    # id allocation + indexes + totals + event happen as one step
+    with STORE.transaction():
+        commit_order(new_order)
     return jsonify(new_order), 201
 
 
+@app.post("/api/orders/batch")
+def create_orders_batch():
+    """
+    Bulk ingestion for delivery partners:
+        body = JSON array of orders, {"orders": [...]}, or NDJSON
+    Every order is priced against one menu index built for the batch and
+    all of them are stored in a single transaction. Response:
+        {"results": [{"index", "status": 201, "order"} | {"index", "status": 400, "error"}],
+         "created": n, "failed": m}
+    """
+    payloads, error = read_batch(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    menu_index = {m["id"]: m for m in STORE.list_menu()}
+    results = []
+    accepted = []
+    for i, data in enumerate(payloads):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError
+            order = build_order(data, menu_index.get)
+        except (TypeError, ValueError):
+            results.append({"index": i, "status": 400, "error": "Invalid order"})
+            continue
+        accepted.append(order)
+        results.append({"index": i, "status": 201, "order": order})
+
+    with STORE.transaction():
+        for order in accepted:
+            commit_order(order)
+
+    return jsonify({
+        "results": results,
+        "created": len(accepted),
+        "failed": len(results) - len(accepted)
+    })
+
+
 @app.get("/api/orders")
 def list_orders():
     """
@@ -254,44 +475,117 @@ def list_orders():
         ?status=PREPARING
         ?order_type=DINE_IN
         ?for=kitchen  (only RECEIVED/PREPARING)
+    Paging / sync:
+        ?limit=50&after_id=120   (next page cursor comes back as next_after_id)
+        ?since=<updated_at>      (only orders changed since then)
+        ?fields=id,status,total  (leave out log/items)
     """
     status = request.args.get("status")
     order_type = request.args.get("order_type")
     for_kitchen = request.args.get("for") == "kitchen"
+    limit = request.args.get("limit", type=int)
+    after_id = request.args.get("after_id", type=int)
+    since = request.args.get("since")
+    fields = [f for f in request.args.get("fields", "").split(",") if f]
+
+    result = STORE.find_orders(
+        status=status,
+        order_type=order_type,
+        statuses=("RECEIVED", "PREPARING") if for_kitchen else None,
+        after_id=after_id,
+        limit=limit,
+        since=since
+    )
+
+    extra = {}
+    if limit:
+        # cursor for the next page (None = this was the last one)
+        extra["next_after_id"] = result[-1]["id"] if len(result) == limit else None
+    if since:
+        extra["next_since"] = STORE.last_order_change()
+    if fields:
+        return jsonify({"orders": [project(o, fields) for o in result], **extra})
+    # full orders: joined from per-order cached JSON
+    return list_response(app.response_class, "orders", ORDER_JSON.encode_list(result), extra)
 
-    result = ORDERS
-    if status:
-        result = [o for o in result if o["status"] == status]
-    if order_type:
-        result = [o for o in result if o["order_type"] == order_type]
-    if for_kitchen:
-        result = [o for o in result if o["status"] in ("RECEIVED", "PREPARING")]
 
-    return jsonify({"orders": result})
+@app.get("/api/orders/archive")
+def list_archived_orders():
+    """
+    Finished orders that were moved to STORE.archive (SRMS_ARCHIVE_AFTER),
+    oldest id first. Optional query:
+    - from / to: created_at range (local timestamps or dates, to is exclusive)
+    - order_type, status
+    - limit (default 100) + after_id: cursor pagination (next_after_id)
+    """
+    limit = request.args.get("limit", 100, type=int)
+    try:
+        start = request.args.get("from")
+        start = parse_local_seconds(start) if start else None
+        end = request.args.get("to")
+        end = parse_local_seconds(end) if end else None
+    except ValueError:
+        return jsonify({"error": "from / to must be ISO 8601 timestamps"}), 400
+
+    result = STORE.archive.find(
+        start, end,
+        order_type=request.args.get("order_type"),
+        status=request.args.get("status"),
+        after_id=request.args.get("after_id", type=int),
+        limit=limit
+    )
+    return jsonify({
+        "orders": result,
+        "next_after_id": result[-1]["id"] if limit and len(result) == limit else None
+    })
+
+
+@app.get("/api/orders/stream")
+def order_stream():
+    """
+    Server-Sent Events with order deltas (order.created / order.updated).
+    Resume with the Last-Event-ID header (browsers send it on reconnect)
+    or ?last_event_id=N. A "reset" event means: reload /api/orders.
+    """
+    last_id = parse_last_event_id(
+        request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    )
+    return Response(
+        stream_with_context(ORDER_EVENTS.stream(last_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/api/orders/<int:order_id>")
 def get_order(order_id):
-    o = next((x for x in ORDERS if x["id"] == order_id), None)
+    o = STORE.get_order(order_id)
     if not o:
         return jsonify({"error": "Order not found"}), 404
     return jsonify(o)
 
 
 @app.patch("/api/orders/<int:order_id>/status")
+@AUTH.require("ADMIN", "WAITER", "CHEF")
 def update_order_status(order_id):
     data = request.get_json() or {}
     new_status = data.get("status")
     if new_status not in VALID_STATUSES:
         return jsonify({"error": "Invalid status"}), 400
 
-    o = next((x for x in ORDERS if x["id"] == order_id), None)
-    if not o:
-        return jsonify({"error": "Order not found"}), 404
-
-    o["status"] = new_status
-    o["updated_at"] = now_str()
-    add_log(o, new_status)
+    with STORE.transaction():
+        o = STORE.get_order(order_id, for_update=True)
+        if not o:
+            if order_id in STORE.archive:
+                return jsonify({"error": "Order is archived and can no longer change"}), 409
+            return jsonify({"error": "Order not found"}), 404
+
+        old_status = o["status"]
+        o["status"] = new_status
+        o["updated_at"] = now_us()
+        add_log(o, new_status)
+        STORE.save_order(o, old_status)
+        index_status_change(o, old_status)
     return jsonify(o)
 
 
@@ -300,30 +594,167 @@ def update_order_status(order_id):
 # --------------------------------------------------------
 @app.get("/api/analytics")
 def analytics():
-    total_orders = len(ORDERS)
-    total_revenue = sum(o.get("total", 0) for o in ORDERS)
-
-    # Count items
-    counts = {}
-    for o in ORDERS:
-        for it in o.get("items", []):
-            n = it.get("name", "Unknown")
-            counts[n] = counts.get(n, 0) + int(it.get("qty", 1))
-
-    # Sort top items
-    top_items = sorted(
-        [{"name": k, "count": v} for k, v in counts.items()],
-        key=lambda x: x["count"],
-        reverse=True
-    )
+    """
+    Served from the running SALES totals (no scan over the orders).
+    Optional: ?top=10  (how many best sellers to return)
+    """
+    top = request.args.get("top", 10, type=int)
+    return jsonify(SALES.summary(top))
 
+
+@app.get("/api/analytics/archive")
+def archive_analytics():
+    """
+    Totals over the archived orders only, reduced column by column
+    (see archive.py). Optional: ?from=&to= (created_at), ?order_type=, ?top=10
+    """
+    top = request.args.get("top", 10, type=int)
+    try:
+        start = request.args.get("from")
+        start = parse_local_seconds(start) if start else None
+        end = request.args.get("to")
+        end = parse_local_seconds(end) if end else None
+    except ValueError:
+        return jsonify({"error": "from / to must be ISO 8601 timestamps"}), 400
+
+    summary = STORE.archive.summary(start, end, request.args.get("order_type"))
+    counts = sorted(summary.pop("counts").items(), key=lambda kv: (-kv[1], str(kv[0])))
+    summary["total_revenue"] = round(summary["total_revenue"], 2)
+    summary["top_items"] = [{"name": name, "count": count} for name, count in counts[:top]]
+    return jsonify(summary)
+
+
+@app.get("/api/analytics/timeseries")
+def analytics_timeseries():
+    """
+    Orders, revenue and items per time bucket, answered from ROLLUPS.
+    Query:
+    - granularity: minute, hour (default), day or week
+    - from / to: local timestamps or dates, to is exclusive
+      (default: now and a span that suits the granularity)
+    - group_by: order_type or item (one point per bucket and group)
+    """
+    granularity = request.args.get("granularity", "hour")
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "granularity must be one of " + ", ".join(GRANULARITIES)}), 400
+    group_by = request.args.get("group_by")
+    if group_by not in (None, "order_type", "item"):
+        return jsonify({"error": "group_by must be order_type or item"}), 400
+
+    try:
+        end = request.args.get("to")
+        end = parse_local_seconds(end) // 1000000 if end else now_us() // 1000000 + 1
+        start = request.args.get("from")
+        start = parse_local_seconds(start) // 1000000 if start else end - DEFAULT_SPAN[granularity]
+    except ValueError:
+        return jsonify({"error": "from / to must be ISO 8601 timestamps"}), 400
+
+    points = []
+    for at, group, orders, revenue, items in ROLLUPS.timeseries(start, end, granularity, group_by):
+        point = {"start": format_local_seconds(at * 1000000), "orders": orders, "revenue": revenue, "items": items}
+        if group_by:
+            point[group_by] = group
+        points.append(point)
     return jsonify({
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-        "top_items": top_items
+        "granularity": granularity,
+        "from": format_local_seconds(start * 1000000),
+        "to": format_local_seconds(end * 1000000),
+        "points": points
     })
 
 
+# --------------------------------------------------------
+# BRANCHES (cross-branch reads)
+# --------------------------------------------------------
+@app.get("/api/branches")
+def list_branches():
+    return jsonify({"branches": BRANCHES.branch_ids, "default": BRANCHES.default})
+
+
+@app.get("/api/branches/analytics")
+def branches_analytics():
+    """
+    /api/analytics of every branch, gathered in parallel, plus the totals
+    over all of them. Optional: ?top=10
+    """
+    top = request.args.get("top", 10, type=int)
+
+    def branch_summary(shard):
+        summary = shard.sales.summary(top)
+        summary["counts"] = dict(shard.sales.counts)
+        summary["active_orders"] = shard.store.count_orders(statuses=ACTIVE_STATUSES)
+        return summary
+
+    per_branch = BRANCHES.scatter(branch_summary)
+    total = merge_summaries(per_branch.values(), top)
+    total["active_orders"] = sum(summary["active_orders"] for summary in per_branch.values())
+    for summary in per_branch.values():
+        del summary["counts"]
+    return jsonify({"branches": per_branch, "total": total})
+
+
+# --------------------------------------------------------
+# OTHER WORKER PROCESSES (SRMS_STORAGE=shared)
+# --------------------------------------------------------
+# STORE is then a replica (see shared_store.py); writes made by the
+# other workers arrive here once they are stored and go through the same
+# indexing as local ones. Event ids stay per process: a stream resumed on
+# another worker starts with a "reset".
+def apply_peer_change(table, action, row, old_status=None):
+    if table == "orders":
+        if action == "add":
+            index_new_order(row)
+        elif action == "save":
+            index_status_change(row, old_status)
+        elif action == "remove":
+            ORDER_JSON.invalidate(*row)
+    elif table == "menu":
+        MENU_INDEX.update(row)
+    elif table == "reservations":
+        BOOKINGS.add(row)
+
+
+for branch_id, shard in BRANCHES.items():
+    if hasattr(shard.store, "subscribe"):
+        shard.store.subscribe(BRANCHES.bind(branch_id, apply_peer_change))
+
+
+# --------------------------------------------------------
+# METRICS (/api/metrics, Prometheus text format)
+# --------------------------------------------------------
+# per-route latency histograms, status counts and handler / jsonify
+# time (see metrics.py); SRMS_METRICS=0 leaves the app uninstrumented
+METRICS = RequestMetrics()
+METRICS.gauge("orders", "Orders in the live store, by status.",
+              lambda: {s: STORE.count_orders(status=s) for s in VALID_STATUSES}, label="status")
+METRICS.gauge("orders_active", "Live orders not yet completed or cancelled.",
+              lambda: STORE.count_orders(statuses=ACTIVE_STATUSES))
+METRICS.gauge("orders_archived", "Orders moved to the archive.", lambda: len(STORE.archive))
+METRICS.gauge("reservations", "Stored reservations.", lambda: len(STORE.list_reservations()))
+METRICS.gauge("order_json_cache_entries", "Encoded orders kept for list responses.", lambda: len(ORDER_JSON))
+METRICS.gauge("order_events_last_id", "Id of the last published order event.", lambda: ORDER_EVENTS.last_id)
+METRICS.gauge("rollup_buckets", "Time buckets held by the sales rollups, per tier.",
+              ROLLUPS.bucket_count, label="tier")
+if os.environ.get("SRMS_METRICS", "1") != "0":
+    METRICS.instrument(app)
+
+
+# --------------------------------------------------------
+# ADMISSION CONTROL (429 + Retry-After under overload)
+# --------------------------------------------------------
+# per-client, per-route and server token buckets with priority classes,
+# so order creation and status changes get through while dashboards
+# polling analytics are shed (see admission.py); off unless SRMS_ADMISSION=1.
+# Hooked in after METRICS so that shed requests show up there as 429s.
+ADMISSION = admission_from_env().init_app(app)
+METRICS.gauge("admission_admitted", "Requests let through by admission control, by priority class.",
+              lambda: dict(ADMISSION.admitted), label="class")
+METRICS.gauge("admission_shed", "Requests answered 429 by admission control, by priority class.",
+              lambda: ADMISSION.shed_by(0), label="class")
+METRICS.gauge("admission_shed_reason", "Requests answered 429, by the bucket that was empty.",
+              lambda: ADMISSION.shed_by(1), label="reason")
+
+
 # --------------------------------------------------------
 # START SERVER
 # --------------------------------------------------------
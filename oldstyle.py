@@ -1,18 +1,44 @@
-from flask import Flask, jsonify, request
+import copy
+import os
+from types import SimpleNamespace
+
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 
+from admission import admission_from_env
+from analytics import SalesAnalytics
+from archive import ARCHIVE_STATUSES, Archiver
+from auth import auth_from_env
+from batch import read_batch
+from encoding import FastJSONProvider, FragmentCache, list_response
+from events import EventBus, parse_last_event_id
+from inventory import RECIPES, InventoryEngine
+from kitchen import ACTIVE_STATUSES, KitchenScheduler
+from menu_search import SEARCH_PARAMS, MenuIndex, search_args
+from metrics import RequestMetrics
+from models import OrderModel, format_utc_z, now_us, parse_utc_z
+from order_store import project
+from recommender import CoOccurrenceRecommender
+from reservations import ReservationBook, ReservationError
+from response_cache import CachedResource
+from rollups import DEFAULT_SPAN, GRANULARITIES, SalesRollups
+from shards import DEFAULT_BRANCH, Shards, merge_summaries
+from storage import storage_from_env
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)   # orjson when installed, see encoding.py
 CORS(app)
 
 # --------------------------------------------------------
-# SIMPLE IN-MEMORY "DATABASE"
+# SIMPLE IN-MEMORY "DATABASE" (seed data, served through STORE below)
 # --------------------------------------------------------
 
+# demo passwords: admin123 / waiter123 / chef123 (salted PBKDF2, see auth.py)
 USERS = [
-    {"username": "admin",  "password": "admin123",  "role": "ADMIN"},
-    {"username": "waiter", "password": "waiter123", "role": "WAITER"},
-    {"username": "chef",   "password": "chef123",   "role": "CHEF"},
+    {"username": "admin",  "password_hash": "pbkdf2_sha256$600000$u6PRSu8VtBam9LjrgwTbVw$7GrIOWFY4ZZae5jYaJq3eguJrEDv6oKhROC2Z9-997U",  "role": "ADMIN"},
+    {"username": "waiter", "password_hash": "pbkdf2_sha256$600000$ZRsLboqkBeGgU5QF-eq_Pw$0VsE9-sXYr6wkN9LEEOC2Hr601bm5K6eglEYr2VNTAk", "role": "WAITER"},
+    {"username": "chef",   "password_hash": "pbkdf2_sha256$600000$YozvVFesqcprBQNO2cRlCQ$Bsv10JRkrabgs3rk8oIc-Eeno6MXw9TANHAOtgV4rMI",   "role": "CHEF"},
 ]
 
 MENU = [
@@ -78,7 +104,90 @@ INVENTORY = [
 ]
 
 RESERVATIONS = []  # { id, name, date, time, size }
-ORDERS = []        # see structure below
+# orders live in STORE (see structure below)
+
+# --------------------------------------------------------
+# STORAGE
+# --------------------------------------------------------
+# SRMS_STORAGE=memory (default): the lists above, optionally journaled to
+#   SRMS_DATA_DIR (SRMS_WAL_SYNC=0 skips waiting for fsync).
+# SRMS_STORAGE=sqlite: one SQLite file at SRMS_SQLITE_PATH (default srms.db).
+# SRMS_STORAGE=shared: several worker processes, the data held by
+#   `python shared_store.py` at SRMS_STATE_SOCKET (default srms-state.sock).
+# SRMS_BRANCHES=main,airport,...: one separate store per branch, picked
+#   per request with X-Branch / ?branch= (see shards.py).
+# orders are compact models.Order objects that read and serialize like
+# the old dicts (UTC, ISO 8601 with "Z")
+ORDER_MODEL = OrderModel(
+    type_key="type", table_key="table_number", log_key="logs", item_id_key="menu_id",
+    log_keys=("timestamp", "message", "status"),
+    format_ts=format_utc_z, parse_ts=parse_utc_z
+)
+def open_branch(branch_id):
+    """Storage, indexes and caches of one branch (a shard, see shards.py), all starting from the seed data."""
+    b = SimpleNamespace(branch_id=branch_id)
+    b.store = storage_from_env("type", copy.deepcopy(MENU), copy.deepcopy(INVENTORY),
+                               copy.deepcopy(RESERVATIONS), load_order=ORDER_MODEL.from_dict,
+                               branch=None if branch_id == DEFAULT_BRANCH else branch_id)
+    b.sales = SalesAnalytics()          # running totals for /api/analytics
+    b.sales.rebuild(b.store.all_orders(), b.store.archive.summary())
+    # orders / revenue / items per minute, hour and day (/api/analytics/timeseries)
+    b.rollups = SalesRollups("type", utc=True)
+    b.rollups.rebuild(b.store.all_orders(), b.store.archive.minute_rollups())
+    b.order_events = EventBus()         # order deltas for /api/orders/stream
+    b.order_json = FragmentCache()      # encoded orders for list responses
+    b.stock = InventoryEngine(RECIPES)  # recipe-based deductions + low-stock set
+    b.stock.rebuild(b.store.list_inventory())
+    # active orders by kitchen priority (SRMS_KITCHEN_POLICY=fifo|spf|deadline)
+    b.kitchen = KitchenScheduler(
+        lambda menu_id: (b.store.get_menu_item(menu_id) or {}).get("category"),
+        policy=os.environ.get("SRMS_KITCHEN_POLICY", "fifo")
+    )
+    b.kitchen.rebuild(b.store.find_orders(statuses=ACTIVE_STATUSES))
+    b.recs = CoOccurrenceRecommender()  # items ordered together, for /api/recommendations
+    b.recs.rebuild(b.store.all_orders(), b.store.archive.item_lists())
+
+    b.bookings = ReservationBook()   # slot capacity for /api/reservations
+    b.bookings.rebuild(b.store.list_reservations())
+
+    # finished orders move to STORE.archive once they are SRMS_ARCHIVE_AFTER
+    # seconds old (checked every minute; unset = everything stays live)
+    b.archiver = None
+    if os.environ.get("SRMS_ARCHIVE_AFTER"):
+        b.archiver = Archiver(
+            b.store, float(os.environ["SRMS_ARCHIVE_AFTER"]), format_utc_z,
+            on_archived=lambda ids: b.order_json.invalidate(*ids)
+        ).start()
+
+    b.menu_index = MenuIndex()      # GET /api/menu?q=&category=&min_price=&max_price=&sort=
+    b.menu_index.rebuild(b.store.list_menu())
+
+    # encoded GET bodies, rebuilt only when the table version moves
+    b.menu_cache = CachedResource(lambda: {"menu": b.store.list_menu()}, lambda: b.store.version("menu"))
+    b.inventory_cache = CachedResource(
+        lambda: {"inventory": b.store.list_inventory(), "low_stock": b.stock.low_stock(b.store)},
+        # the low-stock set is updated after the row is saved: key on both
+        lambda: (b.store.version("inventory"), b.stock.version)
+    )
+    return b
+
+
+# one shard per branch in SRMS_BRANCHES (default: just "main"); the names
+# below always mean the branch of the current request
+BRANCHES = Shards(open_branch, os.environ.get("SRMS_BRANCHES", DEFAULT_BRANCH).split(",")).init_app(app)
+STORE = BRANCHES.local("store")
+SALES = BRANCHES.local("sales")
+ROLLUPS = BRANCHES.local("rollups")
+ORDER_EVENTS = BRANCHES.local("order_events")
+ORDER_JSON = BRANCHES.local("order_json")
+STOCK = BRANCHES.local("stock")
+KITCHEN = BRANCHES.local("kitchen")
+RECS = BRANCHES.local("recs")
+BOOKINGS = BRANCHES.local("bookings")
+MENU_INDEX = BRANCHES.local("menu_index")
+MENU_CACHE = BRANCHES.local("menu_cache")
+INVENTORY_CACHE = BRANCHES.local("inventory_cache")
+
 
 # --------------------------------------------------------
 # HELPER FUNCTIONS
@@ -89,57 +198,58 @@ def now_iso():
 
 
 def find_menu_item(menu_id):
-    return next((m for m in MENU if m["id"] == menu_id), None)
+    return STORE.get_menu_item(menu_id)
 
 
 def add_log(order, message):
-    order.setdefault("logs", [])
-    order["logs"].append({
-        "timestamp": now_iso(),
-        "message": message,
-        "status": order.get("status")
-    })
+    order.add_log(now_us(), order.get("status"), message)
 
 
 def recalc_inventory_for_order(order):
     """
-    Very simplified demo:
-    - For each item, subtract 1 unit from some inventory lines
-      (You can make mapping item->ingredient if you want.)
+    Deduct the ingredients of every line (see RECIPES in inventory.py),
+    scaled by qty.
     """
-    for inv in INVENTORY:
-        if inv["name"].startswith("Rice") and any("Mandi" in it["name"] or "Biryani" in it["name"] for it in order["items"]):
-            inv["qty"] = max(inv["qty"] - 1, 0)
-        if inv["name"].startswith("Tea") and any("Karak" in it["name"] for it in order["items"]):
-            inv["qty"] = max(inv["qty"] - 0.1, 0)
+    STOCK.deduct(STORE, order["items"])
 
 
 def low_stock_items():
-    alerts = []
-    for inv in INVENTORY:
-        if inv["qty"] <= inv["low_stock_threshold"]:
-            alerts.append(inv)
-    return alerts
+    return STOCK.low_stock(STORE)
 
 
 def simple_recommendations(current_item_ids):
     """
-    Simple "AI-style" collaborative filter:
-    - If certain item in cart, recommend others that match category
-    - fallback: top 3 most expensive items not in cart
+    Collaborative filter: the items most often ordered together with
+    the cart (RECS, learned from every stored order).
+    Slots the history can't fill yet use category_recommendations().
     """
+    # only numbers can be menu ids (a list or an object would not even hash)
+    current_item_ids = [i for i in current_item_ids if isinstance(i, (int, float))]
     if not current_item_ids:
         return []
 
-    current_items = [m for m in MENU if m["id"] in current_item_ids]
-    current_cats = {m["category"] for m in current_items}
+    recs = [STORE.get_menu_item(i) for i in RECS.recommend(current_item_ids, 3)]
+    recs = [m for m in recs if m]
+    if len(recs) < 3:
+        skip = set(current_item_ids) | {m["id"] for m in recs}
+        recs += category_recommendations(current_item_ids, skip, 3 - len(recs))
+    return recs
 
-    candidates = [m for m in MENU if m["id"] not in current_item_ids and m["category"] in current_cats]
-    if not candidates:
-        candidates = [m for m in MENU if m["id"] not in current_item_ids]
+
+def category_recommendations(current_item_ids, skip, n):
+    """
+    Cold start rule (no order history):
+    - recommend others that match the cart's categories
+    - fallback: most expensive items not in cart
+    """
+    menu = STORE.list_menu()
+    current_cats = {m["category"] for m in menu if m["id"] in current_item_ids}
+
+    free = [m for m in menu if m["id"] not in skip]
+    candidates = [m for m in free if m["category"] in current_cats] or free
 
     candidates_sorted = sorted(candidates, key=lambda x: x["price"], reverse=True)
-    return candidates_sorted[:3]
+    return candidates_sorted[:n]
 
 
 # --------------------------------------------------------
@@ -159,6 +269,8 @@ def health():
 # --------------------------------------------------------
 # AUTH / LOGIN
 # --------------------------------------------------------
+AUTH = auth_from_env({u["username"]: u for u in USERS})
+
 
 @app.post("/api/auth/login")
 def login():
@@ -166,15 +278,18 @@ def login():
     username = data.get("username", "")
     password = data.get("password", "")
 
-    user = next((u for u in USERS if u["username"] == username and u["password"] == password), None)
+    user = AUTH.login(username, password)
     if not user:
         return jsonify({"success": False, "message": "Invalid credentials"}), 401
 
-    # Very simple demo: we don't generate JWT, only return role/username
+    # the password hash is checked only here; staff requests then carry
+    # the signed token as "Authorization: Bearer <token>"
     return jsonify({
         "success": True,
         "username": user["username"],
-        "role": user["role"]
+        "role": user["role"],
+        "token": AUTH.issue(user["username"], user["role"]),
+        "expires_in": AUTH.ttl
     })
 
 
@@ -184,27 +299,39 @@ def login():
 
 @app.get("/api/menu")
 def get_menu():
-    return jsonify({"menu": MENU})
+    """Served from MENU_CACHE (ETag + If-None-Match -> 304). Search/filter params go to MENU_INDEX."""
+    if not any(request.args.get(name) for name in SEARCH_PARAMS):
+        return MENU_CACHE.response(request)
+    try:
+        kwargs = search_args(request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    results = MENU_INDEX.search(**kwargs)
+    return jsonify({"menu": results, "count": len(results)})
 
 
 @app.patch("/api/menu/<int:menu_id>")
+@AUTH.require("ADMIN")
 def update_menu_item(menu_id):
     """Admin updates item price or name."""
     data = request.get_json() or {}
-    item = find_menu_item(menu_id)
-    if not item:
-        return jsonify({"error": "Menu item not found"}), 404
-
-    if "name" in data:
-        item["name"] = data["name"]
-    if "price" in data:
-        try:
-            item["price"] = float(data["price"])
-        except ValueError:
-            return jsonify({"error": "Invalid price"}), 400
-    if "category" in data:
-        item["category"] = data["category"]
-
+    with STORE.transaction():
+        item = STORE.get_menu_item(menu_id, for_update=True)
+        if not item:
+            return jsonify({"error": "Menu item not found"}), 404
+
+        if "name" in data:
+            item["name"] = data["name"]
+        if "price" in data:
+            try:
+                item["price"] = float(data["price"])
+            except ValueError:
+                return jsonify({"error": "Invalid price"}), 400
+        if "category" in data:
+            item["category"] = data["category"]
+
+        STORE.save_menu_item(item)
+        MENU_INDEX.update(item)
     return jsonify(item)
 
 
@@ -214,30 +341,31 @@ def update_menu_item(menu_id):
 
 @app.get("/api/inventory")
 def get_inventory():
-    return jsonify({
-        "inventory": INVENTORY,
-        "low_stock": low_stock_items()
-    })
+    return INVENTORY_CACHE.response(request)
 
 
 @app.patch("/api/inventory/<int:item_id>")
+@AUTH.require("ADMIN")
 def update_inventory(item_id):
     data = request.get_json() or {}
-    item = next((i for i in INVENTORY if i["id"] == item_id), None)
-    if not item:
-        return jsonify({"error": "Inventory item not found"}), 404
-
-    if "qty" in data:
-        try:
-            item["qty"] = float(data["qty"])
-        except ValueError:
-            return jsonify({"error": "Invalid qty"}), 400
-    if "low_stock_threshold" in data:
-        try:
-            item["low_stock_threshold"] = float(data["low_stock_threshold"])
-        except ValueError:
-            return jsonify({"error": "Invalid threshold"}), 400
-
+    with STORE.transaction():
+        item = STORE.get_inventory_item(item_id, for_update=True)
+        if not item:
+            return jsonify({"error": "Inventory item not found"}), 404
+
+        if "qty" in data:
+            try:
+                item["qty"] = float(data["qty"])
+            except ValueError:
+                return jsonify({"error": "Invalid qty"}), 400
+        if "low_stock_threshold" in data:
+            try:
+                item["low_stock_threshold"] = float(data["low_stock_threshold"])
+            except ValueError:
+                return jsonify({"error": "Invalid threshold"}), 400
+
+        STORE.save_inventory_item(item)
+        STOCK.track(item)
     return jsonify(item)
 
 
@@ -247,24 +375,64 @@ def update_inventory(item_id):
 
 @app.post("/api/reservations")
 def create_reservation():
+    """
+    Input: { name, date: "YYYY-MM-DD", time: "HH:MM", size }
+    400 for invalid input, 409 when no table of that size is free for
+    the whole sitting (see reservations.py).
+    """
     data = request.get_json() or {}
+    try:
+        size = int(data.get("size", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Party size must be a positive number"}), 400
 
-    new_res = {
-        "id": len(RESERVATIONS) + 1,
-        "name": data.get("name", "Guest"),
-        "date": data.get("date", ""),
-        "time": data.get("time", ""),
-        "size": data.get("size", 1),
-        "created_at": now_iso()
-    }
-
-    RESERVATIONS.append(new_res)
+    with STORE.transaction():
+        try:
+            table_size = BOOKINGS.book(data.get("date", ""), data.get("time", ""), size)
+        except ReservationError as e:
+            return jsonify({"error": str(e)}), e.status
+
+        new_res = {
+            "id": STORE.next_reservation_id(),
+            "name": data.get("name", "Guest"),
+            "date": data["date"],
+            "time": data["time"],
+            "size": size,
+            "table_size": table_size,
+            "created_at": now_iso()
+        }
+
+        STORE.add_reservation(new_res)
+        BOOKINGS.add(new_res)
     return jsonify(new_res), 201
 
 
 @app.get("/api/reservations")
 def list_reservations():
-    return jsonify({"reservations": RESERVATIONS})
+    """Optional ?date=YYYY-MM-DD returns only that day's bookings."""
+    date = request.args.get("date")
+    if date:
+        return jsonify({"reservations": BOOKINGS.on_date(date)})
+    return jsonify({"reservations": STORE.list_reservations()})
+
+
+@app.get("/api/reservations/availability")
+def reservation_availability():
+    """
+    ?date=YYYY-MM-DD&size=N
+    Output: { date, size, times: ["12:00", "12:30", ...] } = start times
+    with a table for N free for the whole sitting.
+    """
+    date = request.args.get("date", "")
+    try:
+        size = int(request.args.get("size", 2))
+    except ValueError:
+        return jsonify({"error": "Party size must be a positive number"}), 400
+    try:
+        times = BOOKINGS.availability(date, size)
+    except ReservationError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify({"date": date, "size": size, "times": times})
 
 
 # --------------------------------------------------------
@@ -290,9 +458,12 @@ Order structure example:
 """
 
 
-@app.post("/api/orders")
-def create_order():
-    data = request.get_json() or {}
+def build_order(data, lookup=None):
+    """
+    Validate and price one order payload. Nothing is stored yet and the
+    id is still None. `lookup` resolves menu ids (default: find_menu_item).
+    """
+    lookup = lookup or find_menu_item
 
     customer_name = data.get("customer_name", "Guest")
     order_type = data.get("type", "WALK_IN")  # WALK_IN, DINE_IN, DELIVERY
@@ -308,7 +479,10 @@ def create_order():
             # if front-end sends full item
             menu_id = it.get("id") or it.get("menu_id")
             qty = it.get("qty", 1)
-            menu_item = find_menu_item(menu_id) if menu_id else None
+            # anything but a number (a list, an object, ...) matches no
+            # menu item, and can't be looked up in the id index
+            is_id = isinstance(menu_id, (int, float)) and menu_id
+            menu_item = lookup(menu_id) if is_id else None
             if menu_item:
                 price = float(menu_item["price"])
                 items.append({
@@ -320,7 +494,7 @@ def create_order():
                 total += price * qty
         elif isinstance(it, int):
             # if front-end sends only id
-            menu_item = find_menu_item(it)
+            menu_item = lookup(it)
             if menu_item:
                 price = float(menu_item["price"])
                 items.append({
@@ -331,8 +505,9 @@ def create_order():
                 })
                 total += price
 
-    order = {
-        "id": len(ORDERS) + 1,
+    now = now_us()
+    order = ORDER_MODEL.from_dict({
+        "id": None,  # assigned under the store lock below
         "customer_name": customer_name,
         "type": order_type,
         "table_number": table_number,
@@ -340,47 +515,188 @@ def create_order():
         "items": items,
         "total": total,
         "status": "RECEIVED",
-        "created_at": now_iso(),
-        "updated_at": now_iso(),
+        "created_at": now,
+        "updated_at": now,
         "logs": []
-    }
+    })
     add_log(order, "Order created")
+    return order
+
+
+def commit_order(order):
+    """Give a built order its id and store it (call inside STORE.transaction())."""
+    order["id"] = STORE.next_order_id()
+    STORE.add_order(order)
+    index_new_order(order)
+
+
+def index_new_order(order):
+    """Totals, rollups, recommendations, kitchen queue and event for a stored new order."""
+    SALES.record_order(order)
+    ROLLUPS.record_order(order)
+    RECS.record_order(order)
+    KITCHEN.sync(order)
+    ORDER_EVENTS.publish("order.created", {"order": order})
 
-    # adjust inventory
-    recalc_inventory_for_order(order)
 
-    ORDERS.append(order)
+def index_status_change(order, old_status):
+    """Cached JSON, totals, rollups, kitchen queue and event for a saved status change."""
+    ORDER_JSON.invalidate(order["id"])
+    SALES.status_changed(order, old_status)
+    ROLLUPS.status_changed(order, old_status)
+    KITCHEN.sync(order)
+    ORDER_EVENTS.publish("order.updated", {"order": order})
+
+
+@app.post("/api/orders")
+def create_order():
+    data = request.get_json() or {}
+    order = build_order(data)
+
+    # id allocation, inventory, indexes, totals and event as one step
+    with STORE.transaction():
+        recalc_inventory_for_order(order)
+        commit_order(order)
     return jsonify(order), 201
 
 
+@app.post("/api/orders/batch")
+def create_orders_batch():
+    """
+    Bulk ingestion for delivery partners.
+    Input: JSON array of orders (same shape as POST /api/orders),
+           {"orders": [...]}, or NDJSON (application/x-ndjson)
+    Output: { "results": [ {index, status: 201, order} | {index, status: 400, error} ],
+              "created": n, "failed": m }
+    Menu lookups use one index built per batch and inventory is deducted
+    once for all accepted orders.
+    """
+    payloads, error = read_batch(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    menu_index = {m["id"]: m for m in STORE.list_menu()}
+    results = []
+    accepted = []
+    for i, data in enumerate(payloads):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError
+            order = build_order(data, menu_index.get)
+        except (TypeError, ValueError):
+            results.append({"index": i, "status": 400, "error": "Invalid order"})
+            continue
+        accepted.append(order)
+        results.append({"index": i, "status": 201, "order": order})
+
+    with STORE.transaction():
+        STOCK.deduct(STORE, [it for o in accepted for it in o["items"]])
+        for order in accepted:
+            commit_order(order)
+
+    return jsonify({
+        "results": results,
+        "created": len(accepted),
+        "failed": len(results) - len(accepted)
+    })
+
+
 @app.get("/api/orders")
 def list_orders():
     """
     Optional query filter:
     - status: RECEIVED, PREPARING, READY, OUT_FOR_DELIVERY, COMPLETED
     - type: WALK_IN, DINE_IN, DELIVERY
+    Paging / incremental sync:
+    - limit + after_id: cursor pagination (response has next_after_id)
+    - since: only orders with updated_at >= since (response has next_since)
+    - fields: comma separated keys to return, e.g. id,status,total
     """
     status = request.args.get("status")
     otype = request.args.get("type")
+    limit = request.args.get("limit", type=int)
+    after_id = request.args.get("after_id", type=int)
+    since = request.args.get("since")
+    fields = [f for f in request.args.get("fields", "").split(",") if f]
+
+    result = STORE.find_orders(
+        status=status,
+        order_type=otype,
+        after_id=after_id,
+        limit=limit,
+        since=since
+    )
+
+    extra = {}
+    if limit:
+        # cursor for the next page (None = this was the last one)
+        extra["next_after_id"] = result[-1]["id"] if len(result) == limit else None
+    if since:
+        extra["next_since"] = STORE.last_order_change()
+    if fields:
+        return jsonify({"orders": [project(o, fields) for o in result], **extra})
+    # full orders: joined from per-order cached JSON
+    return list_response(app.response_class, "orders", ORDER_JSON.encode_list(result), extra)
+
+
+@app.get("/api/orders/archive")
+def list_archived_orders():
+    """
+    Finished orders that were moved to STORE.archive (SRMS_ARCHIVE_AFTER),
+    oldest id first. Optional query:
+    - from / to: created_at range (UTC timestamps or dates, to is exclusive)
+    - type, status
+    - limit (default 100) + after_id: cursor pagination (next_after_id)
+    """
+    limit = request.args.get("limit", 100, type=int)
+    try:
+        start = request.args.get("from")
+        start = parse_utc_z(start) if start else None
+        end = request.args.get("to")
+        end = parse_utc_z(end) if end else None
+    except ValueError:
+        return jsonify({"error": "from / to must be ISO 8601 timestamps"}), 400
+
+    result = STORE.archive.find(
+        start, end,
+        order_type=request.args.get("type"),
+        status=request.args.get("status"),
+        after_id=request.args.get("after_id", type=int),
+        limit=limit
+    )
+    return jsonify({
+        "orders": result,
+        "next_after_id": result[-1]["id"] if limit and len(result) == limit else None
+    })
 
-    result = ORDERS
-    if status:
-        result = [o for o in result if o["status"] == status]
-    if otype:
-        result = [o for o in result if o["type"] == otype]
 
-    return jsonify({"orders": result})
+@app.get("/api/orders/stream")
+def order_stream():
+    """
+    Server-Sent Events with order deltas (order.created / order.updated).
+    Resume with the Last-Event-ID header (browsers send it on reconnect)
+    or ?last_event_id=N. A "reset" event means: reload /api/orders.
+    """
+    last_id = parse_last_event_id(
+        request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    )
+    return Response(
+        stream_with_context(ORDER_EVENTS.stream(last_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/api/orders/<int:order_id>")
 def get_order(order_id):
-    order = next((o for o in ORDERS if o["id"] == order_id), None)
+    order = STORE.get_order(order_id)
     if not order:
         return jsonify({"error": "Order not found"}), 404
     return jsonify(order)
 
 
 @app.patch("/api/orders/<int:order_id>/status")
+@AUTH.require("ADMIN", "WAITER", "CHEF")
 def update_order_status(order_id):
     data = request.get_json() or {}
     new_status = data.get("status")
@@ -393,13 +709,19 @@ def update_order_status(order_id):
     if new_status not in valid_statuses:
         return jsonify({"error": "Invalid status"}), 400
 
-    order = next((o for o in ORDERS if o["id"] == order_id), None)
-    if not order:
-        return jsonify({"error": "Order not found"}), 404
-
-    order["status"] = new_status
-    order["updated_at"] = now_iso()
-    add_log(order, f"Status changed to {new_status}")
+    with STORE.transaction():
+        order = STORE.get_order(order_id, for_update=True)
+        if not order:
+            if order_id in STORE.archive:
+                return jsonify({"error": "Order is archived and can no longer change"}), 409
+            return jsonify({"error": "Order not found"}), 404
+
+        old_status = order["status"]
+        order["status"] = new_status
+        order["updated_at"] = now_us()
+        add_log(order, f"Status changed to {new_status}")
+        STORE.save_order(order, old_status)
+        index_status_change(order, old_status)
     return jsonify(order)
 
 
@@ -412,11 +734,35 @@ def kitchen_queue():
     """
     For Chef tablet:
     - show all orders NOT completed/cancelled
-    - sorted by created_at
+    - in KITCHEN policy order (fifo = by created_at)
+    Optional query:
+    - station: grill, drinks, dessert (only orders with work there)
+    - limit: first N orders
+    Each order carries estimated_wait_minutes; depth has the number of
+    orders still to cook, in total and per station.
     """
-    active = [o for o in ORDERS if o["status"] not in ("COMPLETED", "CANCELLED")]
-    active_sorted = sorted(active, key=lambda o: o["created_at"])
-    return jsonify({"orders": active_sorted})
+    station = request.args.get("station")
+    limit = request.args.get("limit", type=int)
+    queue = KITCHEN.queue(station, limit)
+    return jsonify({
+        "orders": [dict(o, estimated_wait_minutes=wait) for o, wait in queue],
+        "depth": KITCHEN.depth(),
+        "policy": KITCHEN.policy
+    })
+
+
+@app.get("/api/kitchen/queue/<int:order_id>")
+def kitchen_eta(order_id):
+    """Queue position and estimated wait of one order (for tracking)."""
+    position, wait = KITCHEN.estimate(order_id)
+    if position is None:
+        return jsonify({"error": "Order not in kitchen queue"}), 404
+    return jsonify({
+        "order_id": order_id,
+        "position": position,
+        "estimated_wait_minutes": wait,
+        "depth": KITCHEN.depth()["total"]
+    })
 
 
 # --------------------------------------------------------
@@ -430,7 +776,9 @@ def recommendations():
     Output: { "recommendations": [ ...menu items... ] }
     """
     data = request.get_json() or {}
-    ids = data.get("item_ids", [])
+    ids = data.get("item_ids", []) if isinstance(data, dict) else None
+    if not isinstance(ids, list):
+        return jsonify({"error": "item_ids must be a list of menu ids"}), 400
     recs = simple_recommendations(ids)
     return jsonify({"recommendations": recs})
 
@@ -441,30 +789,179 @@ def recommendations():
 
 @app.get("/api/analytics")
 def analytics():
-    total_orders = len(ORDERS)
-    total_revenue = sum(o.get("total", 0) for o in ORDERS)
-
-    # Count items sold
-    counts = {}
-    for o in ORDERS:
-        for it in o.get("items", []):
-            name = it.get("name", "Unknown")
-            counts[name] = counts.get(name, 0) + it.get("qty", 1)
-
-    top_items = sorted(
-        [{"name": k, "count": v} for k, v in counts.items()],
-        key=lambda x: x["count"],
-        reverse=True
-    )
+    """
+    Totals come from SALES, which create_order / update_order_status
+    keep up to date. Optional: ?top=10
+    """
+    top = request.args.get("top", 10, type=int)
+    summary = SALES.summary(top)
+    summary["low_stock"] = low_stock_items()
+    return jsonify(summary)
+
 
+@app.get("/api/analytics/archive")
+def archive_analytics():
+    """
+    Totals over the archived orders only, reduced column by column
+    (see archive.py). Optional: ?from=&to= (created_at), ?type=, ?top=10
+    """
+    top = request.args.get("top", 10, type=int)
+    try:
+        start = request.args.get("from")
+        start = parse_utc_z(start) if start else None
+        end = request.args.get("to")
+        end = parse_utc_z(end) if end else None
+    except ValueError:
+        return jsonify({"error": "from / to must be ISO 8601 timestamps"}), 400
+
+    summary = STORE.archive.summary(start, end, request.args.get("type"))
+    counts = sorted(summary.pop("counts").items(), key=lambda kv: (-kv[1], str(kv[0])))
+    summary["total_revenue"] = round(summary["total_revenue"], 2)
+    summary["top_items"] = [{"name": name, "count": count} for name, count in counts[:top]]
+    return jsonify(summary)
+
+
+@app.get("/api/analytics/timeseries")
+def analytics_timeseries():
+    """
+    Orders, revenue and items per time bucket, answered from ROLLUPS.
+    Query:
+    - granularity: minute, hour (default), day or week
+    - from / to: UTC timestamps or dates, to is exclusive
+      (default: now and a span that suits the granularity)
+    - group_by: type or item (one point per bucket and group)
+    """
+    granularity = request.args.get("granularity", "hour")
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "granularity must be one of " + ", ".join(GRANULARITIES)}), 400
+    group_by = request.args.get("group_by")
+    if group_by not in (None, "type", "item"):
+        return jsonify({"error": "group_by must be type or item"}), 400
+
+    try:
+        end = request.args.get("to")
+        end = parse_utc_z(end) // 1000000 if end else now_us() // 1000000 + 1
+        start = request.args.get("from")
+        start = parse_utc_z(start) // 1000000 if start else end - DEFAULT_SPAN[granularity]
+    except ValueError:
+        return jsonify({"error": "from / to must be ISO 8601 timestamps"}), 400
+
+    points = []
+    for at, group, orders, revenue, items in ROLLUPS.timeseries(start, end, granularity, group_by):
+        point = {"start": format_utc_z(at * 1000000), "orders": orders, "revenue": revenue, "items": items}
+        if group_by:
+            point[group_by] = group
+        points.append(point)
     return jsonify({
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-        "top_items": top_items,
-        "low_stock": low_stock_items()
+        "granularity": granularity,
+        "from": format_utc_z(start * 1000000),
+        "to": format_utc_z(end * 1000000),
+        "points": points
     })
 
 
+# --------------------------------------------------------
+# BRANCHES (cross-branch reads)
+# --------------------------------------------------------
+@app.get("/api/branches")
+def list_branches():
+    return jsonify({"branches": BRANCHES.branch_ids, "default": BRANCHES.default})
+
+
+@app.get("/api/branches/analytics")
+def branches_analytics():
+    """
+    /api/analytics of every branch, gathered in parallel, plus the totals
+    over all of them (kitchen depth and low stock per branch too).
+    Optional: ?top=10
+    """
+    top = request.args.get("top", 10, type=int)
+
+    def branch_summary(shard):
+        summary = shard.sales.summary(top)
+        summary["counts"] = dict(shard.sales.counts)
+        summary["active_orders"] = shard.store.count_orders(statuses=ACTIVE_STATUSES)
+        summary["kitchen_depth"] = shard.kitchen.depth()["total"]
+        summary["low_stock"] = [item["name"] for item in shard.stock.low_stock(shard.store)]
+        return summary
+
+    per_branch = BRANCHES.scatter(branch_summary)
+    total = merge_summaries(per_branch.values(), top)
+    total["active_orders"] = sum(summary["active_orders"] for summary in per_branch.values())
+    total["kitchen_depth"] = sum(summary["kitchen_depth"] for summary in per_branch.values())
+    for summary in per_branch.values():
+        del summary["counts"]
+    return jsonify({"branches": per_branch, "total": total})
+
+
+# --------------------------------------------------------
+# OTHER WORKER PROCESSES (SRMS_STORAGE=shared)
+# --------------------------------------------------------
+# STORE is then a replica (see shared_store.py); writes made by the
+# other workers arrive here once they are stored and go through the same
+# indexing as local ones. Event ids stay per process: a stream resumed on
+# another worker starts with a "reset".
+def apply_peer_change(table, action, row, old_status=None):
+    if table == "orders":
+        if action == "add":
+            index_new_order(row)
+        elif action == "save":
+            index_status_change(row, old_status)
+        elif action == "remove":
+            ORDER_JSON.invalidate(*row)
+    elif table == "inventory":
+        STOCK.track(row)
+    elif table == "menu":
+        MENU_INDEX.update(row)
+    elif table == "reservations":
+        BOOKINGS.add(row)
+
+
+for branch_id, shard in BRANCHES.items():
+    if hasattr(shard.store, "subscribe"):
+        shard.store.subscribe(BRANCHES.bind(branch_id, apply_peer_change))
+
+
+# --------------------------------------------------------
+# METRICS (/api/metrics, Prometheus text format)
+# --------------------------------------------------------
+# per-route latency histograms, status counts and handler / jsonify
+# time (see metrics.py); SRMS_METRICS=0 leaves the app uninstrumented
+METRICS = RequestMetrics()
+METRICS.gauge("orders", "Orders in the live store, by status.",
+              lambda: {s: STORE.count_orders(status=s) for s in ACTIVE_STATUSES + ARCHIVE_STATUSES},
+              label="status")
+METRICS.gauge("orders_active", "Live orders not yet completed or cancelled.",
+              lambda: STORE.count_orders(statuses=ACTIVE_STATUSES))
+METRICS.gauge("orders_archived", "Orders moved to the archive.", lambda: len(STORE.archive))
+METRICS.gauge("reservations", "Stored reservations.", lambda: len(STORE.list_reservations()))
+METRICS.gauge("order_json_cache_entries", "Encoded orders kept for list responses.", lambda: len(ORDER_JSON))
+METRICS.gauge("order_events_last_id", "Id of the last published order event.", lambda: ORDER_EVENTS.last_id)
+METRICS.gauge("rollup_buckets", "Time buckets held by the sales rollups, per tier.",
+              ROLLUPS.bucket_count, label="tier")
+METRICS.gauge("kitchen_orders", "Orders in the kitchen queue.", lambda: KITCHEN.depth()["total"])
+METRICS.gauge("kitchen_station_orders", "Orders still cooking, per station.",
+              lambda: KITCHEN.depth()["stations"], label="station")
+if os.environ.get("SRMS_METRICS", "1") != "0":
+    METRICS.instrument(app)
+
+
+# --------------------------------------------------------
+# ADMISSION CONTROL (429 + Retry-After under overload)
+# --------------------------------------------------------
+# per-client, per-route and server token buckets with priority classes,
+# so order creation and status changes get through while dashboards
+# polling analytics are shed (see admission.py); off unless SRMS_ADMISSION=1.
+# Hooked in after METRICS so that shed requests show up there as 429s.
+ADMISSION = admission_from_env().init_app(app)
+METRICS.gauge("admission_admitted", "Requests let through by admission control, by priority class.",
+              lambda: dict(ADMISSION.admitted), label="class")
+METRICS.gauge("admission_shed", "Requests answered 429 by admission control, by priority class.",
+              lambda: ADMISSION.shed_by(0), label="class")
+METRICS.gauge("admission_shed_reason", "Requests answered 429, by the bucket that was empty.",
+              lambda: ADMISSION.shed_by(1), label="reason")
+
+
 # --------------------------------------------------------
 # MAIN
 # --------------------------------------------------------
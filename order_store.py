@@ -0,0 +1,216 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from heapq import merge
+from itertools import islice
+
+# --------------------------------------------------------
+# INDEXED ORDER STORE
+# --------------------------------------------------------
+# Orders still live in a plain list (append-only, id order), but every
+# lookup goes through hash indexes instead of scanning that list:
+#   - by_id:     id -> order
+#   - by_status: status -> sorted list of ids
+#   - by_type:   order type -> sorted list of ids
+#   - touched:   ids ordered by last change (for ?since= sync)
+# The secondary indexes keep ids sorted so filtered listings come back
+# in the same order as the underlying list, and a page starting after
+# a given id is found with a bisect instead of a scan.
+
+
+class OrderStore:
+
+    def __init__(self, type_key="type"):
+        # newstyle.py uses "order_type", oldstyle.py uses "type"
+        self.type_key = type_key
+        self.orders = []
+        self.ids = []          # same order as self.orders
+        self.by_id = {}
+        self.by_status = {}
+        self.by_type = {}
+        self.touched = OrderedDict()
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __iter__(self):
+        return iter(self.orders)
+
+    # ---------------- internal helpers ----------------
+
+    @staticmethod
+    def _index_add(index, key, order_id):
+        insort(index.setdefault(key, []), order_id)
+
+    @staticmethod
+    def _index_remove(index, key, order_id):
+        ids = index.get(key)
+        if not ids:
+            return
+        pos = bisect_left(ids, order_id)
+        if pos < len(ids) and ids[pos] == order_id:
+            del ids[pos]
+        if not ids:
+            del index[key]
+
+    @staticmethod
+    def _after(ids, after_id):
+        """Iterator over a sorted id list, starting after after_id."""
+        start = bisect_right(ids, after_id) if after_id else 0
+        return islice(ids, start, None)
+
+    # ---------------- writes ----------------
+
+    def add(self, order):
+        """Register a freshly created order in the list and all indexes."""
+        oid = order["id"]
+        self.orders.append(order)
+        self.ids.append(oid)
+        self.by_id[oid] = order
+        self._index_add(self.by_status, order.get("status"), oid)
+        self._index_add(self.by_type, order.get(self.type_key), oid)
+        self.touched[oid] = order
+        return order
+
+    def save(self, order, old_status):
+        """
+        Call after an order was changed (status, updated_at, log) so the
+        indexes follow it. `order` may be a new copy of the stored dict;
+        it replaces the old one everywhere.
+        """
+        oid = order["id"]
+        pos = bisect_left(self.ids, oid)
+        self.orders[pos] = order
+        self.by_id[oid] = order
+        self.touched[oid] = order
+        self.touched.move_to_end(oid)
+        new_status = order.get("status")
+        if new_status != old_status:
+            self._index_remove(self.by_status, old_status, oid)
+            self._index_add(self.by_status, new_status, oid)
+        return order
+
+    def remove(self, order_ids):
+        """Drop orders (e.g. moved to the archive) from the list and all indexes."""
+        gone = set()
+        statuses, types = set(), set()
+        for oid in order_ids:
+            o = self.by_id.pop(oid, None)
+            if o is None:
+                continue
+            gone.add(oid)
+            statuses.add(o.get("status"))
+            types.add(o.get(self.type_key))
+            self.touched.pop(oid, None)
+        if not gone:
+            return 0
+        # one filtering pass per touched list (not a bisect + del per id),
+        # into new lists so a reader walking the old ones is not disturbed
+        for index, keys in ((self.by_status, statuses), (self.by_type, types)):
+            for key in keys:
+                ids = [oid for oid in index.get(key, ()) if oid not in gone]
+                if ids:
+                    index[key] = ids
+                else:
+                    index.pop(key, None)
+        keep = [i for i, oid in enumerate(self.ids) if oid not in gone]
+        self.orders = [self.orders[i] for i in keep]
+        self.ids = [self.ids[i] for i in keep]
+        return len(gone)
+
+    def load(self, orders):
+        """Replace the whole content (e.g. after a restore) and rebuild indexes."""
+        self.orders.clear()
+        self.ids.clear()
+        self.by_id.clear()
+        self.by_status.clear()
+        self.by_type.clear()
+        self.touched.clear()
+        for o in sorted(orders, key=lambda x: x["id"]):
+            self.add(o)
+        # replay the change order so ?since= keeps working after a restore
+        for o in sorted(self.orders, key=lambda x: x.get("updated_at") or ""):
+            self.touched.move_to_end(o["id"])
+
+    # ---------------- reads ----------------
+
+    def get(self, order_id):
+        return self.by_id.get(order_id)
+
+    def find(self, status=None, order_type=None, statuses=None,
+             after_id=None, limit=None, since=None):
+        """
+        Filtered orders in id order.
+        Walks the smallest matching index from after_id and stops after
+        `limit` hits, so a page costs O(page size), not O(all orders).
+        With `since`, only orders changed at/after that updated_at.
+        """
+        type_key = self.type_key
+        sources = []
+        if since:
+            ids = [o["id"] for o in self.changed_since(since)]
+            sources.append((len(ids), self._after(ids, after_id)))
+        if status:
+            ids = self.by_status.get(status, [])
+            sources.append((len(ids), self._after(ids, after_id)))
+        if order_type:
+            ids = self.by_type.get(order_type, [])
+            sources.append((len(ids), self._after(ids, after_id)))
+        if statuses:
+            lists = [self.by_status.get(s, []) for s in statuses]
+            sources.append((
+                sum(len(ids) for ids in lists),
+                merge(*(self._after(ids, after_id) for ids in lists))
+            ))
+        if not sources:
+            sources.append((len(self.ids), self._after(self.ids, after_id)))
+
+        # drive the walk from the most selective index, check the rest per order
+        _, driver = min(sources, key=lambda s: s[0])
+        by_id = self.by_id
+        result = []
+        for oid in driver:
+            o = by_id[oid]
+            if status and o.get("status") != status:
+                continue
+            if order_type and o.get(type_key) != order_type:
+                continue
+            if statuses and o.get("status") not in statuses:
+                continue
+            result.append(o)
+            if limit and len(result) >= limit:
+                break
+        return result
+
+    def changed_since(self, since):
+        """
+        Orders whose updated_at is >= since, in id order.
+        Walks `touched` from the newest change backwards, so the cost is
+        the number of changed orders only.
+        """
+        changed = []
+        by_id = self.by_id
+        for oid in reversed(self.touched):
+            o = by_id[oid]
+            if (o.get("updated_at") or "") < since:
+                break
+            changed.append(o)
+        changed.sort(key=lambda o: o["id"])
+        return changed
+
+    def last_change(self):
+        if not self.touched:
+            return None
+        oid = next(reversed(self.touched))
+        return self.by_id[oid].get("updated_at")
+
+    def count(self, status=None, statuses=None):
+        if status:
+            return len(self.by_status.get(status, []))
+        if statuses:
+            return sum(len(self.by_status.get(s, [])) for s in statuses)
+        return len(self.orders)
+
+
+def project(order, fields):
+    """Keep only the requested keys of an order (?fields=id,status,...)."""
+    return {k: order[k] for k in fields if k in order}
@@ -0,0 +1,212 @@
+import glob
+import json
+import os
+import threading
+
+from models import json_default
+
+# --------------------------------------------------------
+# WRITE-AHEAD JOURNAL + SNAPSHOTS
+# --------------------------------------------------------
+# The API keeps serving from the in-memory lists; this only makes them
+# survive a restart.
+#
+#   record(table, row)  -> appends {"s": seq, "t": table, "r": row} to the
+#                          current log segment (one JSON line per change)
+#   flusher thread      -> writes everything pending in one go and fsyncs
+#                          once for the whole batch (group commit)
+#   snapshot            -> every `snapshot_every` records the full tables
+#                          are dumped to snapshot.json and older log
+#                          segments are deleted
+#   recover()           -> snapshot + replay of the log tail
+#
+# Rows are always written whole, so replay is a plain upsert by id and
+# applying the same record twice is harmless.
+#
+# Files in data_dir:
+#   snapshot.json           {"seq": N, "tables": {"orders": [...], ...}}
+#   wal-<first seq>.log     log segments, replayed in seq order
+
+
+class Journal:
+
+    def __init__(self, data_dir, tables_fn=None, snapshot_every=100000, sync=True):
+        """
+        tables_fn: callable returning {"table name": list of rows},
+                   used when taking a snapshot.
+        sync:      if True, record() returns only once the change is on disk.
+        """
+        self.data_dir = data_dir
+        self.tables_fn = tables_fn
+        self.snapshot_every = snapshot_every
+        self.sync = sync
+
+        self.seq = 0             # last assigned sequence number
+        self.durable_seq = 0     # last sequence number known to be fsync'ed
+        self._pending = []
+        self._since_snapshot = 0
+        self._snapshot_running = False
+        self._file = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flusher = None
+        os.makedirs(data_dir, exist_ok=True)
+
+    # ---------------- paths ----------------
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.data_dir, "snapshot.json")
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.data_dir, f"wal-{first_seq:012d}.log")
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.data_dir, "wal-*.log")))
+
+    # ---------------- recovery ----------------
+
+    def recover(self):
+        """
+        Load the latest snapshot and replay the log tail.
+        Returns {"table": {id: row}} and opens a fresh segment for writing.
+        """
+        tables = {}
+        snap_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            snap_seq = snap.get("seq", 0)
+            for name, rows in snap.get("tables", {}).items():
+                tables[name] = {r["id"]: r for r in rows}
+
+        last = snap_seq
+        for path in self._segments():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break   # torn write at the end of the last segment
+                    if rec["s"] <= snap_seq:
+                        continue
+                    tables.setdefault(rec["t"], {})[rec["r"]["id"]] = rec["r"]
+                    last = max(last, rec["s"])
+
+        self.seq = self.durable_seq = last
+        self._since_snapshot = last - snap_seq
+        self._open_segment()
+        return tables
+
+    # ---------------- writing ----------------
+
+    def start(self):
+        if self._file is None:
+            self._open_segment()
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+        self._flusher.start()
+        return self
+
+    def _open_segment(self):
+        if self._file:
+            self._file.close()
+        self._file = open(self._segment_path(self.seq + 1), "a", encoding="utf-8")
+
+    def append(self, table, row):
+        """Queue one changed row without waiting for the disk. Returns its seq."""
+        line = json.dumps(row, separators=(",", ":"), default=json_default)
+        with self._cond:
+            self.seq += 1
+            seq = self.seq
+            self._pending.append(f'{{"s":{seq},"t":"{table}","r":{line}}}')
+            self._cond.notify_all()
+        return seq
+
+    def record(self, table, row):
+        """Append one changed row (and wait for fsync if sync). Returns its seq."""
+        seq = self.append(table, row)
+        if self.sync:
+            self.wait_durable(seq)
+        return seq
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                upto = self.seq
+                f = self._file
+
+            # one write + one fsync for everything that queued up meanwhile
+            f.write("\n".join(batch) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+            with self._cond:
+                self.durable_seq = upto
+                self._since_snapshot += len(batch)
+                want_snapshot = (self.tables_fn is not None
+                                 and self._since_snapshot >= self.snapshot_every
+                                 and not self._snapshot_running)
+                if want_snapshot:
+                    self._snapshot_running = True
+                self._cond.notify_all()
+
+            if want_snapshot:
+                threading.Thread(target=self.snapshot, name="journal-snapshot", daemon=True).start()
+
+    def wait_durable(self, seq, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: self.durable_seq >= seq or self._closed, timeout)
+
+    # ---------------- snapshots ----------------
+
+    def snapshot(self):
+        """
+        Dump all tables, then drop the log segments it covers. Writers must
+        apply a row to the tables before they append() it, so that every
+        seq up to `upto` is already in what tables_fn() returns.
+        """
+        try:
+            with self._cond:
+                # wait until no batch is in flight, so everything up to
+                # `upto` is in the segment we close here
+                self._cond.wait_for(lambda: self.durable_seq >= self.seq or self._closed)
+                upto = self.seq
+                self._open_segment()
+                self._since_snapshot = 0
+                old_segments = [p for p in self._segments() if p != self._file.name]
+                tables = {name: list(rows) for name, rows in self.tables_fn().items()}
+
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"seq": upto, "tables": tables}, f, separators=(",", ":"), default=json_default)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+
+            for path in old_segments:
+                os.remove(path)
+        finally:
+            with self._cond:
+                self._snapshot_running = False
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._flusher:
+            self._flusher.join()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def open_journal(data_dir, tables_fn, **kwargs):
+    """Journal for data_dir, or None when persistence is switched off."""
+    if not data_dir:
+        return None
+    return Journal(data_dir, tables_fn=tables_fn, **kwargs)
@@ -0,0 +1,115 @@
+import heapq
+import threading
+
+# --------------------------------------------------------
+# CO-OCCURRENCE RECOMMENDER ("customers also ordered")
+# --------------------------------------------------------
+# Every stored order adds 1 to the pair weight of each two different
+# menu items in it. Rows are sparse ({other item: weight}) and hold at
+# most `neighbours` entries: when a full row sees a new item, the
+# weakest entry is replaced and the newcomer inherits its weight
+# (space-saving), so memory stays O(items * neighbours) however many
+# orders come in, and a rising item can still take a place.
+#
+# Decay: every `decay_every` orders all counts so far are multiplied by
+# `decay`. Instead of touching every entry, new counts are added with a
+# growing unit; all weights are rescaled only when that unit gets large.
+# Scaling everything by the same factor never changes the ranking, so
+# the precomputed top-k of a row stays valid across a decay.
+#
+# A cart query sums the top-k rows of the items in the cart, i.e. it
+# costs O(cart size * k), independent of the menu size.
+
+
+class CoOccurrenceRecommender:
+
+    def __init__(self, k=10, neighbours=32, decay=0.9, decay_every=1000):
+        self.k = k
+        self.neighbours = neighbours
+        self.decay = decay
+        self.decay_every = decay_every
+        self.rows = {}        # item -> {other item: weight}
+        self.top = {}         # item -> ((other item, weight), ...) best k, best first
+        self._dirty = set()   # rows whose top-k must be recomputed
+        self.unit = 1.0       # weight of one co-occurrence right now
+        self.orders_seen = 0
+        self._lock = threading.Lock()
+
+    # ---------------- updates ----------------
+
+    def _bump(self, a, b):
+        row = self.rows.get(a)
+        if row is None:
+            row = self.rows[a] = {}
+        if b in row:
+            row[b] += self.unit
+        elif len(row) < self.neighbours:
+            row[b] = self.unit
+        else:
+            weakest = min(row, key=row.get)
+            row[b] = row.pop(weakest) + self.unit
+        self._dirty.add(a)
+
+    def record(self, item_ids):
+        """Count one order (its distinct menu ids)."""
+        items = sorted(set(i for i in item_ids if i is not None))
+        with self._lock:
+            for a in items:
+                for b in items:
+                    if a != b:
+                        self._bump(a, b)
+            self.orders_seen += 1
+            if self.orders_seen % self.decay_every == 0:
+                self._decay()
+
+    def record_order(self, order):
+        self.record(it.get("menu_id") for it in order.get("items", []))
+
+    def _decay(self):
+        self.unit /= self.decay
+        if self.unit > 1e12:
+            # bring stored weights back to a sane range
+            scale = self.unit
+            for row in self.rows.values():
+                for b in row:
+                    row[b] /= scale
+            self.top = {a: tuple((b, w / scale) for b, w in top) for a, top in self.top.items()}
+            self.unit = 1.0
+
+    def rebuild(self, orders, archived=()):
+        """archived: menu id lists of archived orders (older, so counted first)."""
+        with self._lock:
+            self.rows = {}
+            self.top = {}
+            self._dirty = set()
+            self.unit = 1.0
+            self.orders_seen = 0
+        for item_ids in archived:
+            self.record(item_ids)
+        for o in orders:
+            self.record_order(o)
+
+    # ---------------- reads ----------------
+
+    def _top(self, item):
+        if item in self._dirty:
+            row = self.rows.get(item, {})
+            self.top[item] = tuple(heapq.nlargest(self.k, row.items(), key=lambda e: (e[1], -e[0])))
+            self._dirty.discard(item)
+        return self.top.get(item, ())
+
+    def neighbours_of(self, item):
+        with self._lock:
+            return [(b, w / self.unit) for b, w in self._top(item)]
+
+    def recommend(self, cart, n=3):
+        """Up to n menu ids most often ordered together with the cart (non-numeric ids are ignored)."""
+        cart = {i for i in cart if isinstance(i, (int, float))}
+        scores = {}
+        with self._lock:
+            for a in cart:
+                for b, w in self._top(a):
+                    if b not in cart:
+                        scores[b] = scores.get(b, 0.0) + w
+        best = heapq.nlargest(n, scores.items(), key=lambda e: (e[1], -e[0]))
+        return [b for b, _ in best]
@@ -0,0 +1,165 @@
+from datetime import date as Date
+
+# --------------------------------------------------------
+# RESERVATION BOOK (slot index + table capacity)
+# --------------------------------------------------------
+# The day is cut into SLOT_MINUTES slots between OPEN_TIME and CLOSE_TIME.
+# A booking holds one table for SEAT_MINUTES, i.e. a run of slots, and
+# every day keeps a count of tables in use per slot and table size.
+# A party gets the smallest table size that is free over its whole run
+# (counts per slot are enough: if no slot is over the number of tables,
+# the bookings can always be seated on actual tables).
+#
+# Days are found by date string, so availability and overbooking checks
+# only look at one day's slots, however many reservations exist.
+
+# table size (seats) -> number of tables
+TABLES = {2: 6, 4: 8, 6: 4, 8: 2}
+
+OPEN_TIME = "12:00"
+CLOSE_TIME = "23:30"
+SLOT_MINUTES = 30
+SEAT_MINUTES = 90
+
+
+class ReservationError(ValueError):
+    """Booking refused; status is the HTTP code to answer with."""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_minutes(value):
+    """'HH:MM' -> minutes after midnight."""
+    hours, _, minutes = str(value).partition(":")
+    hours, minutes = int(hours), int(minutes[:2])
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(value)
+    return hours * 60 + minutes
+
+
+def format_minutes(value):
+    return "%02d:%02d" % divmod(value, 60)
+
+
+class DayBook:
+
+    def __init__(self, n_slots, sizes):
+        self.used = [dict.fromkeys(sizes, 0) for _ in range(n_slots)]
+        self.reservations = []
+
+
+class ReservationBook:
+
+    def __init__(self, tables=None, open_time=OPEN_TIME, close_time=CLOSE_TIME,
+                 slot_minutes=SLOT_MINUTES, seat_minutes=SEAT_MINUTES):
+        self.tables = dict(tables or TABLES)
+        self.sizes = sorted(self.tables)
+        self.open = parse_minutes(open_time)
+        self.close = parse_minutes(close_time)
+        self.slot = slot_minutes
+        self.span = -(-seat_minutes // slot_minutes)    # slots per booking
+        self.n_slots = (self.close - self.open) // slot_minutes
+        self.days = {}      # "YYYY-MM-DD" -> DayBook
+
+    # ---------------- helpers ----------------
+
+    def _first_slot(self, date, time):
+        """Validates date/time and returns the first slot of the booking."""
+        try:
+            Date.fromisoformat(date)
+            start = parse_minutes(time)
+        except (TypeError, ValueError):
+            raise ReservationError("Invalid date or time (use YYYY-MM-DD and HH:MM)", 400)
+        first, offset = divmod(start - self.open, self.slot)
+        if start < self.open or first + self.span > self.n_slots:
+            raise ReservationError(
+                f"Bookings start between {format_minutes(self.open)} and "
+                f"{format_minutes(self.close - self.span * self.slot)}", 400
+            )
+        if offset:
+            # a sitting starting mid-slot would run into one more slot than it holds
+            raise ReservationError(f"Bookings start every {self.slot} minutes ({format_minutes(self.open)}, "
+                                   f"{format_minutes(self.open + self.slot)}, ...)", 400)
+        return first
+
+    def _fit(self, day, first, size):
+        """Smallest table size free over slots first..first+span, or None."""
+        slots = day.used[first:first + self.span] if day else ()
+        for seats in self.sizes:
+            if seats < size:
+                continue
+            limit = self.tables[seats]
+            if all(used[seats] < limit for used in slots):
+                return seats
+        return None
+
+    def _day(self, date):
+        day = self.days.get(date)
+        if day is None:
+            day = self.days[date] = DayBook(self.n_slots, self.sizes)
+        return day
+
+    def _take(self, day, first, seats, res):
+        for used in day.used[first:first + self.span]:
+            used[seats] += 1
+        day.reservations.append(res)
+
+    # ---------------- updates ----------------
+
+    def book(self, date, time, size):
+        """
+        Table size for a new booking; raises ReservationError when the
+        request is invalid or that time is fully booked.
+        Call inside STORE.transaction(), then add() the stored row.
+        """
+        if not isinstance(size, int) or size < 1:
+            raise ReservationError("Party size must be a positive number", 400)
+        first = self._first_slot(date, time)
+        if size > self.sizes[-1]:
+            raise ReservationError(f"No table for a party of {size}")
+        seats = self._fit(self.days.get(date), first, size)
+        if seats is None:
+            raise ReservationError(f"No table for {size} free at {time} on {date}")
+        return seats
+
+    def add(self, res):
+        first = self._first_slot(res["date"], res["time"])
+        self._take(self._day(res["date"]), first, res["table_size"], res)
+
+    def rebuild(self, reservations):
+        """Index stored bookings; old or invalid rows are kept as they are."""
+        self.days = {}
+        for res in reservations:
+            try:
+                first = self._first_slot(res.get("date"), res.get("time"))
+            except ReservationError:
+                continue
+            seats = res.get("table_size")
+            if seats not in self.tables:
+                size = res.get("size") if isinstance(res.get("size"), int) else 1
+                seats = next((s for s in self.sizes if s >= size), self.sizes[-1])
+            self._take(self._day(res["date"]), first, seats, res)
+
+    # ---------------- reads ----------------
+
+    def availability(self, date, size):
+        """Start times on `date` with a table for `size` people."""
+        try:
+            Date.fromisoformat(date)
+        except (TypeError, ValueError):
+            raise ReservationError("Invalid date (use YYYY-MM-DD)", 400)
+        if not isinstance(size, int) or size < 1:
+            raise ReservationError("Party size must be a positive number", 400)
+
+        day = self.days.get(date)
+        return [
+            format_minutes(self.open + first * self.slot)
+            for first in range(self.n_slots - self.span + 1)
+            if self._fit(day, first, size) is not None
+        ]
+
+    def on_date(self, date):
+        day = self.days.get(date)
+        return list(day.reservations) if day else []
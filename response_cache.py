@@ -0,0 +1,62 @@
+import hashlib
+import threading
+
+from flask import Response
+
+from encoding import dumps
+
+# --------------------------------------------------------
+# VERSIONED RESPONSE CACHE (ETag / conditional GET)
+# --------------------------------------------------------
+# For rarely changing, often polled resources (menu, inventory).
+# The encoded JSON body is kept together with the store version it was
+# built from; while that version doesn't move, a request costs a
+# version check, and a client that already has the body (If-None-Match)
+# gets an empty 304.
+#
+# Clients must still revalidate every time (Cache-Control: no-cache),
+# so an admin edit shows up on the very next load.
+
+
+class CachedResource:
+
+    def __init__(self, build, version, cache_control="no-cache"):
+        """
+        build:   callable returning the payload (dict/list) to serialize
+        version: callable returning a number that changes on every write
+        """
+        self.build = build
+        self.version = version
+        self.cache_control = cache_control
+        self._lock = threading.Lock()
+        self._entry = None   # (version, body bytes, etag)
+
+    def current(self):
+        entry = self._entry
+        version = self.version()
+        if entry is not None and entry[0] == version:
+            return entry
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry[0] != version:
+                body = dumps(self.build()) + b"\n"
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+                entry = self._entry = (version, body, etag)
+        return entry
+
+    def response(self, req):
+        _, body, etag = self.current()
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        tags = parse_etags(req.headers.get("If-None-Match", ""))
+        if etag in tags or "*" in tags:
+            return Response(status=304, headers=headers)
+        return Response(body, mimetype="application/json", headers=headers)
+
+
+def parse_etags(header):
+    if not header:
+        return ()
+    if header.strip() == "*":
+        return ("*",)
+    # accept weak validators too (W/"..."), they compare equal for GET
+    return tuple(t.strip().removeprefix("W/") for t in header.split(","))
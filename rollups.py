@@ -0,0 +1,201 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+# --------------------------------------------------------
+# TIME-BUCKETED SALES ROLLUPS
+# --------------------------------------------------------
+# Orders, revenue and items sold per time bucket, so
+# /api/analytics/timeseries never walks the orders:
+#   - record_order():   O(items), adds to the order's minute bucket
+#   - status_changed(): O(items), takes a cancelled order back out
+#   - timeseries():     O(buckets in range * groups)
+#
+# Three tiers. New orders land in minute buckets; once a minute bucket
+# is older than `minute_retention` it is merged into its hour bucket,
+# and hour buckets older than `hour_retention` into their day bucket.
+# Day buckets are kept forever, so memory grows with the number of
+# days, not orders. "Older" is measured from the newest order seen.
+#
+# A query can ask for any granularity (minute, hour, day, week): finer
+# tiers are summed up into it, coarser ones show up once at their start
+# (e.g. a minute query over last month gets one point per day).
+#
+# Each bucket holds a row for the totals, one per order type and one
+# per item name: [orders, revenue, items]. Cancelled orders don't
+# count, the same as SalesAnalytics.
+
+CANCELLED = "CANCELLED"
+GRANULARITIES = ("minute", "hour", "day", "week")
+TIERS = ("minute", "hour", "day")
+
+# range used when ?from= is missing (seconds before ?to=)
+DEFAULT_SPAN = {"minute": 3600, "hour": 86400, "day": 30 * 86400, "week": 12 * 7 * 86400}
+
+
+@lru_cache(maxsize=8192)
+def start_of(minute, unit, utc=False):
+    """Epoch second where the `unit` containing `minute` starts (local days unless utc)."""
+    if unit == "minute":
+        return minute
+    dt = datetime.fromtimestamp(minute, timezone.utc if utc else None)
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    if unit != "hour":
+        dt = dt.replace(hour=0)
+        if unit == "week":
+            dt -= timedelta(days=dt.weekday())
+    return int(dt.timestamp())
+
+
+class _Tier:
+
+    def __init__(self, unit):
+        self.unit = unit
+        self.buckets = {}   # bucket start (epoch s) -> {group: [orders, revenue, items]}
+        self.keys = []      # sorted bucket starts
+
+
+class SalesRollups:
+
+    def __init__(self, type_key="type", utc=False, minute_retention=86400, hour_retention=90 * 86400):
+        self.type_key = type_key
+        self.utc = utc
+        self.retention = {"minute": minute_retention, "hour": hour_retention}
+        self.tiers = {unit: _Tier(unit) for unit in TIERS}
+        self.latest = 0     # newest order time seen (epoch s)
+        self._lock = threading.Lock()
+
+    # ---------------- buckets ----------------
+
+    def _start(self, seconds, unit):
+        return start_of(seconds - seconds % 60, unit, self.utc)
+
+    def _tier_for(self, seconds):
+        """(tier, bucket start) that holds `seconds` right now."""
+        for unit in ("minute", "hour"):
+            key = self._start(seconds, unit)
+            if key >= self.latest - self.retention[unit]:
+                return self.tiers[unit], key
+        return self.tiers["day"], self._start(seconds, "day")
+
+    def _bucket(self, tier, key):
+        bucket = tier.buckets.get(key)
+        if bucket is None:
+            bucket = tier.buckets[key] = {}
+            insort(tier.keys, key)
+        return bucket
+
+    def _drop(self, tier, key):
+        del tier.buckets[key]
+        del tier.keys[bisect_left(tier.keys, key)]
+
+    @staticmethod
+    def _add(bucket, group, orders, revenue, items):
+        row = bucket.get(group)
+        if row is None:
+            row = bucket[group] = [0, 0.0, 0]
+        row[0] += orders
+        row[1] += revenue
+        row[2] += items
+        if row[0] <= 0:
+            del bucket[group]
+
+    def _compact(self):
+        for finer, coarser in (("minute", "hour"), ("hour", "day")):
+            tier, target = self.tiers[finer], self.tiers[coarser]
+            n = bisect_left(tier.keys, self.latest - self.retention[finer])
+            for key in tier.keys[:n]:
+                into = self._bucket(target, self._start(key, coarser))
+                for group, row in tier.buckets.pop(key).items():
+                    self._add(into, group, *row)
+            del tier.keys[:n]
+
+    # ---------------- updates ----------------
+
+    def _apply(self, order, sign):
+        seconds = order.created // 1000000
+        tier, key = self._tier_for(seconds)
+        bucket = self._bucket(tier, key)
+        lines = {}   # item name -> [revenue, qty]
+        for it in order.get("items", []):
+            qty = int(it.get("qty", 1))
+            line = lines.setdefault(it.get("name", "Unknown"), [0.0, 0])
+            line[0] += float(it.get("price", 0)) * qty
+            line[1] += qty
+        revenue = sign * float(order.get("total", 0))
+        qty = sign * sum(q for _, q in lines.values())
+        self._add(bucket, None, sign, revenue, qty)
+        self._add(bucket, (self.type_key, order.get(self.type_key)), sign, revenue, qty)
+        for name, (line_revenue, line_qty) in lines.items():
+            self._add(bucket, ("item", name), sign, sign * line_revenue, sign * line_qty)
+        if not bucket:
+            self._drop(tier, key)
+
+    def record_order(self, order):
+        if order.get("status") == CANCELLED or order.created is None:
+            return
+        with self._lock:
+            seconds = order.created // 1000000
+            if seconds > self.latest:
+                self.latest = seconds
+                self._compact()
+            self._apply(order, +1)
+
+    def status_changed(self, order, old_status):
+        new_status = order.get("status")
+        if order.created is None or (old_status == CANCELLED) == (new_status == CANCELLED):
+            return
+        with self._lock:
+            self._apply(order, -1 if new_status == CANCELLED else +1)
+
+    def rebuild(self, orders, archived=()):
+        """
+        Recompute everything from scratch (startup / restore only).
+        archived: OrderArchive.minute_rollups() rows of the orders no longer in `orders`.
+        """
+        archived = list(archived)
+        with self._lock:
+            self.tiers = {unit: _Tier(unit) for unit in TIERS}
+            self.latest = max((row[0] for row in archived), default=0)
+            for minute, group, n, revenue, qty in archived:
+                tier, key = self._tier_for(minute)
+                self._add(self._bucket(tier, key), group, n, revenue, qty)
+        for o in sorted(orders, key=lambda o: o.created or 0):
+            self.record_order(o)
+
+    # ---------------- reads ----------------
+
+    def timeseries(self, start, end, granularity="hour", group_by=None):
+        """
+        Points with bucket start in [start, end) (epoch seconds), oldest
+        first: [(bucket start, group or None, orders, revenue, items)].
+        group_by: None, the order type key or "item". Empty buckets are left out.
+        """
+        points = {}
+        with self._lock:
+            for unit in TIERS:
+                tier = self.tiers[unit]
+                lo = bisect_left(tier.keys, self._start(start, unit))
+                hi = bisect_left(tier.keys, end)
+                for key in tier.keys[lo:hi]:
+                    at = self._start(key, granularity)
+                    for group, row in tier.buckets[key].items():
+                        if group_by is None:
+                            if group is not None:
+                                continue
+                        elif group is None or group[0] != group_by:
+                            continue
+                        point = (at, group[1] if group else None)
+                        acc = points.get(point)
+                        if acc is None:
+                            points[point] = list(row)
+                        else:
+                            acc[0] += row[0]
+                            acc[1] += row[1]
+                            acc[2] += row[2]
+        return [(at, group, n, round(revenue, 2), qty)
+                for (at, group), (n, revenue, qty) in sorted(points.items(), key=lambda p: (p[0][0], str(p[0][1])))]
+
+    def bucket_count(self):
+        return {unit: len(tier.keys) for unit, tier in self.tiers.items()}
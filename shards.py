@@ -0,0 +1,167 @@
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import jsonify, request
+
+# --------------------------------------------------------
+# BRANCH SHARDS
+# --------------------------------------------------------
+# Every restaurant branch is a shard of its own: its own STORE (menu,
+# inventory, reservations, orders, archive), its own indexes, totals
+# and caches, and with them its own locks. Nothing is shared between
+# shards, so a rush at one branch never waits on a lock held by another
+# and its orders never grow another branch's indexes.
+#
+# A request names its branch with the X-Branch header or ?branch=
+# (neither: the default, the first of SRMS_BRANCHES, normally "main";
+# unknown: 404). The apps keep their module-level names (STORE, SALES,
+# ...); those are BranchLocal proxies that resolve to the shard of the
+# current request, or of the block in `with BRANCHES.use(branch_id)`
+# for work outside a request.
+#
+# Cross-branch reads are a scatter-gather: scatter(fn) runs fn(shard)
+# on every shard at once on a small thread pool and returns
+# {branch id: result}. (With MemoryStorage the GIL still runs them one
+# at a time; SQLite and the archive reads release it.)
+
+DEFAULT_BRANCH = "main"
+BRANCH_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")   # ids end up in file names
+
+
+class Shards:
+
+    def __init__(self, open_shard, branch_ids, header="X-Branch", param="branch"):
+        """open_shard(branch_id) -> the shard (any object with the per-branch attributes)."""
+        branch_ids = [b.strip() for b in branch_ids if b.strip()] or [DEFAULT_BRANCH]
+        for branch_id in branch_ids:
+            if not BRANCH_ID.match(branch_id):
+                raise ValueError(f"Invalid branch id: {branch_id!r}")
+        self.branch_ids = list(dict.fromkeys(branch_ids))
+        self.default = self.branch_ids[0]
+        self.header = header
+        self.param = param
+        self._current = contextvars.ContextVar("srms_branch", default=self.default)
+        self._pool = None
+        self.shards = {}
+        for branch_id in self.branch_ids:
+            with self.use(branch_id):
+                self.shards[branch_id] = open_shard(branch_id)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def items(self):
+        return self.shards.items()
+
+    # ---------------- routing ----------------
+
+    def current(self):
+        return self.shards[self._current.get()]
+
+    def current_id(self):
+        return self._current.get()
+
+    def branch_of(self, header_value=None, param_value=None):
+        """Branch id a request asks for (default when it names none), None if unknown."""
+        branch_id = header_value or param_value or self.default
+        return branch_id if branch_id in self.shards else None
+
+    @contextmanager
+    def use(self, branch_id):
+        token = self._current.set(branch_id)
+        try:
+            yield self.shards.get(branch_id)
+        finally:
+            self._current.reset(token)
+
+    def bind(self, branch_id, fn):
+        """fn wrapped to run against `branch_id` (callbacks from background threads)."""
+        def bound(*args, **kwargs):
+            with self.use(branch_id):
+                return fn(*args, **kwargs)
+        return bound
+
+    def local(self, name):
+        """Proxy for attribute `name` of the current shard (e.g. STORE = BRANCHES.local("store"))."""
+        return branch_local(self, name)
+
+    def init_app(self, app):
+        """Pick the branch of every request before the handlers run."""
+        current = self._current
+
+        def select():
+            branch_id = self.branch_of(request.headers.get(self.header), request.args.get(self.param))
+            if branch_id is None:
+                return jsonify({"error": "Unknown branch", "branches": self.branch_ids}), 404
+            current.set(branch_id)
+
+        def clear(exc=None):
+            current.set(self.default)
+
+        app.before_request(select)
+        app.teardown_request(clear)
+        return self
+
+    # ---------------- scatter-gather ----------------
+
+    def scatter(self, fn, branch_ids=None):
+        """fn(shard) for every shard (or `branch_ids`), in parallel; {branch id: result}."""
+        branch_ids = list(branch_ids or self.branch_ids)
+        if len(branch_ids) == 1:
+            return {branch_ids[0]: self._run(branch_ids[0], fn)}
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(min(32, len(self.shards)), thread_name_prefix="srms-scatter")
+        futures = [(b, self._pool.submit(self._run, b, fn)) for b in branch_ids]
+        return {b: f.result() for b, f in futures}
+
+    def _run(self, branch_id, fn):
+        with self.use(branch_id) as shard:
+            return fn(shard)
+
+
+def branch_local(shards, name):
+    """
+    A BranchLocal stands for attribute `name` of the current shard. The
+    targets are looked up once per branch and the class closes over
+    them, so an attribute access costs a ContextVar.get() and a dict
+    lookup (~0.1-0.2 us), not a chain of method calls.
+    """
+    targets = {branch_id: getattr(shard, name) for branch_id, shard in shards.items()}
+    get = shards._current.get
+
+    class BranchLocal:
+        __slots__ = ()
+
+        def __getattribute__(self, attr):
+            return getattr(targets[get()], attr)
+
+        def __len__(self):
+            return len(targets[get()])
+
+        def __contains__(self, item):
+            return item in targets[get()]
+
+        def __iter__(self):
+            return iter(targets[get()])
+
+        def __repr__(self):
+            return f"<{name} of branch {get()}>"
+
+    return BranchLocal()
+
+
+def merge_summaries(summaries, top=10):
+    """One SalesAnalytics-style summary from per-branch ones that carry full item `counts`."""
+    total = {"total_orders": 0, "cancelled_orders": 0, "total_revenue": 0.0}
+    counts = {}
+    for summary in summaries:
+        for key in total:
+            total[key] += summary[key]
+        for name, qty in summary["counts"].items():
+            counts[name] = counts.get(name, 0) + qty
+    total["total_revenue"] = round(total["total_revenue"], 2)
+    ranked = sorted(counts.items(), key=lambda kv: (-kv[1], str(kv[0])))
+    total["top_items"] = [{"name": name, "count": qty} for name, qty in ranked[:top]]
+    return total
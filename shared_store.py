@@ -0,0 +1,622 @@
+import argparse
+import itertools
+import os
+import socket
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from archive import ARCHIVE_STATUSES, OrderArchive
+from encoding import dumps, loads
+
+# --------------------------------------------------------
+# SHARED STATE FOR SEVERAL WORKER PROCESSES
+# --------------------------------------------------------
+# One Python process tops out at one core, so the apps scale out with
+# several worker processes behind a port-sharing front (gunicorn -w N,
+# or one port per worker behind a balancer). Their state lives here:
+#
+#   state process  (python shared_store.py --socket srms-state.sock)
+#                  the only writer. It owns the real storage (memory,
+#                  optionally journaled, or SQLite) and hands out one
+#                  write lock at a time over a Unix socket.
+#   each worker    SharedStorage, the STORE interface of storage.py on
+#                  top of a full in-memory replica (MemoryStorage).
+#                  Reads never leave the process.
+#
+# One state process serves one app (newstyle.py or oldstyle.py workers,
+# not both: the first worker's seed data and type key are what it keeps).
+#
+# A worker's transaction() takes the global write lock ("begin"), runs
+# against its replica, and sends the rows it wrote with "commit". The
+# state process applies them to the real storage, pushes them to every
+# other worker and only then releases the lock. A worker's socket
+# carries those change batches ahead of its own replies, so by the time
+# it holds the lock its replica has seen every earlier commit: ids
+# from next_order_id() are unique across processes and for_update
+# reads are current.
+#
+# A transaction whose body raised is not committed: the worker rolls
+# its replica back (stored rows only, not what the app derived from
+# them) and sends none of it, except archive moves, which are in the
+# shared archive files already. The state process checks a batch before
+# applying any of it; if one still fails half way, the applied part goes
+# out like any batch and the worker rolls back the rest.
+#
+# Workers apply peer changes to their replica from a reader thread and
+# then call the subscribe() callbacks, which update whatever the app
+# derives from the store (analytics, kitchen queue, events, caches).
+#
+# The order archive is a directory that all of them open: the worker
+# that archives appends under the write lock, the others re-open it
+# read-only when they hear of the move.
+#
+# Frames: 4-byte big-endian length + JSON (encoding.dumps). Requests
+# carry an "id" and get a reply with the same id; change batches are
+# {"op": "changes", "seq": n, "changes": [[table, action, row, ...]]}.
+
+FRAME = struct.Struct(">I")
+CHANGES = {("orders", "add"), ("orders", "save"), ("orders", "remove"),
+           ("menu", "save"), ("inventory", "save"), ("reservations", "add")}
+
+
+def send_frame(sock, msg):
+    data = dumps(msg)
+    sock.sendall(FRAME.pack(len(data)) + data)
+
+
+def recv_frame(stream):
+    """Next message from a socket file, or None once the peer is gone."""
+    head = stream.read(FRAME.size)
+    if len(head) < FRAME.size:
+        return None
+    (size,) = FRAME.unpack(head)
+    data = stream.read(size)
+    if len(data) < size:
+        return None
+    return loads(data)
+
+
+class StateError(Exception):
+    """The state process refused a request or went away."""
+
+
+# --------------------------------------------------------
+# STATE SERVER
+# --------------------------------------------------------
+
+class StateServer:
+
+    def __init__(self, path, open_store):
+        """
+        open_store(type_key, menu, inventory, reservations) -> opened
+        storage; called once, with the seed data of the first worker.
+        """
+        self.path = path
+        self.open_store = open_store
+        self.storage = None
+        self.seq = 0                              # last committed change batch
+        self._write_lock = threading.Lock()       # held from "begin" to "commit"
+        self._peers = {}                          # socket -> send lock
+        self._peers_lock = threading.Lock()
+        self._listener = None
+
+    def serve_forever(self, ready=None):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(128)
+        if ready:
+            ready()
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        if self._listener:
+            self._listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _send(self, conn, msg):
+        with self._peers_lock:
+            send_lock = self._peers.get(conn)
+        if send_lock is None:
+            send_frame(conn, msg)
+            return
+        with send_lock:
+            send_frame(conn, msg)
+
+    def _broadcast(self, origin, msg):
+        with self._peers_lock:
+            peers = [(c, lock) for c, lock in self._peers.items() if c is not origin]
+        for conn, send_lock in peers:
+            try:
+                with send_lock:
+                    send_frame(conn, msg)
+            except OSError:
+                pass    # its own handler thread notices and cleans up
+
+    def _handle(self, conn):
+        stream = conn.makefile("rb")
+        holding = False
+        try:
+            while True:
+                msg = recv_frame(stream)
+                if msg is None:
+                    return
+                op = msg.get("op")
+                if op == "hello":
+                    self._send(conn, dict(self._hello(conn, msg), id=msg["id"]))
+                elif op == "begin":
+                    self._write_lock.acquire()
+                    holding = True
+                    self._send(conn, {"id": msg["id"], "seq": self.seq})
+                elif op == "commit" and holding:
+                    try:
+                        try:
+                            reply = self._commit(conn, msg["changes"])
+                        except Exception as e:      # bad batch, nothing applied: report it, keep serving
+                            reply = {"error": f"{type(e).__name__}: {e}"}
+                        # replied before the lock goes, so no batch of the next
+                        # writer reaches this worker ahead of its reply
+                        self._send(conn, dict(reply, id=msg["id"]))
+                    finally:
+                        holding = False
+                        self._write_lock.release()
+                else:
+                    self._send(conn, {"id": msg.get("id"), "error": f"unexpected {op!r}"})
+        except OSError:
+            pass
+        finally:
+            if holding:
+                self._write_lock.release()    # worker died inside a transaction
+            with self._peers_lock:
+                self._peers.pop(conn, None)
+            conn.close()
+
+    def _hello(self, conn, msg):
+        """Open the storage on first use; reply with a snapshot taken under the write lock."""
+        with self._write_lock:
+            if self.storage is None:
+                self.storage = self.open_store(msg["type_key"], msg["menu"], msg["inventory"],
+                                               msg["reservations"])
+            storage = self.storage
+            reply = {       # copies: encoded after the lock is released
+                "seq": self.seq,
+                "orders": storage.all_orders(),
+                "menu": list(storage.list_menu()),
+                "inventory": list(storage.list_inventory()),
+                "reservations": list(storage.list_reservations()),
+                "archive_dir": storage.archive.directory,
+            }
+            # registered before the lock is released: no batch falls in between
+            with self._peers_lock:
+                self._peers[conn] = threading.Lock()
+            return reply
+
+    def _commit(self, conn, changes):
+        """
+        Check the whole batch, then apply it. Should a change still fail
+        half way (the disk, say), the ones before it stay and go to the
+        other workers like any batch; the reply has "applied" (how many)
+        and "failed", and the committing worker rolls back the rest.
+        """
+        self._check(changes)
+        applied = 0
+        failed = None
+        try:
+            with self.storage.transaction():
+                for change in changes:
+                    self._apply(*change)
+                    applied += 1
+        except Exception as e:
+            failed = f"{type(e).__name__}: {e}"
+        if applied:
+            self.seq += 1
+            self._broadcast(conn, {"op": "changes", "seq": self.seq, "changes": changes[:applied]})
+        if failed is not None:
+            return {"seq": self.seq, "applied": applied, "failed": failed}
+        return {"seq": self.seq}
+
+    def _check(self, changes):
+        """ValueError for a batch with a change that can't apply (then nothing is)."""
+        storage = self.storage
+        added = set()
+        for table, action, row, *_ in changes:
+            if (table, action) not in CHANGES:
+                raise ValueError(f"unknown change {table} {action}")
+            if action == "remove":
+                if not isinstance(row, list):
+                    raise ValueError("orders remove takes a list of ids")
+                continue
+            if not isinstance(row, dict) or "id" not in row:
+                raise ValueError(f"{table} {action} without a row id")
+            if table == "orders":
+                exists = row["id"] in added or storage.get_order(row["id"], for_update=True) is not None
+                if exists != (action == "save"):
+                    raise ValueError(f"order {row['id']} {'exists already' if exists else 'not found'}")
+                added.add(row["id"])
+            elif table == "menu" and storage.get_menu_item(row["id"]) is None:
+                raise ValueError(f"menu item {row['id']} not found")
+            elif table == "inventory" and storage.get_inventory_item(row["id"]) is None:
+                raise ValueError(f"inventory item {row['id']} not found")
+
+    def _apply(self, table, action, row, old_status=None):
+        storage = self.storage
+        if table == "orders":
+            if action == "add":
+                storage.add_order(row)
+            elif action == "save":
+                storage.save_order(row, old_status)
+            elif action == "remove":
+                storage.remove_orders(row)
+        elif table == "menu":
+            storage.save_menu_item(row)
+        elif table == "inventory":
+            storage.save_inventory_item(row)
+        elif table == "reservations":
+            storage.add_reservation(row)
+        else:
+            raise ValueError(f"unknown change {table} {action}")
+
+def open_state_storage(kind="memory"):
+    """open_store for StateServer, configured like storage_from_env() (SRMS_DATA_DIR, ...)."""
+    from storage import open_storage
+
+    def open_store(type_key, menu, inventory, reservations):
+        data_dir = os.environ.get("SRMS_DATA_DIR")
+        archive_dir = os.environ.get("SRMS_ARCHIVE_DIR")
+        if not archive_dir and kind == "memory" and not data_dir:
+            # workers exchange archived orders through files, so it needs a directory
+            archive_dir = tempfile.mkdtemp(prefix="srms-archive-")
+        return open_storage(
+            kind, type_key, menu, inventory, reservations,
+            data_dir=data_dir,
+            wal_sync=os.environ.get("SRMS_WAL_SYNC", "1") != "0",
+            sqlite_path=os.environ.get("SRMS_SQLITE_PATH", "srms.db"),
+            archive_dir=archive_dir
+        )
+    return open_store
+
+
+# --------------------------------------------------------
+# SHARED STORAGE (the STORE of one worker)
+# --------------------------------------------------------
+
+class SharedStorage:
+
+    def __init__(self, path, type_key, menu, inventory, reservations, load_order=None):
+        self.path = path
+        self.type_key = type_key
+        self.load_order = load_order
+        self._seed = {"menu": menu, "inventory": inventory, "reservations": reservations}
+        self.replica = None
+        self.archive_dir = None
+        self.seq = 0
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._call_ids = itertools.count(1)
+        self._waiting = {}                  # call id -> [threading.Event, reply]
+        self._waiting_lock = threading.Lock()
+        self._lock = threading.Lock()       # this process's writers, before the global lock
+        self._local = threading.local()
+        self._pending = []                  # changes of the open transaction
+        self._sync_lock = threading.Lock()
+        self._live = False
+        self._backlog = []                  # change batches held back until _go_live()
+        self._listeners = []                # callback(table, action, row, old_status)
+        self._closed = False
+
+    # ---------------- connection ----------------
+
+    def open(self):
+        from storage import MemoryStorage
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(self.path)
+        threading.Thread(target=self._read_loop, args=(self._sock.makefile("rb"),),
+                         name="shared-store-reader", daemon=True).start()
+        snap = self._call("hello", type_key=self.type_key, **self._seed)
+        self.archive_dir = snap["archive_dir"]
+        self.seq = snap["seq"]
+        replica = MemoryStorage(self.type_key, snap["menu"], snap["inventory"], snap["reservations"],
+                                load_order=self.load_order, archive=self._open_archive())
+        replica.orders.load(self._load_orders(snap["orders"]))
+        self.replica = replica.open()
+        return self
+
+    def close(self):
+        self._closed = True
+        if self._sock:
+            self._sock.close()
+
+    def _open_archive(self, readonly=True):
+        return OrderArchive(self.archive_dir, self.type_key, self.load_order, readonly=readonly)
+
+    def _load_orders(self, rows):
+        return [self.load_order(r) for r in rows] if self.load_order else rows
+
+    def _call(self, op, **fields):
+        call_id = next(self._call_ids)
+        slot = [threading.Event(), None]
+        with self._waiting_lock:
+            self._waiting[call_id] = slot
+        try:
+            with self._send_lock:
+                send_frame(self._sock, dict(fields, op=op, id=call_id))
+        except OSError as e:
+            with self._waiting_lock:
+                self._waiting.pop(call_id, None)
+            raise StateError(f"state process unreachable: {e}") from e
+        slot[0].wait()
+        reply = slot[1]
+        if reply is None:
+            raise StateError("lost the connection to the state process")
+        if "error" in reply:
+            raise StateError(reply["error"])
+        return reply
+
+    def _read_loop(self, stream):
+        try:
+            while True:
+                msg = recv_frame(stream)
+                if msg is None:
+                    break
+                if msg.get("op") == "changes":
+                    with self._sync_lock:
+                        if self._live:
+                            self._apply_batch(msg)
+                        else:
+                            self._backlog.append(msg)
+                    continue
+                with self._waiting_lock:
+                    slot = self._waiting.pop(msg.get("id"), None)
+                if slot:
+                    slot[1] = msg
+                    slot[0].set()
+        except OSError:
+            pass
+        finally:
+            # wake every caller still waiting; they raise StateError
+            with self._waiting_lock:
+                slots, self._waiting = list(self._waiting.values()), {}
+            for slot in slots:
+                slot[0].set()
+
+    # ---------------- peer changes ----------------
+
+    def subscribe(self, callback):
+        """
+        callback(table, action, row, old_status) for every change another
+        worker commits (row: the stored object; the id list for an
+        ("orders", "remove")). Batches received since open() are held
+        back until the first subscribe() or transaction(), so whatever
+        the caller built from the snapshot misses nothing.
+        """
+        self._listeners.append(callback)
+        self._go_live()
+
+    def _go_live(self):
+        if self._live:
+            return
+        with self._sync_lock:
+            for msg in self._backlog:
+                self._apply_batch(msg)
+            self._backlog = []
+            self._live = True
+
+    def _apply_batch(self, msg):
+        replica = self.replica
+        applied = []
+        with replica.transaction():
+            for table, action, row, *rest in msg["changes"]:
+                old_status = rest[0] if rest else None
+                if table == "orders":
+                    if action == "remove":
+                        # the writer appended them to the archive files first
+                        replica.archive = self._open_archive().open()
+                        replica.remove_orders(row)
+                    else:
+                        row = self.load_order(row) if self.load_order else row
+                        if action == "add":
+                            replica.order_ids.reset(row["id"])
+                            replica.add_order(row)
+                        else:
+                            replica.save_order(row, old_status)
+                elif table == "menu":
+                    replica.save_menu_item(row)
+                elif table == "inventory":
+                    replica.save_inventory_item(row)
+                elif table == "reservations":
+                    replica.reservation_ids.reset(row["id"])
+                    replica.add_reservation(row)
+                applied.append((table, action, row, old_status))
+            self.seq = msg["seq"]
+            for change in applied:
+                for callback in self._listeners:
+                    callback(*change)
+
+    # ---------------- transactions ----------------
+
+    @contextmanager
+    def transaction(self):
+        """The global write lock for the outermost level (nests per thread)."""
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                with self.replica.transaction():
+                    yield self
+            finally:
+                self._local.depth = depth
+            return
+        with self._lock:
+            self._go_live()
+            self._call("begin")
+            self._local.depth = 1
+            try:
+                # the replica stays locked until the reply: a peer batch
+                # can't land between the commit and a rollback
+                with self.replica.transaction():
+                    try:
+                        yield self
+                    except BaseException:
+                        self._end(failed=True)
+                        raise
+                    self._end(failed=False)
+            finally:
+                self._local.depth = 0
+                self._pending = []
+
+    def _end(self, failed):
+        """
+        Commit the open transaction's changes. If its body raised, they are
+        rolled back on the replica first and not sent, except archive moves
+        (their orders are in the shared archive files already). Whatever
+        the state process refuses or fails to apply is rolled back too.
+        """
+        pending, self._pending = self._pending, []
+        keep = pending
+        if failed:
+            keep = [p for p in pending if p[1] is None]
+            self._rollback([p for p in pending if p[1] is not None])
+        try:
+            reply = self._call("commit", changes=[change for change, _ in keep])
+        except StateError:
+            self._rollback(keep)
+            raise
+        self.seq = reply["seq"]
+        if "failed" in reply:
+            self._rollback(keep[reply["applied"]:])
+            raise StateError(reply["failed"])
+
+    def _rollback(self, pending):
+        for _, undo in reversed(pending):
+            if undo is not None:
+                undo()
+
+    def _record(self, change, undo):
+        """undo() puts the replica back as it was before `change` (None: it can't)."""
+        self._pending.append((change, undo))
+
+    def version(self, table):
+        return self.replica.version(table)
+
+    @property
+    def archive(self):
+        return self.replica.archive
+
+    # ---------------- orders ----------------
+
+    def next_order_id(self):
+        return self.replica.next_order_id()
+
+    def add_order(self, order):
+        with self.transaction():
+            self.replica.add_order(order)
+            self._record(("orders", "add", order), lambda: self.replica.remove_orders([order["id"]]))
+            return order
+
+    def get_order(self, order_id, for_update=False):
+        return self.replica.get_order(order_id, for_update)
+
+    def save_order(self, order, old_status):
+        with self.transaction():
+            before = self.replica.get_order(order["id"])
+            self.replica.save_order(order, old_status)
+            self._record(("orders", "save", order, old_status),
+                         lambda: self.replica.save_order(before, order.get("status")))
+            return order
+
+    def find_orders(self, **filters):
+        return self.replica.find_orders(**filters)
+
+    def last_order_change(self):
+        return self.replica.last_order_change()
+
+    def all_orders(self):
+        return self.replica.all_orders()
+
+    def count_orders(self, status=None, statuses=None):
+        return self.replica.count_orders(status=status, statuses=statuses)
+
+    def archive_orders(self, before, statuses=ARCHIVE_STATUSES, limit=None):
+        """MemoryStorage.archive_orders on the replica, with a writable archive (under the global lock)."""
+        with self.transaction():
+            # re-open: other workers may have appended since this one last looked
+            self.replica.archive = self._open_archive(readonly=False).open()
+            ids = self.replica.archive_orders(before, statuses, limit)
+            if ids:
+                self._record(("orders", "remove", ids), None)
+            return ids
+
+    def remove_orders(self, order_ids):
+        with self.transaction():
+            self.replica.remove_orders(order_ids)
+            self._record(("orders", "remove", list(order_ids)), None)
+
+    # ---------------- menu / inventory ----------------
+
+    def list_menu(self):
+        return self.replica.list_menu()
+
+    def get_menu_item(self, item_id, for_update=False):
+        return self.replica.get_menu_item(item_id, for_update)
+
+    def save_menu_item(self, item):
+        with self.transaction():
+            before = self.replica.get_menu_item(item["id"])
+            self.replica.save_menu_item(item)
+            self._record(("menu", "save", item), lambda: self.replica.save_menu_item(before))
+            return item
+
+    def list_inventory(self):
+        return self.replica.list_inventory()
+
+    def get_inventory_item(self, item_id, for_update=False):
+        return self.replica.get_inventory_item(item_id, for_update)
+
+    def save_inventory_item(self, item):
+        with self.transaction():
+            before = self.replica.get_inventory_item(item["id"])
+            self.replica.save_inventory_item(item)
+            self._record(("inventory", "save", item), lambda: self.replica.save_inventory_item(before))
+            return item
+
+    # ---------------- reservations ----------------
+
+    def next_reservation_id(self):
+        return self.replica.next_reservation_id()
+
+    def add_reservation(self, res):
+        with self.transaction():
+            self.replica.add_reservation(res)
+            self._record(("reservations", "add", res), lambda: self.replica.remove_reservation(res))
+            return res
+
+    def list_reservations(self):
+        return self.replica.list_reservations()
+
+
+# --------------------------------------------------------
+# MAIN
+# --------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="State process for SRMS_STORAGE=shared workers.")
+    parser.add_argument("--socket", default=os.environ.get("SRMS_STATE_SOCKET", "srms-state.sock"))
+    parser.add_argument("--storage", default="memory", choices=("memory", "sqlite"),
+                        help="where the state process keeps the data (SRMS_DATA_DIR etc. apply)")
+    args = parser.parse_args()
+    server = StateServer(args.socket, open_state_storage(args.storage))
+    try:
+        server.serve_forever(ready=lambda: print(f"state process listening on {args.socket}", flush=True))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,615 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from archive import ARCHIVE_STATUSES, OrderArchive
+from models import json_default
+from order_store import OrderStore
+from persistence import open_journal
+
+# --------------------------------------------------------
+# STORAGE BACKENDS
+# --------------------------------------------------------
+# The endpoints only talk to a storage object with this interface:
+#
+#   writes:        with transaction(): ...   (one writer at a time)
+#   orders:        next_order_id(), add_order(o), get_order(id, for_update),
+#                  save_order(o, old_status), find_orders(...),
+#                  last_order_change(), all_orders(), count_orders(...)
+#   menu:          list_menu(), get_menu_item(id, for_update),
+#                  save_menu_item(m)
+#   inventory:     list_inventory(), get_inventory_item(id, for_update),
+#                  save_inventory_item(i)
+#   reservations:  next_reservation_id(), add_reservation(r),
+#                  list_reservations()
+#   versions:      version(table) - bumped on every write to that table,
+#                  used to invalidate cached responses
+#   archive:       archive (archive.OrderArchive), archive_orders(before) -
+#                  finished orders move there; get_order() falls back to
+#                  it, all the other order reads only see live orders;
+#                  remove_orders(ids) drops already archived ones
+#
+# Objects are plain dicts (orders may be models.Order objects, which act
+# like dicts; load_order turns stored rows back into those). A handler
+# that wants to change one asks for it with for_update=True inside a
+# transaction, edits that private copy and hands it back with save_*().
+# Stored objects are never modified after they were published, so
+# readers need no lock: whatever they got is a consistent snapshot of
+# that row.
+#
+#   MemoryStorage - the original in-memory lists (+ OrderStore indexes,
+#                   + optional write-ahead journal)
+#   SQLiteStorage - one SQLite file in WAL mode
+#   SharedStorage - (shared_store.py) a replica of the state held by a
+#                   separate state process, for several worker processes;
+#                   also has subscribe(callback) for other workers' writes
+#
+# Pick one with open_storage(kind, ...), normally from SRMS_STORAGE.
+
+
+class IdAllocator:
+    """Monotonic ids, safe to call from many threads."""
+
+    def __init__(self, last=0):
+        self._lock = threading.Lock()
+        self.last = last
+
+    def reset(self, last):
+        with self._lock:
+            self.last = max(self.last, last)
+
+    def next(self):
+        with self._lock:
+            self.last += 1
+            return self.last
+
+
+def copy_for_update(row):
+    """Private copy of a stored row (nested lists such as logs copied too)."""
+    if row is None:
+        return None
+    if not isinstance(row, dict):
+        return row.copy()
+    return {k: (list(v) if isinstance(v, list) else v) for k, v in row.items()}
+
+
+TABLES = ("menu", "inventory", "reservations", "orders")
+
+
+class MemoryStorage:
+
+    def __init__(self, type_key, menu, inventory, reservations, data_dir=None, wal_sync=True,
+                 load_order=None, archive=None):
+        self.orders = OrderStore(type_key=type_key)
+        self.load_order = load_order
+        if archive is None:
+            archive = OrderArchive(type_key=type_key, load_order=load_order)
+        self.archive = archive
+        self.menu = menu
+        self.inventory = inventory
+        self.reservations = reservations
+        self._menu_pos = {}        # id -> position in self.menu
+        self._inventory_pos = {}   # id -> position in self.inventory
+        self.order_ids = IdAllocator()
+        self.reservation_ids = IdAllocator()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.versions = dict.fromkeys(TABLES, 0)
+        self.journal = open_journal(
+            data_dir,
+            lambda: {"menu": self.menu, "inventory": self.inventory,
+                     "reservations": self.reservations, "orders": self.orders.orders},
+            sync=wal_sync
+        )
+
+    def open(self):
+        """Restore from the journal (if any) and build the id indexes."""
+        self.archive.open()
+        if self.journal:
+            tables = self.journal.recover()
+            for name, target in (("menu", self.menu), ("inventory", self.inventory),
+                                 ("reservations", self.reservations)):
+                if name in tables:
+                    rows = {r["id"]: r for r in target}
+                    rows.update(tables[name])
+                    target[:] = sorted(rows.values(), key=lambda r: r["id"])
+            if "orders" in tables:
+                rows = tables["orders"].values()
+                if self.load_order:
+                    rows = [self.load_order(r) for r in rows]
+                self.orders.load(rows)
+                # the journal may still hold orders archived since its last snapshot
+                self.orders.remove([oid for oid in self.orders.ids if oid in self.archive])
+            self.journal.start()
+        self._menu_pos = {m["id"]: i for i, m in enumerate(self.menu)}
+        self._inventory_pos = {x["id"]: i for i, x in enumerate(self.inventory)}
+        self.order_ids.reset(max(max(self.orders.ids, default=0), self.archive.max_id()))
+        self.reservation_ids.reset(max((r["id"] for r in self.reservations), default=0))
+        return self
+
+    def close(self):
+        if self.journal:
+            self.journal.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Serializes writers. The journal fsync is waited for after the lock
+        is released, so concurrent writers still share one group commit.
+        """
+        with self._lock:
+            depth = getattr(self._local, "depth", 0)
+            self._local.depth = depth + 1
+            try:
+                yield self
+            finally:
+                self._local.depth = depth
+        if depth == 0 and self.journal and self.journal.sync:
+            seq = getattr(self._local, "seq", 0)
+            if seq:
+                self.journal.wait_durable(seq)
+
+    def _persist(self, table, row):
+        # only after the row is in the lists: a snapshot covering this
+        # row's seq must also find the row in tables_fn()
+        if self.journal:
+            self._local.seq = self.journal.append(table, row)
+
+    def _changed(self, table):
+        # bumped only after the new row is visible, so a reader can never
+        # cache old data under the new version
+        self.versions[table] += 1
+
+    def version(self, table):
+        return self.versions[table]
+
+    # ---------------- orders ----------------
+
+    def next_order_id(self):
+        return self.order_ids.next()
+
+    def add_order(self, order):
+        with self.transaction():
+            self.orders.add(order)
+            self._persist("orders", order)
+            self._changed("orders")
+            return order
+
+    def get_order(self, order_id, for_update=False):
+        order = self.orders.get(order_id)
+        if order is None and not for_update:
+            return self.archive.get(order_id)
+        return copy_for_update(order) if for_update else order
+
+    def save_order(self, order, old_status):
+        with self.transaction():
+            self.orders.save(order, old_status)
+            self._persist("orders", order)
+            self._changed("orders")
+            return order
+
+    def find_orders(self, **filters):
+        return self.orders.find(**filters)
+
+    def last_order_change(self):
+        return self.orders.last_change()
+
+    def all_orders(self):
+        return list(self.orders.orders)
+
+    def count_orders(self, status=None, statuses=None):
+        return self.orders.count(status=status, statuses=statuses)
+
+    def archive_orders(self, before, statuses=ARCHIVE_STATUSES, limit=None):
+        """Move (up to `limit`) orders in `statuses` last updated before `before` to the archive; returns their ids."""
+        with self.transaction():
+            old = [o for o in self.orders.find(statuses=statuses) if (o.get("updated_at") or "") < before]
+            old = old[:limit]
+            if not old:
+                return []
+            # archive first (fsynced): a crash before remove() only leaves
+            # duplicates, which open() drops again
+            self.archive.append(old)
+            ids = [o["id"] for o in old]
+            self.remove_orders(ids)
+            return ids
+
+    def remove_orders(self, order_ids):
+        """Drop orders that are already in the archive from the live store."""
+        with self.transaction():
+            self.orders.remove(order_ids)
+            self._changed("orders")
+
+    # ---------------- menu ----------------
+
+    def list_menu(self):
+        return self.menu
+
+    def get_menu_item(self, item_id, for_update=False):
+        pos = self._menu_pos.get(item_id)
+        item = self.menu[pos] if pos is not None else None
+        return copy_for_update(item) if for_update else item
+
+    def save_menu_item(self, item):
+        with self.transaction():
+            self.menu[self._menu_pos[item["id"]]] = item
+            self._persist("menu", item)
+            self._changed("menu")
+            return item
+
+    # ---------------- inventory ----------------
+
+    def list_inventory(self):
+        return self.inventory
+
+    def get_inventory_item(self, item_id, for_update=False):
+        pos = self._inventory_pos.get(item_id)
+        item = self.inventory[pos] if pos is not None else None
+        return copy_for_update(item) if for_update else item
+
+    def save_inventory_item(self, item):
+        with self.transaction():
+            self.inventory[self._inventory_pos[item["id"]]] = item
+            self._persist("inventory", item)
+            self._changed("inventory")
+            return item
+
+    # ---------------- reservations ----------------
+
+    def next_reservation_id(self):
+        return self.reservation_ids.next()
+
+    def add_reservation(self, res):
+        with self.transaction():
+            self.reservations.append(res)
+            self._persist("reservations", res)
+            self._changed("reservations")
+            return res
+
+    def remove_reservation(self, res):
+        """Take back a reservation (a worker rolling back its replica, see shared_store.py)."""
+        with self.transaction():
+            self.reservations.remove(res)
+            self._changed("reservations")
+
+    def list_reservations(self):
+        return self.reservations
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id          INTEGER PRIMARY KEY,
+    status      TEXT NOT NULL,
+    type        TEXT,
+    created_at  TEXT,
+    updated_at  TEXT,
+    doc         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_status_type_created ON orders(status, type, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_type_created ON orders(type, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_updated ON orders(updated_at);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    id    INTEGER PRIMARY KEY,
+    date  TEXT,
+    time  TEXT,
+    doc   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_date_time ON reservations(date, time);
+
+CREATE TABLE IF NOT EXISTS menu (
+    id   INTEGER PRIMARY KEY,
+    doc  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS inventory (
+    id   INTEGER PRIMARY KEY,
+    doc  TEXT NOT NULL
+);
+"""
+
+# Fixed SQL text, so sqlite3's per-connection statement cache keeps them
+# prepared and each call only binds parameters.
+SQL_INSERT_ORDER = "INSERT INTO orders (id, status, type, created_at, updated_at, doc) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_UPDATE_ORDER = "UPDATE orders SET status = ?, updated_at = ?, doc = ? WHERE id = ?"
+SQL_GET_ORDER = "SELECT doc FROM orders WHERE id = ?"
+SQL_LAST_CHANGE = "SELECT MAX(updated_at) FROM orders"
+SQL_MAX_ORDER_ID = "SELECT COALESCE(MAX(id), 0) FROM orders"
+SQL_DELETE_ORDER = "DELETE FROM orders WHERE id = ?"
+SQL_FINISHED_IDS = "SELECT id FROM orders WHERE status IN (?, ?)"
+SQL_ARCHIVABLE = "SELECT doc FROM orders WHERE status IN (%s) AND updated_at < ? ORDER BY id LIMIT ?"
+SQL_INSERT_RES = "INSERT INTO reservations (id, date, time, doc) VALUES (?, ?, ?, ?)"
+SQL_MAX_RES_ID = "SELECT COALESCE(MAX(id), 0) FROM reservations"
+SQL_LIST_RES = "SELECT doc FROM reservations ORDER BY id"
+SQL_PUT_DOC = "INSERT OR REPLACE INTO {table} (id, doc) VALUES (?, ?)"
+SQL_GET_DOC = "SELECT doc FROM {table} WHERE id = ?"
+SQL_LIST_DOCS = "SELECT doc FROM {table} ORDER BY id"
+
+
+def _dumps(row):
+    return json.dumps(row, separators=(",", ":"), default=json_default)
+
+
+class SQLiteStorage:
+
+    def __init__(self, path, type_key, menu, inventory, pool_size=None, load_order=None, archive=None):
+        self.path = path
+        self.type_key = type_key
+        self.load_order = load_order
+        if archive is None:
+            archive = OrderArchive(path + "-archive", type_key=type_key, load_order=load_order)
+        self.archive = archive
+        self._seed = {"menu": menu, "inventory": inventory}
+        self._local = threading.local()
+        self._connections = []
+        self._pool_lock = threading.Lock()
+        self.order_ids = IdAllocator()
+        self.reservation_ids = IdAllocator()
+        self.versions = dict.fromkeys(TABLES, 0)
+        self._version_lock = threading.Lock()
+
+    def version(self, table):
+        return self.versions[table]
+
+    def _changed(self, table):
+        """Bump the table version once the write is committed."""
+        if getattr(self._local, "depth", 0):
+            self._local.dirty.add(table)
+            return
+        with self._version_lock:
+            self.versions[table] += 1
+
+    # ---------------- connections ----------------
+
+    def _conn(self):
+        """One connection per thread, created on first use and reused."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False,
+                                   isolation_level=None, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._pool_lock:
+                self._connections.append(conn)
+        return conn
+
+    def open(self):
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        for table, rows in self._seed.items():
+            if conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0:
+                conn.executemany(SQL_PUT_DOC.format(table=table),
+                                 [(r["id"], _dumps(r)) for r in rows])
+        self.archive.open()
+        # rows archived just before a crash, whose DELETE never committed
+        stale = [(oid,) for oid, in conn.execute(SQL_FINISHED_IDS, ARCHIVE_STATUSES) if oid in self.archive]
+        conn.executemany(SQL_DELETE_ORDER, stale)
+        self.order_ids.reset(max(conn.execute(SQL_MAX_ORDER_ID).fetchone()[0], self.archive.max_id()))
+        self.reservation_ids.reset(conn.execute(SQL_MAX_RES_ID).fetchone()[0])
+        return self
+
+    def close(self):
+        with self._pool_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE: takes SQLite's write lock up front (nests per thread)."""
+        conn = self._conn()
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.dirty = set()
+        self._local.depth = depth + 1
+        try:
+            yield self
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        self._local.depth = depth
+        if depth == 0:
+            conn.execute("COMMIT")
+            for table in self._local.dirty:
+                self._changed(table)
+
+    def _docs(self, sql, params=()):
+        return [json.loads(row[0]) for row in self._conn().execute(sql, params)]
+
+    def _doc(self, sql, params):
+        row = self._conn().execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ---------------- orders ----------------
+
+    def next_order_id(self):
+        return self.order_ids.next()
+
+    def add_order(self, order):
+        self._conn().execute(SQL_INSERT_ORDER, (
+            order["id"], order.get("status"), order.get(self.type_key),
+            order.get("created_at"), order.get("updated_at"), _dumps(order)
+        ))
+        self._changed("orders")
+        return order
+
+    def _orders(self, sql, params=()):
+        docs = self._docs(sql, params)
+        return [self.load_order(d) for d in docs] if self.load_order else docs
+
+    def get_order(self, order_id, for_update=False):
+        # every read is already a private copy decoded from the row
+        doc = self._doc(SQL_GET_ORDER, (order_id,))
+        if doc is None:
+            return None if for_update else self.archive.get(order_id)
+        return self.load_order(doc) if self.load_order else doc
+
+    def save_order(self, order, old_status):
+        self._conn().execute(SQL_UPDATE_ORDER, (
+            order.get("status"), order.get("updated_at"), _dumps(order), order["id"]
+        ))
+        self._changed("orders")
+        return order
+
+    def find_orders(self, status=None, order_type=None, statuses=None,
+                    after_id=None, limit=None, since=None):
+        where, params = [], []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if order_type:
+            where.append("type = ?")
+            params.append(order_type)
+        if statuses:
+            where.append("status IN (%s)" % ",".join("?" * len(statuses)))
+            params.extend(statuses)
+        if after_id:
+            where.append("id > ?")
+            params.append(after_id)
+        if since:
+            where.append("updated_at >= ?")
+            params.append(since)
+
+        sql = "SELECT doc FROM orders"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._orders(sql, params)
+
+    def last_order_change(self):
+        return self._conn().execute(SQL_LAST_CHANGE).fetchone()[0]
+
+    def all_orders(self):
+        return self._orders("SELECT doc FROM orders ORDER BY id")
+
+    def count_orders(self, status=None, statuses=None):
+        if status:
+            statuses = [status]
+        if statuses:
+            sql = "SELECT COUNT(*) FROM orders WHERE status IN (%s)" % ",".join("?" * len(statuses))
+            return self._conn().execute(sql, list(statuses)).fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def archive_orders(self, before, statuses=ARCHIVE_STATUSES, limit=None):
+        """Move (up to `limit`) orders in `statuses` last updated before `before` to the archive; returns their ids."""
+        with self.transaction():
+            old = self._orders(SQL_ARCHIVABLE % ",".join("?" * len(statuses)), (*statuses, before, limit or -1))
+            if not old:
+                return []
+            # archive first (fsynced): if the DELETE does not commit, open() removes them
+            self.archive.append(old)
+            ids = [o["id"] for o in old]
+            self.remove_orders(ids)
+            return ids
+
+    def remove_orders(self, order_ids):
+        """Drop orders that are already in the archive from the live store."""
+        self._conn().executemany(SQL_DELETE_ORDER, [(oid,) for oid in order_ids])
+        self._changed("orders")
+
+    # ---------------- menu / inventory ----------------
+
+    def list_menu(self):
+        return self._docs(SQL_LIST_DOCS.format(table="menu"))
+
+    def get_menu_item(self, item_id, for_update=False):
+        return self._doc(SQL_GET_DOC.format(table="menu"), (item_id,))
+
+    def save_menu_item(self, item):
+        self._conn().execute(SQL_PUT_DOC.format(table="menu"), (item["id"], _dumps(item)))
+        self._changed("menu")
+        return item
+
+    def list_inventory(self):
+        return self._docs(SQL_LIST_DOCS.format(table="inventory"))
+
+    def get_inventory_item(self, item_id, for_update=False):
+        return self._doc(SQL_GET_DOC.format(table="inventory"), (item_id,))
+
+    def save_inventory_item(self, item):
+        self._conn().execute(SQL_PUT_DOC.format(table="inventory"), (item["id"], _dumps(item)))
+        self._changed("inventory")
+        return item
+
+    # ---------------- reservations ----------------
+
+    def next_reservation_id(self):
+        return self.reservation_ids.next()
+
+    def add_reservation(self, res):
+        self._conn().execute(SQL_INSERT_RES, (res["id"], res.get("date"), res.get("time"), _dumps(res)))
+        self._changed("reservations")
+        return res
+
+    def list_reservations(self):
+        return self._docs(SQL_LIST_RES)
+
+
+def open_storage(kind, type_key, menu, inventory, reservations,
+                 data_dir=None, wal_sync=True, sqlite_path="srms.db", load_order=None, archive_dir=None,
+                 state_socket="srms-state.sock"):
+    """
+    Build and open the configured backend ("memory", "sqlite" or "shared").
+    The order archive goes to archive_dir, by default next to the data:
+    <data_dir>/archive, <sqlite_path>-archive (in memory without a data_dir).
+    "shared" connects to the state process at state_socket, which owns
+    the data and the archive (the other arguments are its seed).
+    """
+    if kind == "shared":
+        from shared_store import SharedStorage
+        return SharedStorage(state_socket, type_key, menu, inventory, reservations,
+                             load_order=load_order).open()
+    if kind == "sqlite":
+        archive = OrderArchive(archive_dir, type_key, load_order) if archive_dir else None
+        return SQLiteStorage(sqlite_path, type_key, menu, inventory, load_order=load_order,
+                             archive=archive).open()
+    if kind != "memory":
+        raise ValueError(f"Unknown storage backend: {kind}")
+    archive_dir = archive_dir or (os.path.join(data_dir, "archive") if data_dir else None)
+    return MemoryStorage(type_key, menu, inventory, reservations,
+                         data_dir=data_dir, wal_sync=wal_sync, load_order=load_order,
+                         archive=OrderArchive(archive_dir, type_key, load_order)).open()
+
+
+def storage_from_env(type_key, menu, inventory, reservations, load_order=None, branch=None):
+    """
+    open_storage() configured by SRMS_STORAGE / SRMS_DATA_DIR / SRMS_SQLITE_PATH /
+    SRMS_ARCHIVE_DIR / SRMS_STATE_SOCKET. With a `branch` every location gets
+    its own variant (branch_path()), so the data of branches never mixes.
+    """
+    data_dir = os.environ.get("SRMS_DATA_DIR")
+    archive_dir = os.environ.get("SRMS_ARCHIVE_DIR")
+    return open_storage(
+        os.environ.get("SRMS_STORAGE", "memory"),
+        type_key=type_key,
+        menu=menu,
+        inventory=inventory,
+        reservations=reservations,
+        data_dir=data_dir and branch_path(data_dir, branch, is_dir=True),
+        wal_sync=os.environ.get("SRMS_WAL_SYNC", "1") != "0",
+        sqlite_path=branch_path(os.environ.get("SRMS_SQLITE_PATH", "srms.db"), branch),
+        load_order=load_order,
+        archive_dir=archive_dir and branch_path(archive_dir, branch, is_dir=True),
+        state_socket=branch_path(os.environ.get("SRMS_STATE_SOCKET", "srms-state.sock"), branch)
+    )
+
+
+def branch_path(path, branch, is_dir=False):
+    """data -> data/branches/<branch>, srms.db -> srms-<branch>.db; unchanged without a branch."""
+    if not branch:
+        return path
+    if is_dir:
+        return os.path.join(path, "branches", branch)
+    root, ext = os.path.splitext(path)
+    return f"{root}-{branch}{ext}"
@@ -0,0 +1,33 @@
+import os
+import sys
+
+# the modules live in the repository root, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# keep the apps in memory and quiet, whatever the shell has set
+for name in ("SRMS_DATA_DIR", "SRMS_STORAGE", "SRMS_STATE_SOCKET", "SRMS_BRANCHES", "SRMS_ARCHIVE_AFTER",
+             "SRMS_ARCHIVE_DIR", "SRMS_ADMISSION", "SRMS_AUTH"):
+    os.environ.pop(name, None)
+os.environ["SRMS_METRICS"] = "0"
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def newstyle():
+    import newstyle
+    return newstyle
+
+
+@pytest.fixture(scope="session")
+def oldstyle():
+    import oldstyle
+    return oldstyle
+
+
+@pytest.fixture
+def staff():
+    """staff(app module, role) -> Authorization header with a token for `role`."""
+    def headers(mod, role="ADMIN"):
+        return {"Authorization": f"Bearer {mod.AUTH.issue(role.lower(), role)}"}
+    return headers
@@ -0,0 +1,92 @@
+from analytics import SalesAnalytics
+
+
+def order(oid, status="RECEIVED", items=(("Pizza", 32.0, 1),)):
+    return {"id": oid, "status": status, "total": sum(price * qty for _, price, qty in items),
+            "items": [{"name": name, "price": price, "qty": qty} for name, price, qty in items]}
+
+
+def test_new_orders_add_revenue_and_items():
+    sales = SalesAnalytics()
+    sales.record_order(order(1, items=[("Pizza", 32.0, 2), ("Karak Tea", 6.0, 1)]))
+    sales.record_order(order(2, items=[("Karak Tea", 6.0, 3)]))
+    assert sales.summary() == {
+        "total_orders": 2, "cancelled_orders": 0, "total_revenue": 88.0,
+        "top_items": [{"name": "Karak Tea", "count": 4}, {"name": "Pizza", "count": 2}],
+    }
+
+
+def test_cancelling_takes_the_order_out():
+    sales = SalesAnalytics()
+    first = order(1, items=[("Pizza", 32.0, 1)])
+    sales.record_order(first)
+    sales.record_order(order(2, items=[("Mandi", 30.0, 1)]))
+    sales.status_changed(dict(first, status="CANCELLED"), "RECEIVED")
+    assert sales.summary() == {
+        "total_orders": 2, "cancelled_orders": 1, "total_revenue": 30.0,
+        "top_items": [{"name": "Mandi", "count": 1}],
+    }
+
+
+def test_reopening_a_cancelled_order_counts_it_again():
+    sales = SalesAnalytics()
+    first = order(1, items=[("Pizza", 32.0, 2)])
+    sales.record_order(first)
+    sales.status_changed(dict(first, status="CANCELLED"), "RECEIVED")
+    sales.status_changed(dict(first, status="PREPARING"), "CANCELLED")
+    assert sales.summary() == {
+        "total_orders": 1, "cancelled_orders": 0, "total_revenue": 64.0,
+        "top_items": [{"name": "Pizza", "count": 2}],
+    }
+
+
+def test_moves_that_dont_touch_cancelled_change_nothing():
+    sales = SalesAnalytics()
+    first = order(1)
+    sales.record_order(first)
+    before = sales.summary()
+    sales.status_changed(dict(first, status="PREPARING"), "RECEIVED")
+    sales.status_changed(dict(first, status="READY"), "PREPARING")
+    assert sales.summary() == before
+    # cancelled twice in a row is still one cancellation
+    sales.status_changed(dict(first, status="CANCELLED"), "READY")
+    sales.status_changed(dict(first, status="CANCELLED"), "CANCELLED")
+    assert sales.summary()["cancelled_orders"] == 1
+    assert sales.summary()["total_revenue"] == 0.0
+
+
+def test_orders_stored_as_cancelled_never_count():
+    sales = SalesAnalytics()
+    sales.record_order(order(1, status="CANCELLED"))
+    assert sales.summary() == {"total_orders": 1, "cancelled_orders": 1, "total_revenue": 0.0, "top_items": []}
+
+
+def test_rebuild_matches_incremental_updates():
+    orders = [order(1, items=[("Pizza", 32.0, 1)]), order(2, status="CANCELLED"),
+              order(3, items=[("Mandi", 30.0, 2), ("Pizza", 32.0, 1)])]
+    live = SalesAnalytics()
+    for o in orders:
+        live.record_order(o)
+    rebuilt = SalesAnalytics()
+    rebuilt.rebuild(orders)
+    assert rebuilt.summary() == live.summary()
+
+
+def test_cancel_and_reopen_through_the_api(oldstyle, staff):
+    client = oldstyle.app.test_client()
+    before = client.get("/api/analytics").get_json()
+    created = client.post("/api/orders", json={"items": [2, 2]}).get_json()
+    headers = staff(oldstyle, "ADMIN")
+
+    def status(value):
+        r = client.patch(f"/api/orders/{created['id']}/status", json={"status": value}, headers=headers)
+        assert r.status_code == 200
+        return client.get("/api/analytics").get_json()
+
+    cancelled = status("CANCELLED")
+    assert cancelled["total_orders"] == before["total_orders"] + 1
+    assert cancelled["cancelled_orders"] == before["cancelled_orders"] + 1
+    assert cancelled["total_revenue"] == before["total_revenue"]
+    reopened = status("PREPARING")
+    assert reopened["cancelled_orders"] == before["cancelled_orders"]
+    assert reopened["total_revenue"] == round(before["total_revenue"] + created["total"], 2)
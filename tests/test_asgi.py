@@ -0,0 +1,173 @@
+import asyncio
+import http.client
+import json
+import re
+import socket
+import threading
+import time
+from urllib.parse import quote
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def server(newstyle):
+    """The built-in server on a free port, its own AsgiApp and event loop in a thread."""
+    from asgi import AsgiApp, serve
+
+    app = AsgiApp(newstyle.app, newstyle.BRANCHES)
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(serve(app, "127.0.0.1", 0, ready=lambda port: ports.append(port)))
+    ports = []
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not ports:
+        assert time.monotonic() < deadline, "server did not start"
+        time.sleep(0.01)
+    yield ports[0]
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(5)
+    app.executor.shutdown(wait=False)
+
+
+def exchange(port, data, half_close=False):
+    """Send raw bytes, read until the server closes the connection."""
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(data)
+        if half_close:
+            sock.shutdown(socket.SHUT_WR)
+        received = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return received
+            received += chunk
+
+
+def status_line(response):
+    """b"HTTP/1.1 400" (the reason phrase differs between Python versions)."""
+    return response[:12]
+
+
+# ---------------- HTTP/1.1 parsing ----------------
+
+@pytest.mark.parametrize("request_line", [b"GARBAGE", b"GET /api/health", b"GET /api/health HTTP/2.0",
+                                          b"GET /api/health FTP/1.1"])
+def test_malformed_request_line_is_400(server, request_line):
+    response = exchange(server, request_line + b"\r\nHost: x\r\n\r\n")
+    assert status_line(response) == b"HTTP/1.1 400"
+    assert b"Connection: close" in response       # _refuse() writes its own head
+
+
+def test_header_without_colon_is_400(server):
+    response = exchange(server, b"GET /api/health HTTP/1.1\r\nHost x\r\n\r\n")
+    assert status_line(response) == b"HTTP/1.1 400"
+
+
+def test_oversized_head_is_431(server):
+    from asgi import MAX_HEAD
+    response = exchange(server, b"GET /api/health HTTP/1.1\r\nX-Junk: " + b"a" * (MAX_HEAD + 1))
+    assert status_line(response) == b"HTTP/1.1 431"
+
+
+@pytest.mark.parametrize("lengths", [[b"abc"], [b"-1"], [b"+2"], [b"2", b"3"]])
+def test_bad_content_length_is_400(server, lengths):
+    head = b"POST /api/orders HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+    head += b"".join(b"Content-Length: " + value + b"\r\n" for value in lengths)
+    assert status_line(exchange(server, head + b"\r\n{}")) == b"HTTP/1.1 400"
+
+
+def test_oversized_body_is_refused_before_reading_it(server):
+    from asgi import MAX_BODY
+    head = b"POST /api/orders/batch HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n" % (MAX_BODY + 1)
+    assert status_line(exchange(server, head)) == b"HTTP/1.1 413"
+
+
+@pytest.mark.parametrize("coding, status", [(b"chunked", b"411"), (b"gzip", b"501")])
+def test_transfer_encoded_bodies_are_refused(server, coding, status):
+    head = b"POST /api/orders HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: " + coding + b"\r\n\r\n"
+    assert status_line(exchange(server, head + b"2\r\n{}\r\n0\r\n\r\n")) == b"HTTP/1.1 " + status
+
+
+def test_body_shorter_than_content_length_gets_no_answer(server, newstyle):
+    before = newstyle.STORE.count_orders()
+    body = json.dumps({"items": [1]}).encode()
+    head = b"POST /api/orders HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+    assert exchange(server, head % (len(body) + 10) + body, half_close=True) == b""
+    assert newstyle.STORE.count_orders() == before
+
+
+def test_keep_alive_answers_pipelined_requests_in_order(server):
+    body = json.dumps({"items": [1]}).encode()
+    post = (b"POST /api/orders HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+    response = exchange(server, post + b"GET /api/health HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+    assert re.findall(rb"HTTP/1\.1 (\d{3}) ", response) == [b"201", b"200"]
+    assert response.count(b"connection: keep-alive") == 1
+
+
+# ---------------- long polls ----------------
+
+def get(port, path, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        started = time.monotonic()
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        body = json.loads(response.read())
+        return response.status, response.getheader("X-Last-Event-Id"), body, time.monotonic() - started
+    finally:
+        conn.close()
+
+
+def test_list_poll_wakes_for_a_change_in_the_same_second(server, newstyle, monkeypatch):
+    clock = newstyle.now_us()
+    monkeypatch.setattr(newstyle, "now_us", lambda: clock)     # every change below in one second
+    client = newstyle.app.test_client()
+    first = client.post("/api/orders", json={"items": [1]}).get_json()
+    since = quote(first["updated_at"])
+
+    status, cursor, listed, _ = get(server, f"/api/orders?since={since}&fields=id")
+    assert status == 200 and first["id"] in [o["id"] for o in listed["orders"]]
+    second = client.post("/api/orders", json={"items": [1]}).get_json()
+    assert second["updated_at"] == first["updated_at"] == listed["next_since"]
+
+    status, cursor, polled, elapsed = get(server, f"/api/orders?wait=3&since={since}&last_event_id={cursor}&fields=id")
+    assert elapsed < 2
+    assert second["id"] in [o["id"] for o in polled["orders"]]
+
+    # nothing new after that cursor: the poll runs out
+    _, _, _, elapsed = get(server, f"/api/orders?wait=0.3&since={since}&fields=id", {"Last-Event-ID": cursor})
+    assert elapsed >= 0.3
+
+
+def test_order_poll_wakes_for_its_own_change_only(server, newstyle, staff, monkeypatch):
+    clock = newstyle.now_us()
+    monkeypatch.setattr(newstyle, "now_us", lambda: clock)
+    client = newstyle.app.test_client()
+    watched = client.post("/api/orders", json={"items": [1]}).get_json()
+    other = client.post("/api/orders", json={"items": [1]}).get_json()
+
+    _, cursor, _, _ = get(server, f"/api/orders/{watched['id']}")
+    client.patch(f"/api/orders/{other['id']}/status", json={"status": "PREPARING"}, headers=staff(newstyle, "CHEF"))
+    _, _, body, elapsed = get(server, f"/api/orders/{watched['id']}?wait=0.3&last_event_id={cursor}")
+    assert elapsed >= 0.3 and body["status"] == "RECEIVED"
+
+    client.patch(f"/api/orders/{watched['id']}/status", json={"status": "PREPARING"}, headers=staff(newstyle, "CHEF"))
+    _, _, body, elapsed = get(server, f"/api/orders/{watched['id']}?wait=3&last_event_id={cursor}")
+    assert elapsed < 2 and body["status"] == "PREPARING"
+    assert body["updated_at"] == watched["updated_at"]       # same second, still seen
+
+
+def test_poll_with_an_unknown_cursor_answers_at_once(server):
+    _, cursor, _, _ = get(server, "/api/orders?fields=id&limit=1")
+    _, _, _, elapsed = get(server, f"/api/orders?wait=3&fields=id&limit=1&last_event_id={int(cursor) + 1000}")
+    assert elapsed < 2
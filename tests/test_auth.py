@@ -0,0 +1,110 @@
+import pytest
+from flask import Flask, g, jsonify
+
+from auth import TokenAuth, check_password, hash_password
+
+USERS = {"chef": {"password_hash": hash_password("chef123", iterations=1000), "role": "CHEF"}}
+
+
+@pytest.fixture
+def auth():
+    return TokenAuth(USERS, secret="test-secret", ttl=60)
+
+
+@pytest.fixture
+def client(auth):
+    app = Flask(__name__)
+
+    @app.get("/kitchen")
+    @auth.require("CHEF", "ADMIN")
+    def kitchen():
+        return jsonify(g.get("user"))
+
+    @app.get("/admin")
+    @auth.require("ADMIN")
+    def admin():
+        return jsonify(g.get("user"))
+
+    return app.test_client()
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_passwords_are_checked_against_the_hash():
+    encoded = hash_password("secret", iterations=1000)
+    assert encoded.startswith("pbkdf2_sha256$1000$")
+    assert check_password("secret", encoded)
+    assert not check_password("Secret", encoded)
+    assert not check_password("secret", "md5$whatever")
+
+
+def test_login(auth):
+    assert auth.login("chef", "chef123") == {"username": "chef", "role": "CHEF"}
+    assert auth.login("chef", "wrong") is None
+    assert auth.login("nobody", "chef123") is None
+
+
+def test_no_token_is_401(client):
+    r = client.get("/kitchen")
+    assert r.status_code == 401
+    assert r.headers["WWW-Authenticate"] == "Bearer"
+    assert client.get("/kitchen", headers={"Authorization": "Basic Y2hlZjpjaGVmMTIz"}).status_code == 401
+
+
+def test_bad_tokens_are_401(auth, client):
+    token = auth.issue("chef", "CHEF")
+    forged = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+    other_secret = TokenAuth(USERS, secret="another-secret").issue("chef", "ADMIN")
+    for bad in (forged, other_secret, "garbage", "a.b"):
+        r = client.get("/kitchen", headers=bearer(bad))
+        assert r.status_code == 401
+        assert r.get_json() == {"error": "Invalid token"}
+
+
+def test_expired_token_is_401(auth, client):
+    old = auth.issue("chef", "CHEF", now=0)
+    r = client.get("/kitchen", headers=bearer(old))
+    assert r.status_code == 401
+    assert r.get_json() == {"error": "Token expired"}
+
+
+def test_wrong_role_is_403(auth, client):
+    r = client.get("/admin", headers=bearer(auth.issue("chef", "CHEF")))
+    assert r.status_code == 403
+    assert r.get_json() == {"error": "Not allowed for role CHEF"}
+
+
+def test_right_role_gets_through(auth, client):
+    assert client.get("/kitchen", headers=bearer(auth.issue("chef", "CHEF"))).get_json() == \
+        {"username": "chef", "role": "CHEF"}
+    assert client.get("/admin", headers=bearer(auth.issue("boss", "ADMIN"))).status_code == 200
+
+
+def test_switched_off_lets_everyone_in(auth, client):
+    auth.enabled = False
+    assert client.get("/admin").status_code == 200
+
+
+@pytest.mark.parametrize("app, login, method", [
+    ("newstyle", "/api/login", "put"),
+    ("oldstyle", "/api/auth/login", "patch"),
+])
+def test_app_routes_are_guarded(app, login, method, request, staff):
+    mod = request.getfixturevalue(app)
+    client = mod.app.test_client()
+    update_menu = getattr(client, method)
+    assert update_menu("/api/menu/1", json={"price": 7}).status_code == 401
+    assert update_menu("/api/menu/1", json={"price": 7}, headers=staff(mod, "CHEF")).status_code == 403
+
+    reply = client.post(login, json={"username": "admin", "password": "admin123"})
+    assert reply.status_code == 200
+    token = reply.get_json()["token"]
+    assert update_menu("/api/menu/1", json={"price": 7}, headers=bearer(token)).status_code == 200
+    assert client.post(login, json={"username": "admin", "password": "nope"}).status_code == 401
+
+    order = client.post("/api/orders", json={"items": [1]}).get_json()
+    path = f"/api/orders/{order['id']}/status"
+    assert client.patch(path, json={"status": "PREPARING"}).status_code == 401
+    assert client.patch(path, json={"status": "PREPARING"}, headers=staff(mod, "CHEF")).status_code == 200
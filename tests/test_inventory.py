@@ -0,0 +1,60 @@
+import threading
+import time
+
+from inventory import RECIPES, InventoryEngine
+from storage import MemoryStorage
+
+
+def line(inv_id, qty, threshold=5):
+    return {"id": inv_id, "qty": qty, "low_stock_threshold": threshold}
+
+
+def test_deduct_updates_the_low_stock_set():
+    store = MemoryStorage("type", [], [line(1, 6), line(2, 10, 4)], []).open()
+    stock = InventoryEngine(RECIPES)
+    stock.rebuild(store.list_inventory())
+    assert stock.low == set()
+    before = stock.version
+    # two Mandi and one Chicken Biryani: 3 kg rice, 0.75 kg chicken
+    assert stock.deduct(store, [{"menu_id": 5, "qty": 2}, {"menu_id": 3}]) == {1: 3, 2: 0.75}
+    assert [inv["qty"] for inv in store.list_inventory()] == [3, 9.25]
+    assert [inv["id"] for inv in stock.low_stock(store)] == [1]
+    assert stock.version > before
+
+
+def test_cached_inventory_never_keeps_stale_low_stock(oldstyle, staff, monkeypatch):
+    """A read racing an admin edit may see either side of it, but must not cache a mix."""
+    client = oldstyle.app.test_client()
+    headers = staff(oldstyle, "ADMIN")
+    stock = oldstyle.BRANCHES.current().stock
+    track = stock.track
+
+    def slow_track(inv):
+        time.sleep(0.002)       # widen the gap between saving the row and updating the set
+        track(inv)
+
+    monkeypatch.setattr(stock, "track", slow_track)
+
+    def consistent():
+        body = client.get("/api/inventory").get_json()
+        low = [inv["id"] for inv in body["inventory"] if inv["qty"] <= inv["low_stock_threshold"]]
+        return [inv["id"] for inv in body["low_stock"]] == low
+
+    try:
+        for qty in (1, 50) * 15:
+            done = threading.Event()
+
+            def read():
+                while not done.is_set():
+                    client.get("/api/inventory")
+
+            readers = [threading.Thread(target=read) for _ in range(2)]
+            for t in readers:
+                t.start()
+            assert client.patch("/api/inventory/4", json={"qty": qty}, headers=headers).status_code == 200
+            done.set()
+            for t in readers:
+                t.join()
+            assert consistent()
+    finally:
+        client.patch("/api/inventory/4", json={"qty": 40}, headers=headers)
@@ -0,0 +1,73 @@
+from order_store import OrderStore
+
+
+def make_store(n=10):
+    store = OrderStore(type_key="type")
+    for i in range(1, n + 1):
+        store.add({"id": i, "type": "DINE_IN" if i % 2 else "DELIVERY", "status": "RECEIVED",
+                   "updated_at": f"2026-10-18T10:00:{i:02d}Z"})
+    return store
+
+
+def change(store, oid, status, updated_at):
+    old = store.get(oid)
+    store.save(dict(old, status=status, updated_at=updated_at), old["status"])
+
+
+def ids(orders):
+    return [o["id"] for o in orders]
+
+
+def test_pages_walk_every_order_once():
+    store = make_store(10)
+    pages, after = [], None
+    while True:
+        page = store.find(limit=3, after_id=after)
+        pages.append(ids(page))
+        if len(page) < 3:
+            break
+        after = page[-1]["id"]
+    assert pages == [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]]
+
+
+def test_page_after_the_last_id_is_empty():
+    store = make_store(5)
+    assert store.find(limit=3, after_id=5) == []
+    assert store.find(limit=3, after_id=99) == []
+
+
+def test_filtered_pages_follow_the_index():
+    store = make_store(10)
+    change(store, 3, "PREPARING", "2026-10-18T10:01:00Z")
+    change(store, 8, "PREPARING", "2026-10-18T10:01:00Z")
+    assert ids(store.find(order_type="DELIVERY", limit=2)) == [2, 4]
+    assert ids(store.find(order_type="DELIVERY", limit=2, after_id=4)) == [6, 8]
+    assert ids(store.find(status="PREPARING")) == [3, 8]
+    assert ids(store.find(status="RECEIVED", order_type="DELIVERY", after_id=2)) == [4, 6, 10]
+    assert ids(store.find(statuses=("PREPARING", "READY"), limit=1, after_id=3)) == [8]
+
+
+def test_since_includes_changes_at_the_cursor():
+    store = make_store(5)
+    assert ids(store.find(since="2026-10-18T10:00:03Z")) == [3, 4, 5]
+    assert ids(store.find(since="2026-10-18T10:00:05Z")) == [5]
+    assert store.find(since="2026-10-18T10:00:06Z") == []
+
+
+def test_since_sees_saved_orders_in_id_order():
+    store = make_store(5)
+    change(store, 1, "READY", "2026-10-18T10:05:00Z")
+    change(store, 4, "READY", "2026-10-18T10:06:00Z")
+    assert ids(store.find(since="2026-10-18T10:05:00Z")) == [1, 4]
+    assert store.last_change() == "2026-10-18T10:06:00Z"
+    assert ids(store.find(since="2026-10-18T10:05:00Z", status="READY", limit=1)) == [1]
+    assert ids(store.find(since="2026-10-18T10:05:00Z", after_id=1)) == [4]
+
+
+def test_removed_orders_leave_every_index():
+    store = make_store(6)
+    assert store.remove([2, 5, 42]) == 2
+    assert ids(store.find()) == [1, 3, 4, 6]
+    assert ids(store.find(order_type="DELIVERY")) == [4, 6]
+    assert ids(store.find(since="2026-10-18T10:00:01Z")) == [1, 3, 4, 6]
+    assert store.count(status="RECEIVED") == 4
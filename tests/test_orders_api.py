@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from batch import MAX_BATCH
+
+APPS = [("newstyle", "order_type"), ("oldstyle", "type")]
+
+
+@pytest.fixture(params=APPS, ids=[name for name, _ in APPS])
+def app(request):
+    name, type_key = request.param
+    mod = request.getfixturevalue(name)
+    return mod, mod.app.test_client(), type_key
+
+
+def test_batch_of_max_size_is_accepted(app):
+    mod, client, type_key = app
+    orders = [{"customer_name": f"Partner {i}", type_key: "DELIVERY", "items": [1]} for i in range(MAX_BATCH)]
+    r = client.post("/api/orders/batch", json=orders)
+    assert r.status_code == 200
+    body = r.get_json()
+    assert (body["created"], body["failed"]) == (MAX_BATCH, 0)
+    ids = [res["order"]["id"] for res in body["results"]]
+    assert ids == list(range(ids[0], ids[0] + MAX_BATCH))
+
+
+def test_batch_over_max_size_is_refused_whole(app):
+    mod, client, type_key = app
+    before = mod.SALES.summary()["total_orders"]
+    orders = [{type_key: "DELIVERY", "items": [1]}] * (MAX_BATCH + 1)
+    for payload in (orders, {"orders": orders}):
+        r = client.post("/api/orders/batch", json=payload)
+        assert r.status_code == 400
+        assert r.get_json() == {"error": f"At most {MAX_BATCH} orders per batch"}
+    ndjson = "\n".join(json.dumps(o) for o in orders)
+    r = client.post("/api/orders/batch", data=ndjson, content_type="application/x-ndjson")
+    assert r.status_code == 400
+    assert mod.SALES.summary()["total_orders"] == before
+
+
+def test_batch_reports_bad_entries_by_position(app):
+    mod, client, type_key = app
+    lines = [json.dumps({type_key: "DELIVERY", "items": [2]}), "{not json", json.dumps([1, 2]),
+             "", json.dumps({type_key: "DELIVERY", "items": [3]})]
+    r = client.post("/api/orders/batch", data="\n".join(lines), content_type="application/x-ndjson")
+    body = r.get_json()
+    assert [(res["index"], res["status"]) for res in body["results"]] == [(0, 201), (1, 400), (2, 400), (3, 201)]
+    assert (body["created"], body["failed"]) == (2, 2)
+
+
+def test_batch_needs_a_list(app):
+    mod, client, type_key = app
+    for payload in ({"orders": "nope"}, {"customer_name": "x"}, 5):
+        assert client.post("/api/orders/batch", json=payload).status_code == 400
+
+
+def test_order_list_pages_with_next_after_id(app):
+    mod, client, type_key = app
+    created = [client.post("/api/orders", json={type_key: "WALK_IN", "items": [1]}).get_json()["id"]
+               for _ in range(5)]
+    seen, after = [], created[0] - 1
+    while True:
+        body = client.get(f"/api/orders?limit=2&after_id={after}&fields=id").get_json()
+        seen += [o["id"] for o in body["orders"]]
+        after = body["next_after_id"]
+        if after is None:
+            break
+    assert seen[:5] == created
+    assert len(seen) == len(set(seen))
@@ -0,0 +1,117 @@
+import pytest
+
+from reservations import ReservationBook, ReservationError
+
+DAY = "2027-03-01"
+
+
+def book(book_, time, size, date=DAY, name="Guest"):
+    """Book like the API does: ask for a table size, then store the row."""
+    seats = book_.book(date, time, size)
+    book_.add({"name": name, "date": date, "time": time, "size": size, "table_size": seats})
+    return seats
+
+
+def test_smallest_free_table_is_taken():
+    tables = ReservationBook(tables={2: 1, 4: 1})
+    assert book(tables, "19:00", 2) == 2
+    assert book(tables, "19:00", 2) == 4       # the 2-seater is gone
+    with pytest.raises(ReservationError) as refused:
+        tables.book(DAY, "19:00", 2)
+    assert refused.value.status == 409
+
+
+def test_whole_sitting_counts_against_capacity():
+    tables = ReservationBook(tables={4: 1})     # 90 minute sittings, 30 minute slots
+    book(tables, "19:00", 4)
+    for overlapping in ("18:00", "18:30", "19:00", "19:30", "20:00"):
+        with pytest.raises(ReservationError):
+            tables.book(DAY, overlapping, 4)
+    assert book(tables, "17:30", 4) == 4        # ends as the 19:00 party sits down
+    assert book(tables, "20:30", 4) == 4        # starts as it leaves
+
+
+def test_other_days_are_not_affected():
+    tables = ReservationBook(tables={2: 1})
+    book(tables, "19:00", 2)
+    assert book(tables, "19:00", 2, date="2027-03-02") == 2
+    assert len(tables.on_date(DAY)) == 1
+
+
+def test_availability_leaves_out_full_times():
+    tables = ReservationBook(tables={2: 1}, open_time="18:00", close_time="21:00")
+    assert tables.availability(DAY, 2) == ["18:00", "18:30", "19:00", "19:30"]
+    book(tables, "19:00", 2)
+    assert tables.availability(DAY, 2) == []
+    assert ReservationBook(tables={2: 1}).availability(DAY, 3) == []
+
+
+@pytest.mark.parametrize("date, time, size", [
+    ("2027-02-30", "19:00", 2),     # no such day
+    (DAY, "25:00", 2),
+    (DAY, "11:30", 2),              # before opening
+    (DAY, "22:30", 2),              # sitting would end after closing
+    (DAY, "19:00", 0),
+    (DAY, "19:00", "2"),
+])
+def test_invalid_requests_are_400(date, time, size):
+    with pytest.raises(ReservationError) as refused:
+        ReservationBook().book(date, time, size)
+    assert refused.value.status == 400
+
+
+def test_party_bigger_than_any_table_is_409():
+    with pytest.raises(ReservationError) as refused:
+        ReservationBook().book(DAY, "19:00", 9)
+    assert refused.value.status == 409
+
+
+def test_rebuild_restores_the_counts():
+    tables = ReservationBook(tables={2: 1})
+    book(tables, "19:00", 2)
+    restored = ReservationBook(tables={2: 1})
+    restored.rebuild(tables.on_date(DAY))
+    with pytest.raises(ReservationError):
+        restored.book(DAY, "19:30", 2)
+
+
+@pytest.mark.parametrize("app", ["newstyle", "oldstyle"])
+def test_api_refuses_the_booking_past_capacity(app, request):
+    mod = request.getfixturevalue(app)
+    client = mod.app.test_client()
+    date = "2027-04-01" if app == "newstyle" else "2027-04-02"
+    eights = mod.BOOKINGS.tables[8]
+    for i in range(eights):
+        r = client.post("/api/reservations", json={"name": f"Party {i}", "date": date, "time": "20:00", "size": 8})
+        assert r.status_code == 201
+        assert r.get_json()["table_size"] == 8
+    r = client.post("/api/reservations", json={"name": "One too many", "date": date, "time": "20:30", "size": 8})
+    assert r.status_code == 409
+    availability = client.get(f"/api/reservations/availability?date={date}&size=8").get_json()
+    assert "20:00" not in availability["times"] and "18:30" in availability["times"]
+
+
+def test_start_times_must_be_on_a_slot():
+    tables = ReservationBook(tables={4: 1})
+    book(tables, "19:00", 4)
+    for unaligned in ("20:15", "17:45", "19:05"):
+        with pytest.raises(ReservationError) as refused:
+            tables.book(DAY, unaligned, 4)
+        assert refused.value.status == 400
+
+
+@pytest.mark.parametrize("app", ["newstyle", "oldstyle"])
+@pytest.mark.parametrize("size", ["abc", "-1", "0", "2.5", ""])
+def test_availability_needs_a_positive_party_size(app, size, request):
+    client = request.getfixturevalue(app).app.test_client()
+    r = client.get(f"/api/reservations/availability?date=2027-05-01&size={size}")
+    assert r.status_code == 400
+    assert r.get_json() == {"error": "Party size must be a positive number"}
+
+
+@pytest.mark.parametrize("app", ["newstyle", "oldstyle"])
+def test_api_refuses_unaligned_start_times(app, request):
+    client = request.getfixturevalue(app).app.test_client()
+    r = client.post("/api/reservations", json={"name": "Early", "date": "2027-05-02", "time": "12:15", "size": 2})
+    assert r.status_code == 400
+    assert client.get("/api/reservations/availability?date=2027-05-02").get_json()["size"] == 2
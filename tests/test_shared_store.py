@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from shared_store import SharedStorage, StateError, StateServer, open_state_storage
+
+MENU = [{"id": 1, "name": "Tea", "price": 6.0, "category": "Drinks"},
+        {"id": 2, "name": "Pizza", "price": 32.0, "category": "Main"}]
+INVENTORY = [{"id": 1, "name": "Rice", "qty": 10}]
+
+
+def order(oid, status="RECEIVED"):
+    return {"id": oid, "type": "DINE_IN", "status": status, "items": [], "total": 0}
+
+
+def eventually(check, timeout=2.0):
+    """Replicas hear about commits asynchronously; wait for them to catch up."""
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "replica never caught up"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    """A state server and two workers sharing it: (server storage, a, b)."""
+    server = StateServer(str(tmp_path / "state.sock"), open_state_storage("memory"))
+    ready = threading.Event()
+    threading.Thread(target=server.serve_forever, args=(ready.set,), daemon=True).start()
+    ready.wait(5)
+    workers = [SharedStorage(server.path, "type", list(MENU), list(INVENTORY), []).open() for _ in range(2)]
+    for worker in workers:
+        worker.subscribe(lambda *change: None)
+    with workers[0].transaction():
+        workers[0].add_order(order(workers[0].next_order_id()))
+    eventually(lambda: len(workers[1].all_orders()) == 1)
+    return (server.storage, *workers)
+
+
+def statuses(storage):
+    return [(o["id"], o["status"]) for o in storage.all_orders()]
+
+
+def test_commits_reach_every_worker(cluster):
+    server, a, b = cluster
+    with b.transaction():
+        b.add_order(order(b.next_order_id()))
+    eventually(lambda: len(a.all_orders()) == 2)
+    assert [o["id"] for o in a.all_orders()] == [o["id"] for o in b.all_orders()] == \
+        [o["id"] for o in server.all_orders()] == [1, 2]
+
+
+def test_failed_body_rolls_the_replica_back(cluster):
+    server, a, b = cluster
+    with pytest.raises(RuntimeError):
+        with a.transaction():
+            a.add_order(order(a.next_order_id()))
+            o = a.get_order(1, for_update=True)
+            o["status"] = "READY"
+            a.save_order(o, "RECEIVED")
+            m = a.get_menu_item(2, for_update=True)
+            m["price"] = 99.0
+            a.save_menu_item(m)
+            a.add_reservation({"id": a.next_reservation_id(), "name": "Z"})
+            raise RuntimeError("boom")
+    for storage in (a, b, server):
+        assert statuses(storage) == [(1, "RECEIVED")]
+        assert storage.get_menu_item(2)["price"] == 32.0
+    assert a.list_reservations() == []
+    assert (a.count_orders(status="READY"), a.count_orders(status="RECEIVED")) == (0, 1)
+
+
+def test_server_side_failure_keeps_every_copy_alike(cluster, monkeypatch):
+    """The server kept the order change before the menu save failed: so must everyone."""
+    server, a, b = cluster
+
+    def disk_full(item):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(server, "save_menu_item", disk_full)
+    with pytest.raises(StateError):
+        with a.transaction():
+            o = a.get_order(1, for_update=True)
+            o["status"] = "PREPARING"
+            a.save_order(o, "RECEIVED")
+            m = a.get_menu_item(2, for_update=True)
+            m["price"] = 50.0
+            a.save_menu_item(m)
+    monkeypatch.undo()
+    eventually(lambda: statuses(b) == [(1, "PREPARING")])
+    for storage in (a, b, server):
+        assert statuses(storage) == [(1, "PREPARING")]
+        assert storage.get_menu_item(2)["price"] == 32.0
+    assert a.count_orders(status="PREPARING") == b.count_orders(status="PREPARING") == 1
+
+
+def test_rejected_batch_applies_nothing(cluster):
+    server, a, b = cluster
+    with pytest.raises(StateError):
+        with a.transaction():
+            o = a.get_order(1, for_update=True)
+            o["status"] = "READY"
+            a.save_order(o, "RECEIVED")
+            a._record(("menu", "save", {"id": 77, "name": "Ghost"}), None)
+    for storage in (a, b, server):
+        assert statuses(storage) == [(1, "RECEIVED")]